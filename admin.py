@@ -1,14 +1,24 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django import forms
-from .models import SituationType, TechnicalLevel, Level, Player, Task, PlayerProgress, TechnicalLevelTasks, SituationType, TournamentType, Diagnosis, CoachReport, TechnicalPart, Drill, TrainingPlan, TrainingPlanDrill, MentalTask, PhysicalTask, KeyPoint
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from .models import SituationType, TechnicalLevel, Level, Player, Task, PlayerProgress, TechnicalLevelTasks, SituationType, TournamentType, Diagnosis, CoachReport, TechnicalPart, Drill, TrainingPlan, TrainingPlanDrill, MentalTask, PhysicalTask, KeyPoint, PendingPromotion
 from tinymce.widgets import TinyMCE
 from django.db import models
-from django.utils.html import format_html
+from django.db.models import Count, Prefetch, Q, Sum, prefetch_related_objects
+from django.db.models.functions import Coalesce
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
-from django.utils.safestring import mark_safe
 from import_export.admin import ExportMixin, ImportExportModelAdmin
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
+from .importer import IMPORT_SOURCES, ImportFileError, import_file
+from .promotions import decide_promotions
+
+# Errors listed in the admin after a streaming import, the rest are counted
+ADMIN_IMPORT_ERRORS_SHOWN = 20
 
 
 class LevelAdmin(admin.ModelAdmin):
@@ -19,6 +29,63 @@ class LevelAdmin(admin.ModelAdmin):
     }
 
 
+class StreamingImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV or XLSX")
+
+
+class StreamingImportMixin:
+    """ ✅ Adds a 'Streaming import' page that upserts large files in batches """
+    streaming_import_kind = None
+    change_list_template = "admin/core/streaming_import_change_list.html"
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path("streaming-import/",
+                 self.admin_site.admin_view(self.streaming_import_view),
+                 name=f"{opts.app_label}_{opts.model_name}_streaming_import"),
+        ] + super().get_urls()
+
+    def streaming_import_view(self, request):
+        if not (self.has_add_permission(request)
+                and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = StreamingImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                result = import_file(self.streaming_import_kind, upload.file,
+                                     upload.name)
+            except ImportFileError as error:
+                form.add_error("file", str(error))
+            else:
+                self.report_import(request, result)
+                opts = self.model._meta
+                return redirect(
+                    f"admin:{opts.app_label}_{opts.model_name}_changelist")
+
+        source = IMPORT_SOURCES[self.streaming_import_kind]
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Streaming import",
+            "form": form,
+            "columns": ["name", *source.foreign_keys, *source.fields],
+        }
+        return TemplateResponse(request, "admin/core/streaming_import.html",
+                                context)
+
+    def report_import(self, request, result):
+        self.message_user(
+            request, f"Imported {result['rows']} rows: {result['created']} "
+            f"created, {result['updated']} updated, {result['errors']} errors",
+            messages.WARNING if result["errors"] else messages.SUCCESS)
+        for error in result["error_details"][:ADMIN_IMPORT_ERRORS_SHOWN]:
+            self.message_user(request, f"Row {error['row']}: {error['error']}",
+                              messages.ERROR)
+
+
 class SituationTypeAdmin(admin.ModelAdmin):
     list_display = ("name", "category")  # ✅ Display both Name & Category
     list_filter = ("category", )  # ✅ Add a filter for categories
@@ -43,9 +110,12 @@ class TaskResource(resources.ModelResource):
         import_id_fields = ('name', )
 
 
-class TaskAdmin(ImportExportModelAdmin, admin.ModelAdmin):
+class TaskAdmin(StreamingImportMixin, ImportExportModelAdmin,
+                admin.ModelAdmin):
     resource_class = TaskResource
+    streaming_import_kind = "tasks"
     list_display = ("name", "situation_type", "level")  # Removed "category"
+    list_select_related = ("situation_type", "level")
     list_filter = ("level", )  # Removed "category"
     search_fields = ("name", "level__name")
 
@@ -74,19 +144,35 @@ class TechnicalLevelTasksResource(resources.ModelResource):
         import_id_fields = ('name', )
 
 
-class TechnicalLevelTasksAdmin(ImportExportModelAdmin, admin.ModelAdmin):
+class TechnicalLevelTasksAdmin(StreamingImportMixin, ImportExportModelAdmin,
+                               admin.ModelAdmin):
     resource_class = TechnicalLevelTasksResource  # ✅ Enable Import/Export
+    streaming_import_kind = "technical_tasks"
     list_display = ("name", "category", "technical_level", "diagnosis_count",
                     "add_diagnosis_link")
     list_filter = ("category", "technical_level")
+    list_select_related = ("technical_level", )
     search_fields = ("name", "technical_level__name", "technical_part__name")
 
+    def get_queryset(self, request):
+        """ ✅ Count diagnoses in the changelist query instead of once per row """
+        return super().get_queryset(request).annotate(
+            diagnosis_count=Count("diagnoses"))
+
+    def get_object(self, request, object_id, from_field=None):
+        obj = super().get_object(request, object_id, from_field)
+        if obj is not None:
+            prefetch_related_objects([
+                obj
+            ], Prefetch("diagnoses", queryset=Diagnosis.objects.order_by("pk")))
+        return obj
+
     def diagnosis_count(self, obj):
         """ ✅ Show number of diagnoses related to this task """
-        count = Diagnosis.objects.filter(technical_level_task=obj).count()
-        return count
+        return obj.diagnosis_count
 
     diagnosis_count.short_description = "Diagnoses"
+    diagnosis_count.admin_order_field = "diagnosis_count"
 
     def add_diagnosis_link(self, obj):
         """ ✅ Add a 'Create Diagnosis' button for each Task """
@@ -99,16 +185,18 @@ class TechnicalLevelTasksAdmin(ImportExportModelAdmin, admin.ModelAdmin):
 
     def related_diagnoses(self, obj):
         """ ✅ Show a table of related diagnoses in the Task edit view """
-        diagnoses = Diagnosis.objects.filter(technical_level_task=obj)
-        if diagnoses.exists():
-            table_html = "<table><tr><th>Name</th><th>Actions</th></tr>"
-            for diagnosis in diagnoses:
-                delete_url = reverse("admin:core_diagnosis_delete",
-                                     args=[diagnosis.id])
-                table_html += f"<tr><td>{diagnosis.name}</td><td><a href='{delete_url}'>❌ Remove</a></td></tr>"
-            table_html += "</table>"
-            return mark_safe(table_html)
-        return "No diagnoses linked."
+        if obj.pk is None:
+            return "No diagnoses linked."
+        diagnoses = obj.diagnoses.all()  # ✅ Prefetched in get_object
+        if not diagnoses:
+            return "No diagnoses linked."
+        rows = format_html_join(
+            "", "<tr><td>{}</td><td><a href='{}'>❌ Remove</a></td></tr>",
+            ((diagnosis.name,
+              reverse("admin:core_diagnosis_delete", args=[diagnosis.id]))
+             for diagnosis in diagnoses))
+        return format_html(
+            "<table><tr><th>Name</th><th>Actions</th></tr>{}</table>", rows)
 
     related_diagnoses.short_description = "Related Diagnoses"
 
@@ -133,10 +221,18 @@ class TechnicalLevelTasksAdmin(ImportExportModelAdmin, admin.ModelAdmin):
 class CoachReportAdmin(admin.ModelAdmin):
     list_display = ("player_name", "coach_name", "technical_level",
                     "created_at")
+    list_select_related = ("technical_level", )
     search_fields = ("player_name", "coach_name")
     filter_horizontal = ("tasks", "diagnoses"
                          )  # ✅ Allows multi-select in admin
 
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        """ ✅ Diagnosis labels include the task name, load it in the same query """
+        if db_field.name == "diagnoses":
+            kwargs["queryset"] = Diagnosis.objects.select_related(
+                "technical_level_task")
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
 
 class TechnicalPartAdmin(admin.ModelAdmin):
     list_display = ("name", )
@@ -167,6 +263,7 @@ class DiagnosisForm(forms.ModelForm):
 class DiagnosisAdmin(admin.ModelAdmin):
     form = DiagnosisForm
     list_display = ("name", "technical_level_task")
+    list_select_related = ("technical_level_task", )
     search_fields = ("name", "technical_level_task__name")
 
 
@@ -177,21 +274,47 @@ class KeyPointInline(admin.TabularInline):
 
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.order_by("level__order_number") 
+        return qs.select_related("drill", "level").order_by(
+            "level__order_number")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        """ ✅ Load the level choices once instead of once per inline row """
+        formfield = super().formfield_for_foreignkey(db_field, request,
+                                                     **kwargs)
+        if db_field.name == "level":
+            formfield.choices = list(iter(formfield.choices))
+        return formfield
 
 
     # ✅ Register Drills
 class DrillAdmin(admin.ModelAdmin):
-    list_display = ("name", "situation_type", "category", "suggested_time")
+    list_display = ("name", "situation_type", "category", "suggested_time",
+                    "key_point_count")
+    list_select_related = ("situation_type", )
     search_fields = ("name", "situation_type__name")
     list_filter = ("situation_type", "category")
     inlines = [KeyPointInline]
 
+    def get_queryset(self, request):
+        """ ✅ Count key points with a description in the changelist query """
+        return super().get_queryset(request).annotate(
+            key_point_count=Count(
+                "key_points",
+                filter=~Q(key_points__description__isnull=True)
+                & ~Q(key_points__description="")))
+
+    def key_point_count(self, obj):
+        return obj.key_point_count
+
+    key_point_count.short_description = "Key points"
+    key_point_count.admin_order_field = "key_point_count"
+
 
 # ✅ Register TrainingPlanDrill
 class TrainingPlanDrillAdmin(admin.ModelAdmin):
     list_display = ("training_plan", "drill", "selected_level",
                     "time_allocated")
+    list_select_related = ("training_plan", "drill", "selected_level")
     search_fields = ("training_plan__name", "drill__name")
     list_filter = ("selected_level", )
 
@@ -199,25 +322,69 @@ class TrainingPlanDrillAdmin(admin.ModelAdmin):
 # ✅ Register Mental Tasks
 class MentalTaskAdmin(admin.ModelAdmin):
     list_display = ("name", "level", "category")
+    list_select_related = ("level", )
     search_fields = ("name", "category")
 
 
 # ✅ Register Physical Tasks
 class PhysicalTaskAdmin(admin.ModelAdmin):
     list_display = ("name", "level", "category")
+    list_select_related = ("level", )
     search_fields = ("name", "category")
 
 
 class KeyPointAdmin(admin.ModelAdmin):
     list_display = ("drill", "level", "description")
+    list_select_related = ("drill", "level")
     search_fields = ("drill__name", "level__name")
     list_filter = ("level", )
 
 
 class TrainingPlanAdmin(admin.ModelAdmin):
-    list_display = ("name", "date")
+    list_display = ("name", "date", "drill_count", "total_minutes")
     search_fields = ("name", )
 
+    def get_queryset(self, request):
+        """ ✅ Drill count and total minutes in the changelist query """
+        return super().get_queryset(request).annotate(
+            drill_count=Count("plan_drills"),
+            total_minutes=Coalesce(Sum("plan_drills__time_allocated"), 0))
+
+    def drill_count(self, obj):
+        return obj.drill_count
+
+    drill_count.short_description = "Drills"
+    drill_count.admin_order_field = "drill_count"
+
+    def total_minutes(self, obj):
+        return obj.total_minutes
+
+    total_minutes.short_description = "Total minutes"
+    total_minutes.admin_order_field = "total_minutes"
+
+
+class PendingPromotionAdmin(admin.ModelAdmin):
+    list_display = ("player", "from_level", "to_level", "completed", "total",
+                    "status", "created_at")
+    list_select_related = ("player", "from_level", "to_level")
+    list_filter = ("status", "to_level")
+    search_fields = ("player__name", )
+    readonly_fields = ("player", "from_level", "to_level", "completed",
+                       "total", "created_at", "decided_at")
+    actions = ["approve_promotions", "reject_promotions"]
+
+    @admin.action(description="Approve and move players up")
+    def approve_promotions(self, request, queryset):
+        decided = decide_promotions(queryset, approve=True)
+        self.message_user(request, f"{decided} promotions approved.",
+                          messages.SUCCESS)
+
+    @admin.action(description="Reject promotions")
+    def reject_promotions(self, request, queryset):
+        decided = decide_promotions(queryset, approve=False)
+        self.message_user(request, f"{decided} promotions rejected.",
+                          messages.SUCCESS)
+
 
 admin.site.register(TechnicalLevel)
 admin.site.register(Level, LevelAdmin)
@@ -236,3 +403,4 @@ admin.site.register(TrainingPlan, TrainingPlanAdmin)
 admin.site.register(Drill, DrillAdmin)
 admin.site.register(PhysicalTask, PhysicalTaskAdmin)
 admin.site.register(KeyPoint, KeyPointAdmin)
+admin.site.register(PendingPromotion, PendingPromotionAdmin)
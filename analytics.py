@@ -0,0 +1,113 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import CoachReport, CoachReportDiagnosisDaily, CoachReportTaskDaily
+
+ROLLUP_BATCH_SIZE = 2000
+
+# ✅ dimension -> (rollup model, item field, CoachReport m2m field)
+ROLLUPS = {
+    "diagnoses": (CoachReportDiagnosisDaily, "diagnosis", "diagnoses"),
+    "tasks": (CoachReportTaskDaily, "task", "tasks"),
+}
+
+
+def report_day(report):
+    """ The rollup day of a report, in the site's time zone like TruncDate """
+    return timezone.localdate(report.created_at)
+
+
+def apply_rollup_delta(dimension, day, technical_level_id, item_ids, delta):
+    """ Adds `delta` to the counts of `item_ids` for one day and technical level.
+
+    Missing rows are inserted at 0 first, then all of them are incremented
+    in one UPDATE, so concurrent reports never lose a count.
+    """
+    item_ids = list(item_ids)
+    if not item_ids or not delta:
+        return
+    model, item_field, _ = ROLLUPS[dimension]
+    key = {"day": day, "technical_level_id": technical_level_id}
+    with transaction.atomic():
+        model.objects.bulk_create(
+            [
+                model(**key, **{f"{item_field}_id": item_id})
+                for item_id in item_ids
+            ],
+            ignore_conflicts=True,
+        )
+        model.objects.filter(**key, **{
+            f"{item_field}__in": item_ids
+        }).update(count=F("count") + delta)
+
+
+def apply_report_delta(report, delta, day, technical_level_id):
+    """ Counts (or uncounts) every task and diagnosis of one saved report """
+    for dimension, (_, _, m2m_field) in ROLLUPS.items():
+        apply_rollup_delta(
+            dimension, day, technical_level_id,
+            getattr(report, m2m_field).values_list("pk", flat=True), delta)
+
+
+def rebuild_rollups(dimensions=None, stdout=None):
+    """ Recomputes the rollup tables from the m2m through tables """
+    with transaction.atomic():
+        for dimension in dimensions or ROLLUPS:
+            model, item_field, m2m_field = ROLLUPS[dimension]
+            m2m = CoachReport._meta.get_field(m2m_field)
+            item_column = f"{m2m.m2m_reverse_field_name()}_id"
+            model.objects.all().delete()
+            rows = m2m.remote_field.through.objects.annotate(
+                day=TruncDate("coachreport__created_at")).values(
+                    "day", "coachreport__technical_level_id",
+                    item_column).annotate(count=Count("id")).order_by()
+
+            batch, created = [], 0
+            for row in rows.iterator(chunk_size=ROLLUP_BATCH_SIZE):
+                batch.append(
+                    model(day=row["day"],
+                          technical_level_id=row[
+                              "coachreport__technical_level_id"],
+                          count=row["count"],
+                          **{f"{item_field}_id": row[item_column]}))
+                if len(batch) == ROLLUP_BATCH_SIZE:
+                    created += len(model.objects.bulk_create(batch))
+                    batch = []
+            created += len(model.objects.bulk_create(batch))
+            if stdout:
+                stdout.write(f"  {model.__name__}: {created} rows")
+
+
+def top_items(dimension, since, until, technical_level_id=None, limit=10):
+    """ The most reported tasks or diagnoses per technical level in a date range """
+    model, item_field, _ = ROLLUPS[dimension]
+    rows = model.objects.filter(day__gte=since, day__lte=until)
+    if technical_level_id:
+        rows = rows.filter(technical_level_id=technical_level_id)
+    rows = rows.values("technical_level_id", "technical_level__name",
+                       f"{item_field}_id", f"{item_field}__name").annotate(
+                           total=Sum("count")).filter(total__gt=0).order_by(
+                               "technical_level__name", "technical_level_id",
+                               "-total", f"{item_field}_id")
+
+    groups = {}
+    for row in rows:
+        group = groups.setdefault(
+            row["technical_level_id"], {
+                "technical_level": {
+                    "id": row["technical_level_id"],
+                    "name": row["technical_level__name"],
+                },
+                "total": 0,
+                "items": [],
+            })
+        group["total"] += row["total"]
+        if len(group["items"]) < limit:
+            group["items"].append({
+                "id": row[f"{item_field}_id"],
+                "name": row[f"{item_field}__name"],
+                "count": row["total"],
+            })
+    return list(groups.values())
@@ -0,0 +1,95 @@
+""" ✅ Async twins of the hot read-only routes, for deployments behind an ASGI server.
+
+They return the same JSON as the sync routes but wait on the database with
+the async ORM, so a worker is not tied up per request during traffic spikes.
+Under WSGI they still work (Django runs them in an event loop per request).
+Sync-only middleware such as RequestStatsMiddleware makes Django adapt the
+whole chain to sync, so leave it out of MIDDLEWARE on the ASGI deployment.
+"""
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework.renderers import JSONRenderer
+
+from .charts import aget_chart_data
+from .models import Diagnosis, Drill, KeyPoint, TechnicalLevelTasks
+from .serializers import DrillSerializer, KeyPointSerializer, TechnicalLevelTasksSerializer
+
+
+def render_json(data):
+    return HttpResponse(JSONRenderer().render(data),
+                        content_type="application/json")
+
+
+async def serialize_queryset(serializer_class, queryset):
+    """ Loads the rows (and their prefetches) asynchronously, then serializes in memory """
+    setup_eager_loading = getattr(serializer_class, "setup_eager_loading",
+                                  None)
+    if setup_eager_loading:
+        queryset = setup_eager_loading(queryset)
+    instances = [instance async for instance in queryset]
+    return serializer_class(instances, many=True).data
+
+
+def int_param(request, name):
+    """ Returns the integer query parameter, None when absent; raises ValueError when invalid """
+    value = request.GET.get(name)
+    return int(value) if value else None
+
+
+@require_GET
+async def get_diagnoses(request):
+    """ ✅ Only return diagnoses related to the selected TechnicalLevelTask """
+    try:
+        task_id = int_param(request, "technical_level_task")
+    except ValueError:
+        return JsonResponse(
+            {"error": "Invalid technical_level_task parameter"}, status=400)
+    diagnoses = Diagnosis.objects.order_by("pk")
+    if task_id:
+        diagnoses = diagnoses.filter(technical_level_task_id=task_id)
+    data = [
+        diagnosis async for diagnosis in diagnoses.values(
+            "id", "name", "diagnosis", "measure")
+    ]
+    return JsonResponse(data, safe=False)
+
+
+@require_GET
+async def chart_data(request, level_id):
+    charts = await aget_chart_data([level_id])
+    if level_id not in charts:
+        raise Http404
+    return JsonResponse(charts[level_id], safe=False)
+
+
+@require_GET
+async def get_technical_level_tasks(request, technical_level_name):
+    return render_json(await serialize_queryset(
+        TechnicalLevelTasksSerializer,
+        TechnicalLevelTasks.objects.filter(
+            technical_level__name=technical_level_name).order_by("pk")))
+
+
+@require_GET
+async def drill_list(request):
+    return render_json(await serialize_queryset(
+        DrillSerializer, Drill.objects.order_by("pk")))
+
+
+@require_GET
+async def key_point_list(request):
+    """ Key points, optionally filtered by `?drill=` and `?level=` """
+    try:
+        drill_id = int_param(request, "drill")
+        level_id = int_param(request, "level")
+    except ValueError:
+        return JsonResponse({"error": "Invalid drill or level parameter"},
+                            status=400)
+
+    key_points = KeyPoint.objects.order_by("pk")
+    if drill_id:
+        key_points = key_points.filter(drill_id=drill_id)
+    if level_id:
+        key_points = key_points.filter(level_id=level_id)
+    return render_json(await serialize_queryset(KeyPointSerializer,
+                                                key_points))
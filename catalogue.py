@@ -0,0 +1,80 @@
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from rest_framework.renderers import JSONRenderer
+
+from .models import Level, TechnicalLevel, Task, TechnicalLevelTasks, Diagnosis, Drill, KeyPoint, SituationType, TournamentType, TechnicalPart, MentalTask, PhysicalTask
+from .serializers import LevelSerializer, TechnicalLevelSerializer, TaskSerializer, TechnicalLevelTasksSerializer, DiagnosisSerializer, DrillSerializer, KeyPointSerializer, SituationTypeSerializer, TournamentTypeSerializer, TechnicalPartSerializer, MentalTaskSerializer, PhysicalTaskSerializer
+
+CATALOGUE_VERSION_KEY = "catalogue:version"
+CATALOGUE_SNAPSHOT_KEY = "catalogue:snapshot:{version}"
+# Snapshots of superseded versions are never read again, let them expire
+CATALOGUE_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+# ✅ Section name -> (model, serializer) for everything editors maintain in the admin
+CATALOGUE_SECTIONS = {
+    "levels": (Level, LevelSerializer),
+    "technical_levels": (TechnicalLevel, TechnicalLevelSerializer),
+    "tasks": (Task, TaskSerializer),
+    "technical_level_tasks":
+    (TechnicalLevelTasks, TechnicalLevelTasksSerializer),
+    "diagnoses": (Diagnosis, DiagnosisSerializer),
+    "drills": (Drill, DrillSerializer),
+    "key_points": (KeyPoint, KeyPointSerializer),
+    "situation_types": (SituationType, SituationTypeSerializer),
+    "tournament_types": (TournamentType, TournamentTypeSerializer),
+    "technical_parts": (TechnicalPart, TechnicalPartSerializer),
+    "mental_tasks": (MentalTask, MentalTaskSerializer),
+    "physical_tasks": (PhysicalTask, PhysicalTaskSerializer),
+}
+
+CATALOGUE_MODELS = [model for model, _ in CATALOGUE_SECTIONS.values()]
+
+
+def get_catalogue_version():
+    """ Returns the current content version, creating one if the cache is empty """
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(CATALOGUE_VERSION_KEY, version, timeout=None):
+            version = cache.get(CATALOGUE_VERSION_KEY, version)
+    return version
+
+
+def bump_catalogue_version():
+    """ Invalidates every cached snapshot by moving to a fresh version.
+
+    A random token rather than a counter, so a cache flush can never make an
+    old snapshot key valid again.
+    """
+    cache.set(CATALOGUE_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def build_catalogue_snapshot(version):
+    data = {"version": version}
+    for section, (model, serializer_class) in CATALOGUE_SECTIONS.items():
+        queryset = model.objects.order_by("pk")
+        setup_eager_loading = getattr(serializer_class, "setup_eager_loading",
+                                      None)
+        if setup_eager_loading:
+            queryset = setup_eager_loading(queryset)
+        data[section] = serializer_class(queryset, many=True).data
+
+    body = JSONRenderer().render(data)
+    return {
+        "version": version,
+        "etag": f'"{hashlib.sha256(body).hexdigest()}"',
+        "body": body,
+    }
+
+
+def get_catalogue_snapshot():
+    """ Returns the pre-serialized snapshot for the current version, building it on a miss """
+    version = get_catalogue_version()
+    key = CATALOGUE_SNAPSHOT_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_catalogue_snapshot(version)
+        cache.set(key, snapshot, timeout=CATALOGUE_SNAPSHOT_TIMEOUT)
+    return snapshot
@@ -0,0 +1,126 @@
+from django.core.cache import cache
+
+from .models import Level
+
+CHART_DATA_KEY = "chart-data:{level_id}"
+CHART_DATA_FIELDS = ("id", "coaching_hours", "own_practice_hours",
+                     "physical_hours", "other_sports_hours",
+                     "singles_matches", "doubles_matches")
+WEEKS_PER_YEAR = 46
+
+
+def compute_chart_data(level):
+    """ Yearly hour distribution in percent for one level (a dict of CHART_DATA_FIELDS) """
+    coaching_hours = level["coaching_hours"] * WEEKS_PER_YEAR
+    own_hours = level["own_practice_hours"] * WEEKS_PER_YEAR
+    physical_hours = level["physical_hours"] * WEEKS_PER_YEAR
+    other_sports = level["other_sports_hours"] * WEEKS_PER_YEAR
+    matches = ((level["singles_matches"] * 1.5) +
+               (level["doubles_matches"] * 1.5))
+    total = coaching_hours + own_hours + physical_hours + other_sports + matches
+
+    def percent(hours):
+        # ✅ A level without any hours registered gets an empty chart, not a 500
+        return round(hours / total * 100, 0) if total else 0
+
+    return [
+        {
+            "name": "Med trener",
+            "value": percent(coaching_hours)
+        },
+        {
+            "name": "Egen trening",
+            "value": percent(own_hours)
+        },
+        {
+            "name": "Fysisk trening",
+            "value": percent(physical_hours)
+        },
+        {
+            "name": "Andre idretter",
+            "value": percent(other_sports)
+        },
+        {
+            "name": "Kamp",
+            "value": percent(matches)
+        },
+    ]
+
+
+def chart_cache_keys(level_ids):
+    return {
+        level_id: CHART_DATA_KEY.format(level_id=level_id)
+        for level_id in level_ids
+    }
+
+
+def cached_charts(keys, cached):
+    return {
+        level_id: cached[key]
+        for level_id, key in keys.items() if key in cached
+    }
+
+
+def ordered_charts(level_ids, charts):
+    return {
+        level_id: charts[level_id]
+        for level_id in level_ids if level_id in charts
+    }
+
+
+def get_chart_data(level_ids=None):
+    """ Returns `{level_id: chart}` for the given levels (or all levels).
+
+    Cached charts are read in one `get_many`; the misses are computed from a
+    single query and written back.
+    """
+    if level_ids is None:
+        level_ids = list(Level.objects.values_list("id", flat=True))
+
+    keys = chart_cache_keys(level_ids)
+    charts = cached_charts(keys, cache.get_many(keys.values()))
+
+    missing = [level_id for level_id in level_ids if level_id not in charts]
+    if missing:
+        computed = {
+            level["id"]: compute_chart_data(level)
+            for level in Level.objects.filter(
+                id__in=missing).values(*CHART_DATA_FIELDS)
+        }
+        cache.set_many({keys[level_id]: chart
+                        for level_id, chart in computed.items()},
+                       timeout=None)
+        charts.update(computed)
+
+    return ordered_charts(level_ids, charts)
+
+
+async def aget_chart_data(level_ids=None):
+    """ Async twin of `get_chart_data` for the ASGI routes """
+    if level_ids is None:
+        level_ids = [
+            level_id
+            async for level_id in Level.objects.values_list("id", flat=True)
+        ]
+
+    keys = chart_cache_keys(level_ids)
+    charts = cached_charts(keys, await cache.aget_many(keys.values()))
+
+    missing = [level_id for level_id in level_ids if level_id not in charts]
+    if missing:
+        computed = {
+            level["id"]: compute_chart_data(level)
+            async for level in Level.objects.filter(
+                id__in=missing).values(*CHART_DATA_FIELDS)
+        }
+        await cache.aset_many(
+            {keys[level_id]: chart
+             for level_id, chart in computed.items()},
+            timeout=None)
+        charts.update(computed)
+
+    return ordered_charts(level_ids, charts)
+
+
+def invalidate_chart_data(level_id):
+    cache.delete(CHART_DATA_KEY.format(level_id=level_id))
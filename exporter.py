@@ -0,0 +1,182 @@
+import csv
+import datetime
+import io
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_date
+
+from .models import CoachReport, Diagnosis, KeyPoint, TechnicalLevelTasks
+
+try:
+    import openpyxl
+except ImportError:  # ✅ XLSX export is optional, CSV and NDJSON always work
+    openpyxl = None
+
+EXPORT_CHUNK_SIZE = 2000
+# Rows buffered into one chunk of the streamed response
+ROWS_PER_WRITE = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+COACH_REPORT_COLUMNS = ("id", "created_at", "coach_name", "player_name",
+                        "technical_level", "tasks", "diagnoses")
+KEY_POINT_COLUMNS = ("drill_id", "drill", "situation_type", "category",
+                     "suggested_time", "level_id", "level", "level_order",
+                     "key_point")
+
+
+class ExportError(Exception):
+    """ The export cannot be produced as requested (filters, format) """
+
+
+def parse_date_param(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ExportError(f"{name} must be a date (YYYY-MM-DD)")
+    return date
+
+
+def coach_report_rows(params):
+    """ One row per report; `?since=`/`?until=` limit the report dates (inclusive) """
+    since = parse_date_param(params, "since")
+    until = parse_date_param(params, "until")
+    queryset = CoachReport.objects.select_related("technical_level").only(
+        "id", "created_at", "coach_name", "player_name",
+        "technical_level__name")
+    if since:
+        queryset = queryset.filter(created_at__date__gte=since)
+    if until:
+        queryset = queryset.filter(created_at__date__lte=until)
+    # ✅ With chunk_size the prefetches run once per chunk, not per report
+    queryset = queryset.prefetch_related(
+        Prefetch("tasks",
+                 queryset=TechnicalLevelTasks.objects.only("id", "name")),
+        Prefetch("diagnoses", queryset=Diagnosis.objects.only("id", "name")),
+    ).order_by("pk")
+
+    def rows():
+        for report in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield (report.id, report.created_at, report.coach_name,
+                   report.player_name, report.technical_level.name,
+                   "; ".join(task.name for task in report.tasks.all()),
+                   "; ".join(diagnosis.name
+                             for diagnosis in report.diagnoses.all()))
+
+    return rows()
+
+
+def key_point_rows(params):
+    """ One row per drill and level, the drill/key point catalogue flattened """
+    queryset = KeyPoint.objects.order_by("drill_id", "level__order_number",
+                                         "level_id").values_list(
+                                             "drill_id", "drill__name",
+                                             "drill__situation_type__name",
+                                             "drill__category",
+                                             "drill__suggested_time",
+                                             "level_id", "level__name",
+                                             "level__order_number",
+                                             "description")
+    return queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+# ✅ source -> (columns, function returning an iterator of row tuples)
+EXPORT_SOURCES = {
+    "coach-reports": (COACH_REPORT_COLUMNS, coach_report_rows),
+    "key-points": (KEY_POINT_COLUMNS, key_point_rows),
+}
+
+
+def chunked(rows, size=ROWS_PER_WRITE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value.encode("utf-8")
+
+    def stream():
+        writer.writerow(columns)
+        yield b"\xef\xbb\xbf" + flush()  # BOM, so Excel reads æøå correctly
+        for chunk in chunked(rows):
+            writer.writerows(chunk)
+            yield flush()
+
+    return stream()
+
+
+def write_ndjson(columns, rows):
+
+    def stream():
+        encoder = DjangoJSONEncoder()
+        for chunk in chunked(rows):
+            yield "".join(
+                encoder.encode(dict(zip(columns, row))) + "\n"
+                for row in chunk).encode("utf-8")
+
+    return stream()
+
+
+def excel_value(value):
+    # openpyxl rejects timezone-aware datetimes
+    if isinstance(value, datetime.datetime) and value.tzinfo:
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def write_xlsx(columns, rows):
+    """ XLSX is a zip, so the workbook is written to a temporary file first;
+    write_only mode keeps memory flat while the rows are added """
+    if openpyxl is None:
+        raise ExportError("XLSX export needs openpyxl to be installed")
+
+    def stream():
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(columns)
+        for row in rows:
+            sheet.append([excel_value(value) for value in row])
+        with tempfile.TemporaryFile() as workbook_file:
+            workbook.save(workbook_file)
+            workbook_file.seek(0)
+            while chunk := workbook_file.read(FILE_CHUNK_SIZE):
+                yield chunk
+
+    return stream()
+
+
+# ✅ format -> (content type, writer)
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", write_csv),
+    "ndjson": ("application/x-ndjson", write_ndjson),
+    "xlsx":
+    ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+     write_xlsx),
+}
+
+
+def export_stream(source, file_format, params):
+    """ Returns `(content_type, iterator of bytes)`; raises ExportError up front
+    so the caller can still answer with a 400 """
+    columns, get_rows = EXPORT_SOURCES[source]
+    content_type, write = EXPORT_FORMATS[file_format]
+    return content_type, write(columns, get_rows(params))
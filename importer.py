@@ -0,0 +1,305 @@
+import csv
+import io
+import os
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .catalogue import bump_catalogue_version
+from .models import Level, SituationType, Task, TechnicalLevel, TechnicalLevelTasks, TechnicalPart
+from .pathway import rebuild_pathways
+from .progress import move_tasks_progress
+from .richtext import RICH_TEXT_FIELDS, companion_fields, render_rich_text
+from .search import index_objects
+
+try:
+    import openpyxl
+except ImportError:  # ✅ XLSX support is optional, CSV always works
+    openpyxl = None
+
+IMPORT_BATCH_SIZE = 1000
+# Only the first errors are kept in memory, the rest are counted
+MAX_REPORTED_ERRORS = 1000
+
+# foreign_keys: column -> (related model, required); rows are matched on `name`
+ImportSource = namedtuple(
+    "ImportSource",
+    ["model", "foreign_keys", "fields", "search_kind", "rebuilds_pathways"])
+
+# ✅ kind -> how a spreadsheet row maps onto the model
+IMPORT_SOURCES = {
+    "tasks":
+    ImportSource(model=Task,
+                 foreign_keys={
+                     "level": (Level, True),
+                     "situation_type": (SituationType, True),
+                 },
+                 fields=("description", "video_url", "picture_url",
+                         "picture_desc"),
+                 search_kind="task",
+                 rebuilds_pathways=True),
+    "technical_tasks":
+    ImportSource(model=TechnicalLevelTasks,
+                 foreign_keys={
+                     "technical_level": (TechnicalLevel, True),
+                     "technical_part": (TechnicalPart, False),
+                 },
+                 fields=("category", "description", "video_url",
+                         "picture_url", "picture_desc"),
+                 search_kind="technical_level_task",
+                 rebuilds_pathways=False),
+}
+
+
+class ImportFileError(Exception):
+    """ The file as a whole cannot be imported (format, header) """
+
+
+def read_csv_rows(binary_file):
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    reader = csv.reader(text)
+    header = next(reader, None)
+    if header is None:
+        return
+    yield header
+    yield from reader
+
+
+def read_xlsx_rows(binary_file):
+    if openpyxl is None:
+        raise ImportFileError("XLSX import needs openpyxl to be installed")
+    # read_only streams the sheet instead of loading every cell
+    workbook = openpyxl.load_workbook(binary_file,
+                                      read_only=True,
+                                      data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ["" if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+ROW_READERS = {"csv": read_csv_rows, "xlsx": read_xlsx_rows}
+
+
+def detect_format(filename):
+    file_format = os.path.splitext(filename)[1].lstrip(".").lower()
+    if file_format not in ROW_READERS:
+        raise ImportFileError(f"Unsupported file type: {filename}")
+    return file_format
+
+
+def read_rows(binary_file, file_format):
+    """ Yields `(row_number, {column: value})`, one row at a time """
+    rows = ROW_READERS[file_format](binary_file)
+    header = next(rows, None)
+    if header is None:
+        return
+    columns = [column.strip().lower() for column in header]
+    for row_number, values in enumerate(rows, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        # Short rows get the missing trailing cells, every row has every column
+        values = list(values) + [""] * (len(columns) - len(values))
+        yield row_number, {
+            column: value.strip()
+            for column, value in zip(columns, values) if column
+        }
+
+
+def load_name_map(model):
+    """ name -> id; with duplicate names the oldest row wins, like a `.first()` lookup """
+    return dict(
+        model.objects.order_by("-pk").values_list("name", "id").iterator())
+
+
+def clean_value(field, value, instance):
+    if value == "":
+        return None if field.null else ""
+    return field.clean(value, instance)
+
+
+class StreamingImporter:
+    """ Upserts rows in batches with the foreign keys resolved from in-memory maps.
+
+    Rows with errors are skipped and reported; everything else is imported.
+    """
+
+    def __init__(self,
+                 kind,
+                 batch_size=IMPORT_BATCH_SIZE,
+                 index_search=True,
+                 progress=None):
+        self.source = IMPORT_SOURCES[kind]
+        self.batch_size = batch_size
+        self.index_search = index_search
+        self.progress = progress
+        self.result = {"rows": 0, "created": 0, "updated": 0, "errors": 0}
+        self.errors = []
+        self.level_ids = set()
+
+    def run(self, rows):
+        source = self.source
+        self.name_maps = {
+            column: load_name_map(related_model)
+            for column, (related_model, _) in source.foreign_keys.items()
+        }
+
+        batch = []
+        for row_number, row in rows:
+            if not self.result["rows"] and not batch:
+                self.check_columns(row)
+            batch.append((row_number, row))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+
+        if self.result["created"] or self.result["updated"]:
+            transaction.on_commit(bump_catalogue_version)
+            if self.level_ids:
+                level_ids = set(self.level_ids)
+                transaction.on_commit(lambda: rebuild_pathways(level_ids))
+        return dict(self.result, error_details=self.errors)
+
+    def check_columns(self, row):
+        required = ["name"] + [
+            column
+            for column, (_, required) in self.source.foreign_keys.items()
+            if required
+        ]
+        missing = [column for column in required if column not in row]
+        if missing:
+            raise ImportFileError(f"Missing columns: {', '.join(missing)}")
+
+    def add_error(self, row_number, message):
+        self.result["errors"] += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": message})
+
+    def build_instance(self, row):
+        """ Returns an unsaved instance with the given columns set, or raises ValidationError """
+        source = self.source
+        model = source.model
+        instance = model()
+        instance.name = clean_value(model._meta.get_field("name"),
+                                    row["name"], instance)
+        if not instance.name:
+            raise ValidationError("name is empty")
+
+        for column, (related_model, required) in source.foreign_keys.items():
+            if column not in row:
+                continue
+            name = row[column]
+            if not name:
+                if required:
+                    raise ValidationError(f"{column} is empty")
+                setattr(instance, f"{column}_id", None)
+                continue
+            related_id = self.name_maps[column].get(name)
+            if related_id is None:
+                raise ValidationError(
+                    f"Unknown {related_model._meta.verbose_name}: {name}")
+            setattr(instance, f"{column}_id", related_id)
+
+        for field_name in source.fields:
+            if field_name in row:
+                field = model._meta.get_field(field_name)
+                setattr(instance, field_name,
+                        clean_value(field, row[field_name], instance))
+        # bulk_create/bulk_update skip pre_save, render the TinyMCE fields here
+        render_rich_text(instance, self.rich_text_fields(row))
+        return instance
+
+    def rich_text_fields(self, row):
+        return [
+            name for name in RICH_TEXT_FIELDS.get(self.source.model, ())
+            if name in row
+        ]
+
+    def progress_move(self, task, row, previous):
+        """ (task id, previous counter key, new counter key) of an updated task """
+        columns = ("level", "situation_type")
+        return (task.pk,
+                tuple(previous[f"{column}_id"] for column in columns),
+                tuple(
+                    getattr(task, f"{column}_id") if column in
+                    row else previous[f"{column}_id"] for column in columns))
+
+    def import_batch(self, batch):
+        source = self.source
+        model = source.model
+        instances = {}
+        for row_number, row in batch:
+            self.result["rows"] += 1
+            try:
+                instance = self.build_instance(row)
+            except ValidationError as error:
+                self.add_error(row_number, "; ".join(error.messages))
+                continue
+            # A name repeated within the batch: the last row wins
+            instances[instance.name] = (instance, row)
+
+        tracked = ["name", "id"] + (["level_id"]
+                                    if source.rebuilds_pathways else [])
+        if model is Task:
+            # Player progress counters are kept per level and situation type
+            tracked += ["situation_type_id"]
+        existing = {
+            values["name"]: values
+            for values in model.objects.filter(
+                name__in=instances).order_by("-pk").values(*tracked)
+        }
+
+        created, updated, update_fields, moved = [], [], set(), []
+        now = timezone.now()
+        for name, (instance, row) in instances.items():
+            if name in existing:
+                instance.pk = existing[name]["id"]
+                instance.updated_at = now
+                update_fields.update(
+                    field_name for field_name in source.fields
+                    if field_name in row)
+                update_fields.update(column for column in source.foreign_keys
+                                     if column in row)
+                update_fields.update(
+                    companion_fields(self.rich_text_fields(row)))
+                if source.rebuilds_pathways:
+                    self.level_ids.add(existing[name]["level_id"])
+                if model is Task:
+                    moved.append(self.progress_move(instance, row,
+                                                    existing[name]))
+                updated.append(instance)
+            else:
+                created.append(instance)
+            if source.rebuilds_pathways and instance.level_id:
+                self.level_ids.add(instance.level_id)
+
+        with transaction.atomic():
+            # bulk_create/bulk_update skip post_save, so the search index is
+            # updated here and the catalogue and pathways once in run()
+            model.objects.bulk_create(created)
+            if updated:
+                model.objects.bulk_update(
+                    updated, sorted(update_fields) + ["updated_at"])
+            # bulk_update also skips the Task signal that moves these
+            move_tasks_progress(moved)
+            if self.index_search:
+                # Reloaded, updated rows only carry the imported columns
+                touched = [instance.pk for instance in created + updated]
+                index_objects(source.search_kind,
+                              model.objects.filter(pk__in=touched))
+
+        self.result["created"] += len(created)
+        self.result["updated"] += len(updated)
+        if self.progress:
+            self.progress(dict(self.result))
+
+
+def import_file(kind, binary_file, filename, **options):
+    """ Imports an uploaded or opened binary file, picking the reader from the extension """
+    rows = read_rows(binary_file, detect_format(filename))
+    return StreamingImporter(kind, **options).run(rows)
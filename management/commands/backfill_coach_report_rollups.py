@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from core.analytics import ROLLUPS, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the daily coach report rollups from the report task and "
+            "diagnosis tables, e.g. for reports created before the rollups "
+            "existed or loaded with bulk_create")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dimension",
+                            choices=sorted(ROLLUPS),
+                            action="append",
+                            help="Only rebuild these rollups (default all)")
+
+    def handle(self, *args, **options):
+        rebuild_rollups(options["dimension"], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Coach report rollups rebuilt"))
@@ -0,0 +1,96 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.middleware import percentile
+from core.models import Level, TechnicalLevel
+from core.urls import router
+
+
+class Command(BaseCommand):
+    help = ("Requests every API endpoint through the test client and writes "
+            "latency percentiles, query counts and response sizes to JSON")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--output",
+                            default="api_benchmark.json",
+                            help="Path of the JSON report")
+
+    def endpoints(self):
+        """ Every router list route plus the function-based endpoints """
+        endpoints = {
+            f"{basename}-list": reverse(f"{basename}-list")
+            for _, _, basename in router.registry
+        }
+        level = Level.objects.order_by("order_number").first()
+        technical_level = TechnicalLevel.objects.first()
+        endpoints["catalogue"] = reverse("catalogue")
+        endpoints["chart-data-batch"] = reverse("chart-data-batch")
+        endpoints["search"] = reverse("search") + "?q=forehand"
+        if level:
+            endpoints["chart-data"] = reverse("chart-data", args=[level.id])
+            endpoints["drill-count-by-situation-type"] = reverse(
+                "drill-count-by-situation-type") + f"?level={level.id}"
+            endpoints["level-pathway"] = reverse("level-pathway",
+                                                 args=[level.id])
+        if technical_level:
+            endpoints["get-technical-level-tasks"] = reverse(
+                "get-technical-level-tasks", args=[technical_level.name])
+        return endpoints
+
+    def measure(self, client, url, iterations):
+        timings, queries, size, status = [], 0, 0, None
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                content = b"".join(response) if response.streaming else (
+                    response.content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries = max(queries, len(context.captured_queries))
+            size, status = len(content), response.status_code
+        timings.sort()
+        return {
+            "url": url,
+            "status": status,
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "mean_ms": round(statistics.mean(timings), 2),
+            "queries": queries,
+            "bytes": size,
+        }
+
+    def handle(self, *args, **options):
+        # The test client talks to "testserver"
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            client = Client()
+            results = {}
+            for name, url in self.endpoints().items():
+                results[name] = self.measure(client, url,
+                                             options["iterations"])
+                self.stdout.write(
+                    f"{name:40} p50 {results[name]['p50_ms']:>8} ms  "
+                    f"p95 {results[name]['p95_ms']:>8} ms  "
+                    f"{results[name]['queries']:>4} queries  "
+                    f"{results[name]['bytes']:>9} bytes")
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "iterations": options["iterations"],
+            "database": connection.vendor,
+            "endpoints": results,
+        }
+        with open(options["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Report written to {options['output']}"))
@@ -0,0 +1,161 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.middleware import percentile
+from core.models import Drill, Level, TechnicalLevel
+
+
+class Command(BaseCommand):
+    help = ("Compares throughput of the sync routes on a pool of worker "
+            "threads with their async twins at high concurrency, in process. "
+            "--db-latency-ms adds a delay to every query to mimic a database "
+            "across the network, which is where the async routes pay off.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency",
+                            type=int,
+                            default=100,
+                            help="Requests in flight on the async routes")
+        parser.add_argument("--workers",
+                            type=int,
+                            default=8,
+                            help="Threads serving the sync routes")
+        parser.add_argument("--db-latency-ms", type=float, default=0)
+        parser.add_argument("--output",
+                            default="async_benchmark.json",
+                            help="Path of the JSON report")
+
+    def route_pairs(self):
+        """ name -> (sync url, async url) """
+        level = Level.objects.order_by("order_number").first()
+        drill = Drill.objects.first()
+        technical_level = TechnicalLevel.objects.first()
+        pairs = {"drills": (reverse("drill-list"), reverse("async-drills"))}
+        if level:
+            pairs["chart-data"] = (reverse("chart-data", args=[level.id]),
+                                   reverse("async-chart-data",
+                                           args=[level.id]))
+        if drill:
+            pairs["keypoints"] = (reverse("keypoint-list") +
+                                  f"?drill={drill.id}",
+                                  reverse("async-keypoints") +
+                                  f"?drill={drill.id}")
+        if technical_level:
+            pairs["technical-level-tasks"] = (
+                reverse("get-technical-level-tasks",
+                        args=[technical_level.name]),
+                reverse("async-technical-level-tasks",
+                        args=[technical_level.name]))
+        return pairs
+
+    def summarize(self, timings, elapsed, statuses):
+        timings.sort()
+        return {
+            "requests_per_second": round(len(timings) / elapsed, 1),
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "statuses": sorted(set(statuses)),
+        }
+
+    def run_sync(self, url, requests, workers):
+
+        def request(_):
+            started = time.perf_counter()
+            response = Client().get(url)
+            return (time.perf_counter() - started) * 1000, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(request, range(requests)))
+        elapsed = time.perf_counter() - started
+        return self.summarize([timing for timing, _ in results], elapsed,
+                              [status for _, status in results])
+
+    def run_async(self, url, requests, concurrency):
+
+        async def main():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def request():
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(url)
+                    return ((time.perf_counter() - started) * 1000,
+                            response.status_code)
+
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(request() for _ in range(requests)))
+            return results, time.perf_counter() - started
+
+        results, elapsed = asyncio.run(main())
+        return self.summarize([timing for timing, _ in results], elapsed,
+                              [status for _, status in results])
+
+    def handle(self, *args, **options):
+        delay = options["db_latency_ms"] / 1000
+
+        def add_latency(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def install_latency(sender, connection, **kwargs):
+            connection.execute_wrappers.append(add_latency)
+
+        if delay:
+            # Every thread opens its own connection, wrap each of them
+            connection_created.connect(install_latency)
+        try:
+            results = self.compare(options)
+        finally:
+            connection_created.disconnect(install_latency)
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "requests": options["requests"],
+            "concurrency": options["concurrency"],
+            "workers": options["workers"],
+            "db_latency_ms": options["db_latency_ms"],
+            "routes": results,
+        }
+        with open(options["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def compare(self, options):
+        results = {}
+        # The test clients talk to "testserver"
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for name, (sync_url, async_url) in self.route_pairs().items():
+                results[name] = {
+                    "sync":
+                    self.run_sync(sync_url, options["requests"],
+                                  options["workers"]),
+                    "async":
+                    self.run_async(async_url, options["requests"],
+                                   options["concurrency"]),
+                }
+                for mode in ("sync", "async"):
+                    result = results[name][mode]
+                    self.stdout.write(
+                        f"{name:25} {mode:5} "
+                        f"{result['requests_per_second']:>8} req/s  "
+                        f"p50 {result['p50_ms']:>8} ms  "
+                        f"p95 {result['p95_ms']:>8} ms")
+        return results
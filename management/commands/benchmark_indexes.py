@@ -0,0 +1,158 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+from core.models import Drill, KeyPoint, Level, SituationType, TechnicalLevel, TechnicalLevelTasks
+
+# Indexes added for the hot filter paths (migration 0038). The unique
+# (drill, level) constraint is kept in both runs since provisioning relies on it.
+BENCHMARKED_INDEXES = [
+    "keypoint_filled_level_drill",
+    "level_order_number_idx",
+    "technicallevel_name_idx",
+]
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Loads a synthetic key point table, then prints EXPLAIN plans and "
+            "timings for the hot queries with and without the hot-path "
+            "indexes. Everything runs in a transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--levels", type=int, default=20)
+        parser.add_argument("--drills", type=int, default=50000)
+        parser.add_argument("--filled",
+                            type=float,
+                            default=0.3,
+                            help="Share of key points with a description")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        try:
+            with transaction.atomic():
+                self.load_synthetic_data()
+                self.run_queries("with hot-path indexes")
+                self.drop_indexes()
+                self.run_queries("without hot-path indexes")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def load_synthetic_data(self):
+        options = self.options
+        started = time.perf_counter()
+        situation_types = SituationType.objects.bulk_create([
+            SituationType(name=f"Bench situation {i}", category="Taktisk")
+            for i in range(8)
+        ])
+        technical_levels = TechnicalLevel.objects.bulk_create([
+            TechnicalLevel(name=f"Bench technical level {i}", description="")
+            for i in range(10)
+        ])
+        TechnicalLevelTasks.objects.bulk_create([
+            TechnicalLevelTasks(name=f"Bench task {i}",
+                                description="",
+                                technical_level=technical_levels[i % 10])
+            for i in range(1000)
+        ])
+        # bulk_create skips the post_save provisioning, key points are added below
+        self.levels = Level.objects.bulk_create([
+            Level(name=f"Bench level {i}", description="", order_number=i)
+            for i in range(options["levels"])
+        ])
+        self.drills = Drill.objects.bulk_create(
+            [
+                Drill(name=f"Bench drill {i}",
+                      description="",
+                      situation_type=self.random.choice(situation_types))
+                for i in range(options["drills"])
+            ],
+            batch_size=5000,
+        )
+
+        def key_points():
+            for drill in self.drills:
+                for level in self.levels:
+                    filled = self.random.random() < options["filled"]
+                    yield KeyPoint(drill_id=drill.id,
+                                   level_id=level.id,
+                                   description="Keep the racket up"
+                                   if filled else "")
+
+        batch = []
+        for key_point in key_points():
+            batch.append(key_point)
+            if len(batch) == 10000:
+                KeyPoint.objects.bulk_create(batch)
+                batch = []
+        KeyPoint.objects.bulk_create(batch)
+
+        self.drill_ids = [
+            drill.id for drill in self.random.sample(self.drills, 50)
+        ]
+
+        if connection.vendor in ("postgresql", "sqlite"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        self.stdout.write(
+            f"Loaded {len(self.levels) * len(self.drills)} key points in "
+            f"{time.perf_counter() - started:.1f}s")
+
+    def hot_queries(self):
+        level = self.levels[len(self.levels) // 2]
+        drill_ids = self.drill_ids
+        filled = KeyPoint.objects.exclude(description__isnull=True).exclude(
+            description="")
+        return {
+            "key points for level and drills":
+            filled.filter(level_id=level.id, drill_id__in=drill_ids),
+            "drill counts for one level":
+            filled.filter(level_id=level.id).values(
+                "drill__situation_type__name").annotate(
+                    drill_count=Count("drill_id", distinct=True)).order_by(),
+            "technical level tasks by name":
+            TechnicalLevelTasks.objects.filter(
+                technical_level__name="Bench technical level 3"),
+            "levels ordered by order_number":
+            Level.objects.order_by("order_number")[:10],
+        }
+
+    def run_queries(self, label):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {label} =="))
+        for name, queryset in self.hot_queries().items():
+            timings = []
+            for _ in range(self.options["repeat"]):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"\n{name}: median {statistics.median(timings):.2f} ms, "
+                f"max {max(timings):.2f} ms")
+            self.stdout.write(self.explain(queryset, label))
+
+    def explain(self, queryset, label):
+        """ EXPLAIN with a per-pass comment: SQLite's statement cache would
+        otherwise return the plan prepared before the indexes were dropped """
+        sql, params = queryset.query.sql_with_params()
+        prefix = ("EXPLAIN QUERY PLAN"
+                  if connection.vendor == "sqlite" else "EXPLAIN")
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql} -- {label}", params)
+            return "\n".join(
+                " ".join(map(str, row)) for row in cursor.fetchall())
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for name in BENCHMARKED_INDEXES:
+                cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
@@ -0,0 +1,159 @@
+import datetime
+import json
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from core.middleware import percentile
+from core.models import Level, Player, PlayerProgress, SituationType, Task, TechnicalLevel
+from core.progress import rebuild_progress_counters
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Loads synthetic players with progress, then measures the squad "
+            "progress endpoint for growing squad sizes. Everything runs in a "
+            "transaction that is rolled back.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes",
+                            default="10,100,1000",
+                            help="Comma separated squad sizes")
+        parser.add_argument("--levels", type=int, default=5)
+        parser.add_argument("--tasks-per-level", type=int, default=40)
+        parser.add_argument("--completed",
+                            type=float,
+                            default=0.5,
+                            help="Share of tasks each player has completed")
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output",
+                            default="squad_benchmark.json",
+                            help="Path of the JSON report")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options["seed"])
+        sizes = sorted(int(size) for size in options["sizes"].split(","))
+        try:
+            with transaction.atomic():
+                player_ids = self.load_synthetic_data(sizes[-1])
+                results = self.measure_sizes(sizes, player_ids)
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "tasks_per_level": options["tasks_per_level"],
+            "completed": options["completed"],
+            "sizes": results,
+        }
+        with open(options["output"], "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(
+            self.style.SUCCESS(f"Report written to {options['output']}"))
+
+    def load_synthetic_data(self, player_count):
+        options, rng = self.options, self.random
+        started = time.perf_counter()
+        # bulk_create skips the post_save handlers, the counters are rebuilt below
+        situation_types = SituationType.objects.bulk_create([
+            SituationType(name=f"Bench situation {i}", category=category)
+            for i, category in enumerate(["Taktisk", "Mentalt", "Fysisk"])
+        ])
+        technical_level = TechnicalLevel.objects.create(
+            name="Bench technical level", description="")
+        levels = Level.objects.bulk_create([
+            Level(name=f"Bench level {i}",
+                  description="",
+                  order_number=i,
+                  required_technical_level=technical_level)
+            for i in range(options["levels"])
+        ])
+        tasks = Task.objects.bulk_create([
+            Task(name=f"Bench task {level.order_number}.{i}",
+                 description="",
+                 level=level,
+                 situation_type=situation_types[i % len(situation_types)])
+            for level in levels for i in range(options["tasks_per_level"])
+        ])
+        players = Player.objects.bulk_create([
+            Player(name=f"Bench player {i:05}",
+                   date_of_birth=datetime.date(2010, 1, 1),
+                   current_level=rng.choice(levels),
+                   current_technical_level=technical_level)
+            for i in range(player_count)
+        ])
+
+        tasks_by_level = {}
+        for task in tasks:
+            tasks_by_level.setdefault(task.level_id, []).append(task)
+        now = timezone.now()
+        PlayerProgress.objects.bulk_create(
+            [
+                PlayerProgress(player=player,
+                               task=task,
+                               is_completed=True,
+                               completion_date=now) for player in players
+                for task in tasks_by_level[player.current_level_id]
+                if rng.random() < options["completed"]
+            ],
+            batch_size=5000,
+        )
+        rebuild_progress_counters()
+        if connection.vendor in ("postgresql", "sqlite"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+
+        self.stdout.write(
+            f"Loaded {player_count} players and "
+            f"{PlayerProgress.objects.count()} progress rows in "
+            f"{time.perf_counter() - started:.1f}s")
+        return [player.pk for player in players]
+
+    def measure_sizes(self, sizes, player_ids):
+        results = {}
+        # The test client talks to "testserver"
+        with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            client = Client()
+            for size in sizes:
+                url = reverse("squad-progress") + "?players=" + ",".join(
+                    map(str, player_ids[:size]))
+                timings, queries, status = [], 0, None
+                for _ in range(self.options["iterations"]):
+                    with CaptureQueriesContext(connection) as context:
+                        started = time.perf_counter()
+                        response = client.get(url)
+                        timings.append((time.perf_counter() - started) * 1000)
+                    queries = max(queries, len(context.captured_queries))
+                    status = response.status_code
+                timings.sort()
+                results[size] = {
+                    "status": status,
+                    "p50_ms": round(percentile(timings, 50), 2),
+                    "p95_ms": round(percentile(timings, 95), 2),
+                    "mean_ms": round(statistics.mean(timings), 2),
+                    "ms_per_player": round(statistics.mean(timings) / size,
+                                           3),
+                    "queries": queries,
+                    "bytes": len(response.content),
+                }
+                self.stdout.write(
+                    f"{size:>6} players  p50 {results[size]['p50_ms']:>8} ms  "
+                    f"p95 {results[size]['p95_ms']:>8} ms  "
+                    f"{queries:>3} queries")
+        return results
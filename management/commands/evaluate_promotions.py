@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.promotions import evaluate_promotions
+
+
+class Command(BaseCommand):
+    help = ("Finds every player who completed their current level (see the "
+            "PROMOTION_THRESHOLD setting) and writes a pending promotion for "
+            "coach approval, in one set-based pass")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = evaluate_promotions()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{result['created']} promotions proposed, "
+                f"{result['updated']} updated, {result['removed']} withdrawn "
+                f"in {time.perf_counter() - started:.1f}s"))
@@ -0,0 +1,232 @@
+import datetime
+import random
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from core.catalogue import bump_catalogue_version
+from core.models import CoachReport, Diagnosis, Drill, KeyPoint, Level, MentalTask, PhysicalTask, SituationType, Task, TechnicalLevel, TechnicalLevelTasks, TechnicalPart, TournamentType, TrainingPlan, TrainingPlanDrill
+from core.richtext import RICH_TEXT_FIELDS, render_rich_text
+
+BATCH_SIZE = 5000
+
+LOREM = ("Hold racketen foran kroppen, flytt føttene tidlig og treff ballen "
+         "foran. Fokuser på balanse, rytme og et kontrollert gjennomsving. ")
+
+
+def html_paragraphs(rng, count):
+    return "".join(f"<p>{LOREM * rng.randint(1, 4)}</p>" for _ in range(count))
+
+
+class Command(BaseCommand):
+    help = ("Fills the database with a synthetic catalogue at a configurable "
+            "scale, for load tests and benchmarks. Running it again adds "
+            "another set of rows; the same --seed reuses its technical parts")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--levels", type=int, default=10)
+        parser.add_argument("--technical-levels", type=int, default=8)
+        parser.add_argument("--drills", type=int, default=2000)
+        parser.add_argument("--tasks-per-level", type=int, default=30)
+        parser.add_argument("--technical-tasks-per-level",
+                            type=int,
+                            default=40)
+        parser.add_argument("--diagnoses-per-technical-task",
+                            type=int,
+                            default=3)
+        parser.add_argument("--coach-reports", type=int, default=1000)
+        parser.add_argument("--training-plans", type=int, default=200)
+        parser.add_argument("--drills-per-plan", type=int, default=12)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--skip-search-index",
+                            action="store_true",
+                            help="Do not rebuild the search index afterwards")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        prefix = f"Synthetic {options['seed']}"
+
+        with transaction.atomic():
+            self.generate(prefix, options)
+            transaction.on_commit(bump_catalogue_version)
+
+        if not options["skip_search_index"]:
+            call_command("rebuild_search_index", stdout=self.stdout)
+        call_command("rebuild_pathways", stdout=self.stdout)
+        call_command("backfill_coach_report_rollups", stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Synthetic catalogue generated"))
+
+    def create(self, model, objects):
+        """ bulk_create in batches; skips the post_save handlers on purpose """
+        if model in RICH_TEXT_FIELDS:
+            # ... but not the pre-rendered HTML that pre_save would fill in
+            for instance in objects:
+                render_rich_text(instance)
+        created = model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        self.stdout.write(f"  {model.__name__}: {len(created)}")
+        return created
+
+    def generate(self, prefix, options):
+        rng = self.rng
+        situation_types = self.create(SituationType, [
+            SituationType(name=f"{prefix} situation {i}",
+                          category=category)
+            for i, category in enumerate(["Taktisk", "Mentalt", "Fysisk"] * 3)
+        ])
+        tournament_types = self.create(TournamentType, [
+            TournamentType(name=f"{prefix} tournament {i}", short_name=f"T{i}")
+            for i in range(5)
+        ])
+        # Technical part names are unique, a re-run with the same seed reuses them
+        part_names = [f"{prefix} part {i}" for i in range(6)]
+        existing_parts = set(
+            TechnicalPart.objects.filter(name__in=part_names).values_list(
+                "name", flat=True))
+        self.create(TechnicalPart, [
+            TechnicalPart(name=name)
+            for name in part_names if name not in existing_parts
+        ])
+        technical_parts = list(
+            TechnicalPart.objects.filter(name__in=part_names).order_by("pk"))
+        technical_levels = self.create(TechnicalLevel, [
+            TechnicalLevel(name=f"{prefix} technical level {i}",
+                           description=html_paragraphs(rng, 3),
+                           order_number=i)
+            for i in range(options["technical_levels"])
+        ])
+        levels = self.create(Level, [
+            Level(name=f"{prefix} level {i}",
+                  short_desc="Synthetic level",
+                  description=html_paragraphs(rng, 4),
+                  order_number=i,
+                  required_technical_level=rng.choice(technical_levels),
+                  coaching_hours=rng.randint(1, 10),
+                  own_practice_hours=rng.randint(0, 6),
+                  physical_hours=rng.randint(0, 4),
+                  other_sports_hours=rng.randint(0, 4),
+                  singles_matches=rng.randint(0, 60),
+                  doubles_matches=rng.randint(0, 30))
+            for i in range(options["levels"])
+        ])
+        Level.type_of_tournament.through.objects.bulk_create([
+            Level.type_of_tournament.through(level_id=level.id,
+                                             tournamenttype_id=tournament.id)
+            for level in levels
+            for tournament in rng.sample(tournament_types, 2)
+        ])
+
+        self.create(Task, [
+            Task(name=f"{prefix} task {level.id}-{i}",
+                 description=LOREM,
+                 level=level,
+                 situation_type=rng.choice(situation_types)) for level in levels
+            for i in range(options["tasks_per_level"])
+        ])
+        technical_tasks = self.create(TechnicalLevelTasks, [
+            TechnicalLevelTasks(
+                name=f"{prefix} technical task {technical_level.id}-{i}",
+                category=rng.choice(TechnicalLevelTasks.CATEGORY_CHOICES)[0],
+                technical_part=rng.choice(technical_parts),
+                technical_level=technical_level,
+                description=LOREM,
+                picture_desc=html_paragraphs(rng, 1))
+            for technical_level in technical_levels
+            for i in range(options["technical_tasks_per_level"])
+        ])
+        diagnoses = self.create(Diagnosis, [
+            Diagnosis(technical_level_task=task,
+                      name=f"{prefix} diagnosis {task.id}-{i}",
+                      diagnosis=html_paragraphs(rng, 2),
+                      measure=html_paragraphs(rng, 2))
+            for task in technical_tasks
+            for i in range(options["diagnoses_per_technical_task"])
+        ])
+
+        drills = self.create(Drill, [
+            Drill(name=f"{prefix} drill {i}",
+                  description=html_paragraphs(rng, 2),
+                  situation_type=rng.choice(situation_types),
+                  suggested_time=rng.choice([5, 10, 15, 20]),
+                  category=rng.choice(["Feeding", "Semi-Live", "Live"]))
+            for i in range(options["drills"])
+        ])
+        self.create(KeyPoint, [
+            KeyPoint(drill=drill,
+                     level=level,
+                     description=LOREM if rng.random() < 0.4 else "")
+            for drill in drills for level in levels
+        ])
+        for model in (MentalTask, PhysicalTask):
+            category = model._meta.get_field("category").choices[0][0]
+            tasks = self.create(model, [
+                model(name=f"{prefix} {model.__name__} {level.id}-{i}",
+                      description=LOREM,
+                      level=level,
+                      category=category) for level in levels
+                for i in range(3)
+            ])
+            through = model.drills.through
+            owner_field = f"{model._meta.model_name}_id"
+            through.objects.bulk_create([
+                through(**{
+                    owner_field: task.id,
+                    "drill_id": drill.id
+                }) for task in tasks for drill in rng.sample(drills, 2)
+            ])
+
+        today = datetime.date.today()
+        tasks_by_level = {}
+        for task in technical_tasks:
+            tasks_by_level.setdefault(task.technical_level_id, []).append(task)
+        diagnoses_by_task = {}
+        for diagnosis in diagnoses:
+            diagnoses_by_task.setdefault(diagnosis.technical_level_task_id,
+                                         []).append(diagnosis)
+
+        reports = self.create(CoachReport, [
+            CoachReport(coach_name=f"Coach {rng.randint(1, 40)}",
+                        player_name=f"Player {rng.randint(1, 2000)}",
+                        technical_level=rng.choice(technical_levels))
+            for _ in range(options["coach_reports"])
+        ])
+        # created_at is auto_now_add, spread the reports over the last year
+        now = timezone.now()
+        for report in reports:
+            report.created_at = now - datetime.timedelta(
+                minutes=rng.randint(0, 365 * 24 * 60))
+        CoachReport.objects.bulk_update(reports, ["created_at"],
+                                        batch_size=BATCH_SIZE)
+
+        report_tasks, report_diagnoses = [], []
+        for report in reports:
+            level_tasks = tasks_by_level.get(report.technical_level_id, [])
+            for task in rng.sample(level_tasks, min(3, len(level_tasks))):
+                report_tasks.append(
+                    CoachReport.tasks.through(
+                        coachreport_id=report.id,
+                        technicalleveltasks_id=task.id))
+                for diagnosis in diagnoses_by_task.get(task.id, [])[:1]:
+                    report_diagnoses.append(
+                        CoachReport.diagnoses.through(
+                            coachreport_id=report.id,
+                            diagnosis_id=diagnosis.id))
+        CoachReport.tasks.through.objects.bulk_create(report_tasks,
+                                                      batch_size=BATCH_SIZE)
+        CoachReport.diagnoses.through.objects.bulk_create(
+            report_diagnoses, batch_size=BATCH_SIZE)
+
+        plans = self.create(TrainingPlan, [
+            TrainingPlan(name=f"{prefix} plan {i}",
+                         date=today - datetime.timedelta(days=i % 365))
+            for i in range(options["training_plans"])
+        ])
+        self.create(TrainingPlanDrill, [
+            TrainingPlanDrill(training_plan=plan,
+                              drill=drill,
+                              selected_level=rng.choice(levels),
+                              time_allocated=drill.suggested_time)
+            for plan in plans
+            for drill in rng.sample(drills, min(options["drills_per_plan"],
+                                                len(drills)))
+        ])
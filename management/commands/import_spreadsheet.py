@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.importer import IMPORT_BATCH_SIZE, IMPORT_SOURCES, ImportFileError, import_file
+
+
+class Command(BaseCommand):
+    help = ("Streams a CSV/XLSX file of tasks or technical tasks into the "
+            "database, upserting by name in batches")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(IMPORT_SOURCES))
+        parser.add_argument("path")
+        parser.add_argument("--batch-size",
+                            type=int,
+                            default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--skip-search-index",
+                            action="store_true",
+                            help="Do not index the imported rows for search")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], "rb") as binary_file:
+                result = import_file(
+                    options["kind"],
+                    binary_file,
+                    options["path"],
+                    batch_size=options["batch_size"],
+                    index_search=not options["skip_search_index"],
+                    progress=self.report_progress)
+        except (OSError, ImportFileError) as error:
+            raise CommandError(error)
+
+        for error in result["error_details"]:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        if result["errors"] > len(result["error_details"]):
+            self.stderr.write(
+                f"... and {result['errors'] - len(result['error_details'])} "
+                "more errors")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {result['rows']} rows: {result['created']} "
+                f"created, {result['updated']} updated, {result['errors']} "
+                "errors"))
+
+    def report_progress(self, result):
+        self.stdout.write(f"  {result['rows']} rows processed "
+                          f"({result['errors']} errors)")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.models import LevelPathway
+from core.pathway import rebuild_pathways
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the stored player pathway document for every level"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            LevelPathway.objects.all().delete()
+            rebuilt = rebuild_pathways()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rebuilt} pathway documents"))
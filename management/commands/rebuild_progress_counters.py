@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.progress import rebuild_progress_counters
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the per player, level and situation type progress "
+            "counters from PlayerProgress, e.g. after rows were loaded with "
+            "bulk_create or edited in SQL")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check",
+                            action="store_true",
+                            help="Only report wrong counters and fail if any")
+
+    def handle(self, *args, **options):
+        wrong = rebuild_progress_counters(check=options["check"],
+                                          stdout=self.stdout)
+        if options["check"] and wrong:
+            raise CommandError(f"{wrong} progress counters are out of date")
+        if wrong:
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt progress counters, {wrong} "
+                                   "were out of date"))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS("Progress counters are up to date"))
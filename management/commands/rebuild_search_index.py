@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.exporter import chunked
+from core.models import SearchDocument
+from core.search import SEARCH_SOURCES, index_objects
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the search index for drills, tasks, diagnoses and technical tasks"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            SearchDocument.objects.all().delete()
+            for kind, (model, _, _) in SEARCH_SOURCES.items():
+                count = 0
+                # A fixed number of queries per chunk rather than per row
+                for chunk in chunked(
+                        model.objects.order_by("pk").iterator(
+                            chunk_size=CHUNK_SIZE), CHUNK_SIZE):
+                    index_objects(kind, chunk)
+                    count += len(chunk)
+                self.stdout.write(f"Indexed {count} {kind} rows")
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
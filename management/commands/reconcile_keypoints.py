@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from core.models import Drill, KeyPoint, Level
+from core.signals import bulk_create_key_points
+
+
+class Command(BaseCommand):
+    help = "Creates the missing KeyPoint rows for every (drill, level) pair"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size",
+                            type=int,
+                            default=500,
+                            help="Number of drills reconciled per batch")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        level_ids = list(Level.objects.values_list("id", flat=True))
+        drill_ids = list(
+            Drill.objects.order_by("id").values_list("id", flat=True))
+
+        created = 0
+        for start in range(0, len(drill_ids), chunk_size):
+            chunk = drill_ids[start:start + chunk_size]
+            existing = set(
+                KeyPoint.objects.filter(drill_id__in=chunk).values_list(
+                    "drill_id", "level_id"))
+            created += bulk_create_key_points(
+                (drill_id, level_id) for drill_id in chunk
+                for level_id in level_ids
+                if (drill_id, level_id) not in existing)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Created {created} missing key points"))
@@ -0,0 +1,175 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# ✅ Enable with "core.middleware.RequestStatsMiddleware" in MIDDLEWARE. Optional settings:
+#   REQUEST_STATS_WINDOW           samples kept per view and metric (default 1000)
+#   REQUEST_STATS_REPEAT_THRESHOLD identical SQL templates in one request flagged as N+1 (default 5)
+#   REQUEST_STATS_FILE             path the snapshot is written to, every REQUEST_STATS_FLUSH_EVERY requests
+METRICS = ("wall_ms", "queries", "db_ms", "serializer_ms", "bytes")
+
+
+def percentile(values, percent):
+    """ Nearest-rank percentile of an already sorted list """
+    index = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class QueryCollector:
+    """ execute_wrapper counting queries, DB time and SQL templates for one request """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.templates = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+            # sql is still the template, parameters are passed separately
+            self.templates[sql] += 1
+
+    def repeated_templates(self, threshold):
+        return {
+            sql: count
+            for sql, count in self.templates.items() if count >= threshold
+        }
+
+
+class RequestStats:
+    """ In-process rolling windows of per-view samples, shared by all threads """
+
+    def __init__(self, window):
+        self.window = window
+        # Reentrant, so the middleware can snapshot while holding it to flush
+        self.lock = threading.RLock()
+        self.views = {}
+
+    def record(self, view_name, sample, repeated):
+        with self.lock:
+            view = self.views.get(view_name)
+            if view is None:
+                view = self.views[view_name] = {
+                    "requests": 0,
+                    "n_plus_one_requests": 0,
+                    "repeated_sql": {},
+                    "samples":
+                    {metric: deque(maxlen=self.window)
+                     for metric in METRICS},
+                }
+            view["requests"] += 1
+            for metric in METRICS:
+                view["samples"][metric].append(sample[metric])
+            if repeated:
+                view["n_plus_one_requests"] += 1
+                view["repeated_sql"] = repeated
+
+    def snapshot(self):
+        with self.lock:
+            views = {
+                name: (view["requests"], view["n_plus_one_requests"],
+                       dict(view["repeated_sql"]), {
+                           metric: sorted(samples)
+                           for metric, samples in view["samples"].items()
+                       })
+                for name, view in self.views.items()
+            }
+
+        result = {}
+        for name, (requests, n_plus_one, repeated_sql, samples) in views.items():
+            result[name] = {
+                "requests": requests,
+                "n_plus_one_requests": n_plus_one,
+                "repeated_sql": repeated_sql,
+            }
+            for metric, values in samples.items():
+                result[name][metric] = {
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                    "p99": percentile(values, 99),
+                } if values else None
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.views = {}
+
+
+request_stats = RequestStats(getattr(settings, "REQUEST_STATS_WINDOW", 1000))
+
+
+class RequestStatsMiddleware:
+    """ Records wall time, query count, DB time, serializer time and response
+    size for every resolved view.
+
+    `serializer_ms` is the non-DB time between resolving the view and the
+    rendered response; for the DRF views here that is serialization and
+    rendering.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.repeat_threshold = getattr(settings,
+                                        "REQUEST_STATS_REPEAT_THRESHOLD", 5)
+        self.stats_file = getattr(settings, "REQUEST_STATS_FILE", None)
+        self.flush_every = getattr(settings, "REQUEST_STATS_FLUSH_EVERY", 100)
+        self.recorded = 0
+
+    def __call__(self, request):
+        collector = QueryCollector()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(collector))
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        resolver_match = getattr(request, "resolver_match", None)
+        if resolver_match is not None:
+            self.record(request, response, collector, started, finished)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._stats_view_started = time.perf_counter()
+
+    def record(self, request, response, collector, started, finished):
+        view_started = getattr(request, "_stats_view_started", started)
+        db_ms = collector.db_seconds * 1000
+        sample = {
+            "wall_ms": (finished - started) * 1000,
+            "queries": collector.queries,
+            "db_ms": db_ms,
+            "serializer_ms": max((finished - view_started) * 1000 - db_ms, 0),
+            "bytes": 0 if response.streaming else len(response.content),
+        }
+        view_name = request.resolver_match.view_name or request.path
+        request_stats.record(
+            view_name, sample,
+            collector.repeated_templates(self.repeat_threshold))
+
+        # One flush at a time, and every request counted exactly once
+        with request_stats.lock:
+            self.recorded += 1
+            if self.stats_file and self.recorded % self.flush_every == 0:
+                self.flush()
+
+    def flush(self):
+        """ Writes the snapshot to a temp file first, readers never see half of it """
+        directory, name = os.path.split(os.path.abspath(self.stats_file))
+        with tempfile.NamedTemporaryFile("w",
+                                         dir=directory,
+                                         prefix=f".{name}.",
+                                         delete=False) as stats_file:
+            json.dump(request_stats.snapshot(), stats_file, indent=2)
+        os.replace(stats_file.name, self.stats_file)
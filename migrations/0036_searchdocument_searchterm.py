@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_add_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('drill', 'Drill'), ('task', 'Task'), ('diagnosis', 'Diagnosis'), ('technical_level_task', 'Technical level task')], max_length=30)),
+                ('object_id', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('plain_text', models.TextField(blank=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='core.searchdocument')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'document'], name='core_search_term_6fe062_idx')],
+            },
+        ),
+    ]
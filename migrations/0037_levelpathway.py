@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_searchdocument_searchterm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LevelPathway',
+            fields=[
+                ('level', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pathway', serialize=False, to='core.level')),
+                ('document', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
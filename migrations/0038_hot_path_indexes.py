@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:16
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def remove_duplicate_keypoints(apps, schema_editor):
+    """ Keeps one key point per (drill, level), preferring one with content """
+    KeyPoint = apps.get_model("core", "KeyPoint")
+    filled = ~Q(description="") & Q(description__isnull=False)
+    duplicates = KeyPoint.objects.values("drill_id", "level_id").annotate(
+        rows=Count("id")).filter(rows__gt=1).order_by()
+    for pair in list(duplicates):
+        rows = KeyPoint.objects.filter(drill_id=pair["drill_id"],
+                                       level_id=pair["level_id"])
+        keep = rows.filter(filled).order_by("id").first() or rows.order_by(
+            "id").first()
+        rows.exclude(id=keep.id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_levelpathway'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_keypoints,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='keypoint',
+            index=models.Index(condition=models.Q(models.Q(('description__isnull', True), _negated=True), models.Q(('description', ''), _negated=True)), fields=['level', 'drill'], name='keypoint_filled_level_drill'),
+        ),
+        migrations.AddIndex(
+            model_name='level',
+            index=models.Index(fields=['order_number'], name='level_order_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='technicallevel',
+            index=models.Index(fields=['name'], name='technicallevel_name_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='keypoint',
+            constraint=models.UniqueConstraint(fields=('drill', 'level'), name='unique_keypoint_drill_level'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoachReportDiagnosisDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('diagnosis', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.diagnosis')),
+                ('technical_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.technicallevel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'technical_level', 'diagnosis'), name='unique_diagnosis_rollup')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CoachReportTaskDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.technicalleveltasks')),
+                ('technical_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.technicallevel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'technical_level', 'task'), name='unique_task_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,143 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:47
+
+from django.db import migrations, models
+
+# Frozen copy of core.richtext.RICH_TEXT_FIELDS as of this migration
+RICH_TEXT_FIELDS = {
+    "TechnicalLevel": ("description", ),
+    "Level": ("description", ),
+    "Task": ("picture_desc", ),
+    "TechnicalLevelTasks": ("picture_desc", ),
+    "Diagnosis": ("diagnosis", "measure"),
+    "Drill": ("description", ),
+    "MentalTask": ("description", ),
+    "PhysicalTask": ("description", ),
+}
+BATCH_SIZE = 500
+
+
+def render_existing_rich_text(apps, schema_editor):
+    """ Fills the new companion columns of the rows that already exist """
+    from core.richtext import make_excerpt, sanitize_html
+
+    for model_name, field_names in RICH_TEXT_FIELDS.items():
+        model = apps.get_model("core", model_name)
+        companions = [
+            companion for name in field_names
+            for companion in (f"{name}_html", f"{name}_excerpt")
+        ]
+        batch = []
+        for instance in model.objects.only(
+                "pk", *field_names).order_by("pk").iterator(
+                    chunk_size=BATCH_SIZE):
+            for name in field_names:
+                safe_html = sanitize_html(getattr(instance, name))
+                setattr(instance, f"{name}_html", safe_html)
+                setattr(instance, f"{name}_excerpt", make_excerpt(safe_html))
+            batch.append(instance)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_update(batch, companions)
+                batch = []
+        model.objects.bulk_update(batch, companions)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_coach_report_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='diagnosis',
+            name='diagnosis_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='diagnosis_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='measure_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='diagnosis',
+            name='measure_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='drill',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='drill',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='level',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='level',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='mentaltask',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='mentaltask',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='physicaltask',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='physicaltask',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='picture_desc_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='picture_desc_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='technicallevel',
+            name='description_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='technicallevel',
+            name='description_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='technicalleveltasks',
+            name='picture_desc_excerpt',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='technicalleveltasks',
+            name='picture_desc_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(render_existing_rich_text,
+                             migrations.RunPython.noop),
+    ]
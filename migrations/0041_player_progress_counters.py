@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_progress(apps, schema_editor):
+    """ Keeps one progress row per (player, task), preferring a completed one """
+    PlayerProgress = apps.get_model("core", "PlayerProgress")
+    duplicates = PlayerProgress.objects.values("player_id", "task_id").annotate(
+        rows=Count("id")).filter(rows__gt=1).order_by()
+    for pair in list(duplicates):
+        rows = PlayerProgress.objects.filter(player_id=pair["player_id"],
+                                             task_id=pair["task_id"])
+        keep = rows.order_by("-is_completed", "id").first()
+        rows.exclude(id=keep.id).delete()
+
+
+def fill_progress_counters(apps, schema_editor):
+    PlayerProgress = apps.get_model("core", "PlayerProgress")
+    PlayerLevelProgress = apps.get_model("core", "PlayerLevelProgress")
+    rows = PlayerProgress.objects.filter(is_completed=True).values(
+        "player_id", "task__level_id",
+        "task__situation_type_id").annotate(completed=Count("id")).order_by()
+    counters = [
+        PlayerLevelProgress(player_id=row["player_id"],
+                            level_id=row["task__level_id"],
+                            situation_type_id=row["task__situation_type_id"],
+                            completed=row["completed"]) for row in rows
+    ]
+    PlayerLevelProgress.objects.bulk_create(counters, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_rich_text_render_cache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerLevelProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(remove_duplicate_progress,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='playerprogress',
+            constraint=models.UniqueConstraint(fields=('player', 'task'), name='unique_playerprogress_player_task'),
+        ),
+        migrations.AddField(
+            model_name='playerlevelprogress',
+            name='level',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.level'),
+        ),
+        migrations.AddField(
+            model_name='playerlevelprogress',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='level_progress', to='core.player'),
+        ),
+        migrations.AddField(
+            model_name='playerlevelprogress',
+            name='situation_type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.situationtype'),
+        ),
+        migrations.AddIndex(
+            model_name='playerlevelprogress',
+            index=models.Index(fields=['level', 'player'], name='playerlevelprogress_level_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='playerlevelprogress',
+            constraint=models.UniqueConstraint(fields=('player', 'level', 'situation_type'), name='unique_player_level_progress'),
+        ),
+        migrations.RunPython(fill_progress_counters,
+                             migrations.RunPython.noop),
+    ]
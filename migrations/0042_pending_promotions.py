@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_player_progress_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPromotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('completed', models.IntegerField()),
+                ('total', models.IntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('decided_at', models.DateTimeField(blank=True, null=True)),
+                ('from_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.level')),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='core.player')),
+                ('to_level', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.level')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('player',), name='unique_pending_promotion')],
+            },
+        ),
+    ]
@@ -4,6 +4,7 @@ from tinymce.models import HTMLField
 
 class TechnicalPart(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -20,6 +21,7 @@ class SituationType(models.Model):
     category = models.CharField(
         max_length=10,
         choices=CATEGORY_CHOICES)  # ✅ Restricts types to a category
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.category})"  # ✅ Now displays properly
@@ -29,9 +31,21 @@ class SituationType(models.Model):
 class TechnicalLevel(models.Model):
     name = models.CharField(max_length=100)
     description = HTMLField()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_excerpt = models.CharField(max_length=200,
+                                           blank=True,
+                                           default="",
+                                           editable=False)
     video_url = models.URLField(blank=True, null=True)
     picture_url = models.URLField(blank=True, null=True)
     order_number = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # ✅ get_technical_level_tasks filters tasks by technical_level__name
+            models.Index(fields=["name"], name="technicallevel_name_idx"),
+        ]
 
     def __str__(self):
         return str(self.name)
@@ -40,6 +54,7 @@ class TechnicalLevel(models.Model):
 class TournamentType(models.Model):
     name = models.CharField(max_length=100)
     short_name = models.CharField(default="", max_length=10)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -50,6 +65,11 @@ class Level(models.Model):
     name = models.CharField(max_length=100)
     short_desc = models.CharField(default=" ", max_length=200)
     description = HTMLField()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_excerpt = models.CharField(max_length=200,
+                                           blank=True,
+                                           default="",
+                                           editable=False)
     order_number = models.IntegerField(default=0)
     required_technical_level = models.ForeignKey("TechnicalLevel",
                                                  on_delete=models.SET_NULL,
@@ -66,6 +86,13 @@ class Level(models.Model):
     doubles_matches = models.IntegerField(default=0)
     type_of_tournament = models.ManyToManyField(TournamentType)
     need_to_travel_abroad = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["order_number"],
+                         name="level_order_number_idx"),
+        ]
 
     def __str__(self):
         return str(self.name)
@@ -95,8 +122,16 @@ class Task(models.Model):
     video_url = models.URLField(blank=True, null=True)
     picture_url = models.URLField(blank=True, null=True)
     picture_desc = HTMLField(blank=True, null=True)
+    picture_desc_html = models.TextField(blank=True,
+                                         default="",
+                                         editable=False)
+    picture_desc_excerpt = models.CharField(max_length=200,
+                                            blank=True,
+                                            default="",
+                                            editable=False)
     level = models.ForeignKey(Level, on_delete=models.CASCADE)
     situation_type = models.ForeignKey(SituationType, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -109,6 +144,13 @@ class PlayerProgress(models.Model):
     is_completed = models.BooleanField(default=False)
     completion_date = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            # ✅ One row per player and task, so batch updates can upsert
+            models.UniqueConstraint(fields=["player", "task"],
+                                    name="unique_playerprogress_player_task")
+        ]
+
     def __str__(self):
         return f"{self.player.name} - {self.task.name} - {'Completed' if self.is_completed else 'In Progress'}"
 
@@ -137,6 +179,14 @@ class TechnicalLevelTasks(models.Model):
     video_url = models.URLField(blank=True, null=True)
     picture_url = models.URLField(blank=True, null=True)
     picture_desc = HTMLField(default="")
+    picture_desc_html = models.TextField(blank=True,
+                                         default="",
+                                         editable=False)
+    picture_desc_excerpt = models.CharField(max_length=200,
+                                            blank=True,
+                                            default="",
+                                            editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def full_name(self):
         return f"{self.category} - {self.name}"
@@ -154,13 +204,24 @@ class Diagnosis(models.Model):
     )
     name = models.CharField(max_length=200)  # Diagnosis name
     diagnosis = HTMLField()  # Explanation of the issue
+    diagnosis_html = models.TextField(blank=True, default="", editable=False)
+    diagnosis_excerpt = models.CharField(max_length=200,
+                                         blank=True,
+                                         default="",
+                                         editable=False)
     diagnosis_video_url = models.URLField(blank=True,
                                           null=True)  # Video for diagnosis
     diagnosis_picture_url = models.URLField(blank=True,
                                             null=True)  # Picture for diagnosis
     measure = HTMLField()  # Fix / recommendation
+    measure_html = models.TextField(blank=True, default="", editable=False)
+    measure_excerpt = models.CharField(max_length=200,
+                                       blank=True,
+                                       default="",
+                                       editable=False)
     measure_picture_url = models.URLField(blank=True,
                                           null=True)  # Picture for fix
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.diagnosis} - {self.technical_level_task.name})"
@@ -176,6 +237,7 @@ class CoachReport(models.Model):
     tasks = models.ManyToManyField("TechnicalLevelTasks")  # ✅ Selected Tasks
     diagnoses = models.ManyToManyField("Diagnosis")  # ✅ Selected Diagnoses
     created_at = models.DateTimeField(auto_now_add=True)  # ✅ Report Date
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Report for {self.player_name} ({self.technical_level.name})"
@@ -184,6 +246,11 @@ class CoachReport(models.Model):
 class Drill(models.Model):
     name = models.CharField(max_length=200)
     description = HTMLField()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_excerpt = models.CharField(max_length=200,
+                                           blank=True,
+                                           default="",
+                                           editable=False)
     video_url = models.URLField(blank=True, null=True)
     picture_url = models.URLField(blank=True, null=True)
     situation_type = models.ForeignKey(
@@ -199,6 +266,7 @@ class Drill(models.Model):
                                          ("Semi-Live", "Semi-Live"),
                                          ("Live", "Live")],
                                 default="Feeding")
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -211,6 +279,7 @@ max_length = 20,
 class TrainingPlan(models.Model):
     name = models.CharField(max_length=200)
     date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -231,6 +300,7 @@ class TrainingPlanDrill(models.Model):
         blank=False,
     )  # ✅ NEW: Store selected level
     time_allocated = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.time_allocated:
@@ -245,6 +315,11 @@ class TrainingPlanDrill(models.Model):
 class MentalTask(models.Model):
     name = models.CharField(max_length=200)
     description = HTMLField()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_excerpt = models.CharField(max_length=200,
+                                           blank=True,
+                                           default="",
+                                           editable=False)
     level = models.ForeignKey("Level",
                               on_delete=models.CASCADE,
                               related_name="mental_tasks")
@@ -256,6 +331,7 @@ class MentalTask(models.Model):
             ("Pre-match", "Pre-match"),
             ("Gameplan", "Gameplan"),
         ])
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -265,6 +341,11 @@ class MentalTask(models.Model):
 class PhysicalTask(models.Model):
     name = models.CharField(max_length=200)
     description = HTMLField()
+    description_html = models.TextField(blank=True, default="", editable=False)
+    description_excerpt = models.CharField(max_length=200,
+                                           blank=True,
+                                           default="",
+                                           editable=False)
     level = models.ForeignKey("Level",
                               on_delete=models.CASCADE,
                               related_name="physical_tasks")
@@ -276,6 +357,7 @@ class PhysicalTask(models.Model):
             ("Strength", "Strength"),
             ("Mobility", "Mobility"),
         ])
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return str(self.name)
@@ -292,6 +374,169 @@ class KeyPoint(models.Model):
         null=True,  # ✅ Temporarily allow NULL
         blank=True,
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            # ✅ Provisioning can never create two key points for the same pair
+            models.UniqueConstraint(fields=["drill", "level"],
+                                    name="unique_keypoint_drill_level"),
+        ]
+        indexes = [
+            # ✅ Only key points with content are ever filtered on by level + drill
+            models.Index(fields=["level", "drill"],
+                         name="keypoint_filled_level_drill",
+                         condition=~models.Q(description__isnull=True)
+                         & ~models.Q(description="")),
+        ]
 
     def __str__(self):
         return f"{self.drill.name} - {self.level.name} Key Point"
+
+
+# ✅ Denormalized player pathway page per level, rebuilt by signals (see pathway.py)
+class LevelPathway(models.Model):
+    level = models.OneToOneField("Level",
+                                 on_delete=models.CASCADE,
+                                 primary_key=True,
+                                 related_name="pathway")
+    document = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Pathway for level {self.level_id}"
+
+
+# ✅ Search index maintained by signals (see search.py)
+class SearchDocument(models.Model):
+    KIND_CHOICES = [
+        ("drill", "Drill"),
+        ("task", "Task"),
+        ("diagnosis", "Diagnosis"),
+        ("technical_level_task", "Technical level task"),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)
+    plain_text = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"],
+                                    name="unique_search_document")
+        ]
+
+    def __str__(self):
+        return f"{self.kind}: {self.title}"
+
+
+class SearchTerm(models.Model):
+    document = models.ForeignKey("SearchDocument",
+                                 on_delete=models.CASCADE,
+                                 related_name="terms")
+    term = models.CharField(max_length=64)
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [models.Index(fields=["term", "document"])]
+
+    def __str__(self):
+        return self.term
+
+
+# ✅ Coach report rollups per day and technical level, maintained by signals (see analytics.py)
+class CoachReportDiagnosisDaily(models.Model):
+    day = models.DateField()
+    technical_level = models.ForeignKey("TechnicalLevel",
+                                        on_delete=models.CASCADE)
+    diagnosis = models.ForeignKey("Diagnosis", on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "technical_level", "diagnosis"],
+                name="unique_diagnosis_rollup")
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.diagnosis_id}: {self.count}"
+
+
+class CoachReportTaskDaily(models.Model):
+    day = models.DateField()
+    technical_level = models.ForeignKey("TechnicalLevel",
+                                        on_delete=models.CASCADE)
+    task = models.ForeignKey("TechnicalLevelTasks", on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "technical_level", "task"],
+                                    name="unique_task_rollup")
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.task_id}: {self.count}"
+
+
+# ✅ Completed tasks per player, level and situation type, maintained incrementally (see progress.py)
+class PlayerLevelProgress(models.Model):
+    player = models.ForeignKey(Player,
+                               on_delete=models.CASCADE,
+                               related_name="level_progress")
+    level = models.ForeignKey(Level, on_delete=models.CASCADE)
+    situation_type = models.ForeignKey(SituationType,
+                                       on_delete=models.CASCADE)
+    completed = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["player", "level", "situation_type"],
+                name="unique_player_level_progress")
+        ]
+        indexes = [
+            # Club dashboards list every player of one level
+            models.Index(fields=["level", "player"],
+                         name="playerlevelprogress_level_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id} {self.level_id}/{self.situation_type_id}: {self.completed}"
+
+
+# ✅ Level advancements found by the promotion evaluator, waiting for a coach (see promotions.py)
+class PendingPromotion(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("approved", "Approved"),
+        ("rejected", "Rejected"),
+    ]
+    player = models.ForeignKey(Player,
+                               on_delete=models.CASCADE,
+                               related_name="promotions")
+    from_level = models.ForeignKey(Level,
+                                   on_delete=models.CASCADE,
+                                   related_name="+")
+    to_level = models.ForeignKey(Level,
+                                 on_delete=models.CASCADE,
+                                 related_name="+")
+    completed = models.IntegerField()
+    total = models.IntegerField()
+    status = models.CharField(max_length=10,
+                              choices=STATUS_CHOICES,
+                              default="pending")
+    created_at = models.DateTimeField(auto_now_add=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["player"],
+                                    condition=models.Q(status="pending"),
+                                    name="unique_pending_promotion")
+        ]
+
+    def __str__(self):
+        return f"{self.player} → {self.to_level} ({self.status})"
@@ -0,0 +1,20 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """ ✅ Cursor pagination that only applies when the client asks for it.
+
+    Passing `?page_size=` (or following a `?cursor=` link) returns pages
+    ordered by primary key, which stay stable while rows are inserted.
+    Without either parameter the endpoint keeps returning the full list.
+    """
+    ordering = "pk"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (self.cursor_query_param not in request.query_params
+                and self.page_size_query_param not in request.query_params):
+            return None
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,73 @@
+from django.db.models import Prefetch
+
+from .models import Level, LevelPathway, Task
+from .serializers import LevelSerializer, TaskSerializer, MentalTaskSerializer, PhysicalTaskSerializer, TournamentTypeSerializer, SituationTypeSerializer
+
+
+def build_pathway_document(level):
+    """ Everything the player pathway page shows for one level, as plain JSON.
+
+    Expects `level` to come from `pathway_levels()` so nothing is lazy loaded.
+    """
+    groups = {}
+    for task in level.task_set.all():
+        group = groups.setdefault(
+            task.situation_type_id, {
+                "situation_type":
+                SituationTypeSerializer(task.situation_type).data,
+                "tasks": []
+            })
+        group["tasks"].append(TaskSerializer(task).data)
+
+    return {
+        "level":
+        LevelSerializer(level).data,
+        "tournament_types":
+        TournamentTypeSerializer(level.type_of_tournament.all(),
+                                 many=True).data,
+        "tasks_by_situation_type":
+        [groups[key] for key in sorted(groups)],
+        "mental_tasks":
+        MentalTaskSerializer(level.mental_tasks.all(), many=True).data,
+        "physical_tasks":
+        PhysicalTaskSerializer(level.physical_tasks.all(), many=True).data,
+    }
+
+
+def pathway_levels(level_ids=None):
+    queryset = Level.objects.select_related(
+        "required_technical_level").prefetch_related(
+            "type_of_tournament",
+            Prefetch("task_set",
+                     queryset=Task.objects.select_related(
+                         "situation_type", "level").order_by("pk")),
+            "mental_tasks__drills",
+            "physical_tasks__drills",
+        )
+    if level_ids is not None:
+        queryset = queryset.filter(id__in=level_ids)
+    return queryset
+
+
+def rebuild_pathways(level_ids=None):
+    """ Rebuilds the stored documents for the given levels (or all levels) """
+    rebuilt = 0
+    for level in pathway_levels(level_ids):
+        LevelPathway.objects.update_or_create(
+            level=level, defaults={"document": build_pathway_document(level)})
+        rebuilt += 1
+    return rebuilt
+
+
+def get_pathway_document(level_id):
+    """ Returns the stored document, building it on first access; None for unknown levels """
+    document = LevelPathway.objects.filter(level_id=level_id).values_list(
+        "document", flat=True).first()
+    if document is None:
+        level = pathway_levels([level_id]).first()
+        if level is None:
+            return None
+        document = build_pathway_document(level)
+        LevelPathway.objects.update_or_create(
+            level=level, defaults={"document": document})
+    return document
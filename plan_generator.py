@@ -0,0 +1,210 @@
+""" ✅ Assembles a training plan for a level from an in-memory drill index.
+
+The index holds every drill's category, situation type and suggested time,
+plus which drills have a filled key point per level. It is built once per
+catalogue version, so generating a plan only queries the key point texts of
+the drills it picked.
+"""
+from collections import defaultdict, namedtuple
+
+from .catalogue import get_catalogue_version
+from .models import Drill, KeyPoint, Level, SituationType
+from .plans import DRILL_CATEGORIES
+
+# Candidates per knapsack, the best ones by key points and situation type share
+CANDIDATE_LIMIT = 60
+
+# Knapsack value per minute: used minutes first, then minutes on drills with
+# a key point for the level, then the situation type mix. Each drill costs one
+# point, so fewer and longer drills win what is left of a tie.
+MINUTE_VALUE = 10**9
+KEY_POINT_VALUE = 10**6
+SITUATION_TYPE_VALUE = 1000
+
+IndexedDrill = namedtuple(
+    "IndexedDrill",
+    ["id", "name", "category", "situation_type_id", "suggested_time"])
+
+
+class DrillIndex:
+
+    def __init__(self, version):
+        self.version = version
+        self.drills = {}
+        # (category, situation type id) -> drills, for each cell of the mix
+        self.by_cell = defaultdict(list)
+        for values in Drill.objects.order_by("pk").values_list(
+                "id", "name", "category", "situation_type_id",
+                "suggested_time"):
+            drill = IndexedDrill(*values)
+            self.drills[drill.id] = drill
+            if drill.suggested_time:
+                self.by_cell[(drill.category,
+                              drill.situation_type_id)].append(drill)
+        self.with_key_points = defaultdict(set)
+        for level_id, drill_id in KeyPoint.objects.exclude(
+                description__isnull=True).exclude(description="").values_list(
+                    "level_id", "drill_id"):
+            self.with_key_points[level_id].add(drill_id)
+        self.level_ids = set(Level.objects.values_list("id", flat=True))
+        self.situation_type_ids = set(
+            SituationType.objects.values_list("id", flat=True))
+
+
+_drill_index = None
+
+
+def get_drill_index():
+    """ The drill index of the current catalogue version, rebuilt after edits """
+    global _drill_index
+    version = get_catalogue_version()
+    if _drill_index is None or _drill_index.version != version:
+        _drill_index = DrillIndex(version)
+    return _drill_index
+
+
+def normalize_mix(mix):
+    total = sum(mix.values())
+    return {key: share / total for key, share in mix.items()} if total else {}
+
+
+def knapsack(drills, capacity, value):
+    """ The drills whose suggested times fit `capacity` with the highest total `value` """
+    best = [0] * (capacity + 1)
+    taken = []
+    for drill in drills:
+        weight, drill_value = drill.suggested_time, value(drill)
+        row = bytearray(capacity + 1)
+        for minutes in range(capacity, weight - 1, -1):
+            candidate = best[minutes - weight] + drill_value
+            if candidate > best[minutes]:
+                best[minutes] = candidate
+                row[minutes] = 1
+        taken.append(row)
+
+    minutes = max(range(capacity + 1), key=best.__getitem__)
+    picked = []
+    for drill, row in zip(reversed(drills), reversed(taken)):
+        if row[minutes]:
+            picked.append(drill)
+            minutes -= drill.suggested_time
+    return picked[::-1]
+
+
+def generate_plan(level_id,
+                  duration,
+                  category_mix=None,
+                  situation_type_mix=None,
+                  required_drill_ids=(),
+                  index=None):
+    """ Picks drills for `level_id` whose suggested times fill `duration`.
+
+    `category_mix` and `situation_type_mix` (key -> share) split the
+    duration into cells, one per category and situation type, each packed
+    with a knapsack over the best candidates of that cell. Required drills
+    come first and count towards their cell. Minutes a cell could not fill
+    go to its category, then to a last knapsack over every category in the
+    mix. Returns the drills in category order.
+    """
+    index = index or get_drill_index()
+    with_key_points = index.with_key_points.get(level_id, set())
+    category_shares = normalize_mix(category_mix or {})
+    situation_type_shares = normalize_mix(situation_type_mix or {})
+
+    def value(drill):
+        return round(drill.suggested_time *
+                     (MINUTE_VALUE +
+                      (drill.id in with_key_points) * KEY_POINT_VALUE +
+                      situation_type_shares.get(drill.situation_type_id, 0) *
+                      SITUATION_TYPE_VALUE)) - 1
+
+    def candidates(capacity, categories, situation_type_ids=None):
+        drills = [
+            drill for (category, situation_type_id), drills in
+            index.by_cell.items() if category in categories and
+            (situation_type_ids is None
+             or situation_type_id in situation_type_ids) for drill in drills
+            if drill.suggested_time <= capacity and drill.id not in chosen
+        ]
+        drills.sort(key=lambda drill: (-(drill.id in with_key_points), -(
+            situation_type_shares.get(drill.situation_type_id, 0)), drill.id))
+        return drills[:CANDIDATE_LIMIT]
+
+    def pack(capacity, categories, situation_type_ids=None):
+        """ Adds the best drills for `capacity` minutes, returns the minutes used """
+        capacity = min(capacity, leftover)
+        if capacity <= 0:
+            return 0
+        picked = knapsack(
+            candidates(capacity, categories, situation_type_ids), capacity,
+            value)
+        chosen.update((drill.id, drill) for drill in picked)
+        return sum(drill.suggested_time for drill in picked)
+
+    chosen = {
+        drill_id: index.drills[drill_id]
+        for drill_id in required_drill_ids
+    }
+    leftover = duration - sum(drill.suggested_time
+                              for drill in chosen.values())
+    categories = [
+        category for category, share in category_shares.items() if share
+    ] or DRILL_CATEGORIES
+
+    def used(category=None, situation_type_id=None):
+        return sum(drill.suggested_time for drill in chosen.values()
+                   if category in (None, drill.category) and
+                   situation_type_id in (None, drill.situation_type_id))
+
+    # Without a category mix, every category shares each situation type cell
+    for category, category_share in (category_shares.items()
+                                     or [(None, 1.0)]):
+        cell_categories = categories if category is None else [category]
+        for situation_type_id, situation_type_share in (
+                situation_type_shares.items() or [(None, 1.0)]):
+            target = int(duration * category_share * situation_type_share)
+            leftover -= pack(
+                target - used(category, situation_type_id), cell_categories,
+                None if situation_type_id is None else {situation_type_id})
+    for category, category_share in category_shares.items():
+        leftover -= pack(
+            int(duration * category_share) - used(category), [category])
+    pack(leftover, categories)
+
+    # Feeding drills first, live play last; required ones lead their category
+    order = {category: i for i, category in enumerate(DRILL_CATEGORIES)}
+    required = set(required_drill_ids)
+    return sorted(chosen.values(),
+                  key=lambda drill: (order.get(drill.category, len(order)),
+                                     drill.id not in required))
+
+
+def describe_plan(level_id, duration, drills):
+    """ The generated plan with key points and its minutes per category and situation type """
+    key_points = defaultdict(list)
+    for drill_id, description in KeyPoint.objects.filter(
+            level_id=level_id,
+            drill_id__in=[drill.id for drill in drills]).exclude(
+                description__isnull=True).exclude(description="").order_by(
+                    "pk").values_list("drill_id", "description"):
+        key_points[drill_id].append(description)
+
+    by_category, by_situation_type = defaultdict(int), defaultdict(int)
+    for drill in drills:
+        by_category[drill.category] += drill.suggested_time
+        by_situation_type[drill.situation_type_id] += drill.suggested_time
+    return {
+        "level": level_id,
+        "duration": duration,
+        "total_minutes": sum(drill.suggested_time for drill in drills),
+        "by_category": dict(by_category),
+        "by_situation_type": dict(by_situation_type),
+        "drills": [{
+            "drill": drill.id,
+            "drill_name": drill.name,
+            "category": drill.category,
+            "situation_type": drill.situation_type_id,
+            "time_allocated": drill.suggested_time,
+            "key_points": key_points.get(drill.id, []),
+        } for drill in drills],
+    }
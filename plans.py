@@ -0,0 +1,81 @@
+from django.db.models import Count, Sum
+
+from .models import Drill, TrainingPlan, TrainingPlanDrill
+
+DRILL_CATEGORIES = [
+    value for value, _ in Drill._meta.get_field("category").choices
+]
+
+
+def add_minutes(breakdown, key, row, **extra):
+    entry = breakdown.setdefault(key, {**extra, "minutes": 0, "drills": 0})
+    entry["minutes"] += row["minutes"]
+    entry["drills"] += row["drills"]
+
+
+def summarize_plans(plans):
+    """ Totals and breakdowns of many training plans in two queries.
+
+    The plan drills are grouped by plan, drill category, situation type and
+    selected level in the database; the much smaller grouped rows are then
+    rolled up per breakdown here.
+    """
+    summaries = {
+        plan["id"]: dict(plan,
+                         total_minutes=0,
+                         drill_count=0,
+                         by_category={},
+                         by_situation_type={},
+                         by_level={})
+        for plan in plans.order_by("date", "pk").values("id", "name", "date")
+    }
+    rows = TrainingPlanDrill.objects.filter(
+        training_plan_id__in=summaries).values(
+            "training_plan_id", "drill__category",
+            "drill__situation_type_id", "drill__situation_type__name",
+            "selected_level_id", "selected_level__name",
+            "selected_level__order_number").annotate(
+                minutes=Sum("time_allocated"), drills=Count("id")).order_by()
+
+    for row in rows:
+        summary = summaries[row["training_plan_id"]]
+        summary["total_minutes"] += row["minutes"]
+        summary["drill_count"] += row["drills"]
+        add_minutes(summary["by_category"],
+                    row["drill__category"],
+                    row,
+                    category=row["drill__category"])
+        add_minutes(summary["by_situation_type"],
+                    row["drill__situation_type_id"],
+                    row,
+                    id=row["drill__situation_type_id"],
+                    name=row["drill__situation_type__name"])
+        add_minutes(summary["by_level"],
+                    row["selected_level_id"],
+                    row,
+                    id=row["selected_level_id"],
+                    name=row["selected_level__name"],
+                    order_number=row["selected_level__order_number"])
+
+    for summary in summaries.values():
+        # Every category is listed, in the order of the model choices
+        summary["by_category"] = [
+            summary["by_category"].get(category, {
+                "category": category,
+                "minutes": 0,
+                "drills": 0
+            }) for category in DRILL_CATEGORIES
+        ]
+        summary["by_situation_type"] = sorted(
+            summary["by_situation_type"].values(),
+            key=lambda entry: (entry["name"], entry["id"]))
+        summary["by_level"] = sorted(
+            summary["by_level"].values(),
+            key=lambda entry: (entry["order_number"], entry["id"]))
+    return list(summaries.values())
+
+
+def summarize_plan(plan_id):
+    """ The summary of one plan, or None when it does not exist """
+    summaries = summarize_plans(TrainingPlan.objects.filter(pk=plan_id))
+    return summaries[0] if summaries else None
@@ -0,0 +1,361 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .models import Level, Player, PlayerLevelProgress, PlayerProgress, Task
+
+COUNTER_BATCH_SIZE = 2000
+
+
+def task_progress_keys(task_ids):
+    """ task id -> (level id, situation type id), the counter a task counts towards """
+    return {
+        task_id: (level_id, situation_type_id)
+        for task_id, level_id, situation_type_id in Task.objects.filter(
+            pk__in=task_ids).values_list("id", "level_id", "situation_type_id")
+    }
+
+
+def apply_progress_deltas(deltas):
+    """ Adds `{(player_id, level_id, situation_type_id): delta}` to the counters.
+
+    Missing rows are inserted at 0 first, then incremented with one UPDATE
+    per level, situation type and delta, so concurrent saves never lose a count.
+    Decrements only touch existing rows: a missing one has nothing to take
+    away, or was just deleted by the cascade deleting its player or level.
+    """
+    groups = defaultdict(list)
+    for (player_id, level_id, situation_type_id), delta in deltas.items():
+        if delta:
+            groups[(level_id, situation_type_id, delta)].append(player_id)
+    if not groups:
+        return
+    with transaction.atomic():
+        PlayerLevelProgress.objects.bulk_create(
+            [
+                PlayerLevelProgress(player_id=player_id,
+                                    level_id=level_id,
+                                    situation_type_id=situation_type_id)
+                for (level_id, situation_type_id, delta), player_ids in
+                groups.items() if delta > 0 for player_id in player_ids
+            ],
+            batch_size=COUNTER_BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        for (level_id, situation_type_id,
+             delta), player_ids in groups.items():
+            PlayerLevelProgress.objects.filter(
+                level_id=level_id,
+                situation_type_id=situation_type_id,
+                player_id__in=player_ids).update(completed=F("completed") +
+                                                 delta)
+
+
+def set_progress(entries, task_keys):
+    """ Marks many (player, task) pairs completed or not, in one transaction.
+
+    `entries` are `(player_id, task_id, is_completed)` tuples and `task_keys`
+    comes from `task_progress_keys`. Rows are created, locked and updated in
+    bulk and the counters moved by the net change, skipping the per-row
+    signal handlers.
+    """
+    wanted = {(player_id, task_id): is_completed
+              for player_id, task_id, is_completed in entries}
+    result = {"completed": 0, "reopened": 0, "unchanged": 0}
+    now = timezone.now()
+    with transaction.atomic():
+        PlayerProgress.objects.bulk_create(
+            [
+                PlayerProgress(player_id=player_id, task_id=task_id)
+                for (player_id, task_id), is_completed in wanted.items()
+                if is_completed
+            ],
+            ignore_conflicts=True,
+        )
+        # player__in x task__in is a superset, the exact pairs are picked below
+        rows = PlayerProgress.objects.select_for_update().filter(
+            player_id__in={player_id
+                           for player_id, _ in wanted},
+            task_id__in={task_id
+                         for _, task_id in wanted}).only(
+                             "id", "player_id", "task_id", "is_completed",
+                             "completion_date")
+
+        changed, deltas = [], defaultdict(int)
+        for row in rows:
+            is_completed = wanted.get((row.player_id, row.task_id))
+            if is_completed is None or row.is_completed == is_completed:
+                continue
+            row.is_completed = is_completed
+            row.completion_date = now if is_completed else None
+            changed.append(row)
+            deltas[(row.player_id,
+                    *task_keys[row.task_id])] += 1 if is_completed else -1
+            result["completed" if is_completed else "reopened"] += 1
+        # Includes reopening a task that was never started
+        result["unchanged"] = len(wanted) - len(changed)
+
+        PlayerProgress.objects.bulk_update(changed,
+                                           ["is_completed", "completion_date"],
+                                           batch_size=COUNTER_BATCH_SIZE)
+        apply_progress_deltas(deltas)
+    return result
+
+
+def move_tasks_progress(moves):
+    """ Moves the completions of tasks that changed level or situation type.
+
+    `moves` holds `(task_id, previous_key, key)` tuples; the completions of
+    all of them are read in one query and moved with one set of deltas.
+    """
+    keys = {
+        task_id: (previous_key, key)
+        for task_id, previous_key, key in moves if previous_key != key
+    }
+    if not keys:
+        return
+    deltas = defaultdict(int)
+    for task_id, player_id in PlayerProgress.objects.filter(
+            task_id__in=keys, is_completed=True).values_list(
+                "task_id", "player_id"):
+        previous_key, key = keys[task_id]
+        deltas[(player_id, *previous_key)] -= 1
+        deltas[(player_id, *key)] += 1
+    apply_progress_deltas(deltas)
+
+
+def move_task_progress(task_id, previous_key, key):
+    """ Moves the completions of a task that changed level or situation type """
+    move_tasks_progress([(task_id, previous_key, key)])
+
+
+def percent(completed, total):
+    return round(100 * completed / total, 1) if total else 0.0
+
+
+def task_totals(level_ids=None):
+    """ (level id, situation type id) -> number of tasks, with the names """
+    tasks = Task.objects.all()
+    if level_ids is not None:
+        tasks = tasks.filter(level_id__in=level_ids)
+    return list(
+        tasks.values("level_id", "situation_type_id",
+                     "situation_type__name").annotate(
+                         total=Count("id")).order_by("level_id",
+                                                     "situation_type__name",
+                                                     "situation_type_id"))
+
+
+def player_progress(player):
+    """ Completion of one player across every level, per situation type """
+    completed = {
+        (level_id, situation_type_id): count
+        for level_id, situation_type_id, count in
+        player.level_progress.values_list("level_id", "situation_type_id",
+                                          "completed")
+    }
+    levels = {
+        level["id"]: dict(level, completed=0, total=0, situation_types=[])
+        for level in Level.objects.order_by("order_number", "pk").values(
+            "id", "name", "order_number")
+    }
+    for row in task_totals():
+        level = levels[row["level_id"]]
+        done = completed.get((row["level_id"], row["situation_type_id"]), 0)
+        level["completed"] += done
+        level["total"] += row["total"]
+        level["situation_types"].append({
+            "id": row["situation_type_id"],
+            "name": row["situation_type__name"],
+            "completed": done,
+            "total": row["total"],
+            "percent": percent(done, row["total"]),
+        })
+    for level in levels.values():
+        level["percent"] = percent(level["completed"], level["total"])
+    return {
+        "player": {
+            "id": player.pk,
+            "name": player.name
+        },
+        "levels": [level for level in levels.values() if level["total"]],
+    }
+
+
+def level_completion(level_id, player_ids=None):
+    """ Completion of one level for many players, read from the counters only.
+
+    Without `player_ids` every player with a counter for the level is listed.
+    """
+    totals = task_totals([level_id])
+    total = sum(row["total"] for row in totals)
+
+    counters = PlayerLevelProgress.objects.filter(level_id=level_id)
+    players = {}
+    if player_ids is not None:
+        counters = counters.filter(player_id__in=player_ids)
+        for player in Player.objects.filter(pk__in=player_ids).order_by(
+                "name", "pk").values("id", "name"):
+            players[player["id"]] = {"player": player, "by_type": {}}
+    for row in counters.values("player_id", "player__name",
+                               "situation_type_id",
+                               "completed").order_by("player__name",
+                                                     "player_id"):
+        entry = players.setdefault(row["player_id"], {
+            "player": {
+                "id": row["player_id"],
+                "name": row["player__name"]
+            },
+            "by_type": {}
+        })
+        entry["by_type"][row["situation_type_id"]] = row["completed"]
+
+    results = []
+    for entry in players.values():
+        done = sum(entry["by_type"].values())
+        results.append({
+            "player": entry["player"],
+            "completed": done,
+            "total": total,
+            "percent": percent(done, total),
+            "situation_types": [{
+                "id": row["situation_type_id"],
+                "name": row["situation_type__name"],
+                "completed": entry["by_type"].get(row["situation_type_id"], 0),
+                "total": row["total"],
+            } for row in totals],
+        })
+    return results
+
+
+def rebuild_progress_counters(check=False, stdout=None):
+    """ Recomputes the counters from PlayerProgress.
+
+    Returns the number of counters that were wrong. With `check`, nothing is
+    written and the differences are only reported.
+    """
+    expected = {
+        (row["player_id"], row["task__level_id"], row["task__situation_type_id"]):
+        row["completed"]
+        for row in PlayerProgress.objects.filter(is_completed=True).values(
+            "player_id", "task__level_id", "task__situation_type_id").annotate(
+                completed=Count("id")).order_by()
+    }
+    stored = {
+        (player_id, level_id, situation_type_id): completed
+        for player_id, level_id, situation_type_id, completed in
+        PlayerLevelProgress.objects.values_list(
+            "player_id", "level_id", "situation_type_id", "completed")
+    }
+    wrong = [
+        key for key in expected.keys() | stored.keys()
+        if expected.get(key, 0) != stored.get(key, 0)
+    ]
+    if stdout:
+        for key in sorted(wrong)[:20]:
+            stdout.write(f"  player {key[0]}, level {key[1]}, situation "
+                         f"type {key[2]}: stored {stored.get(key, 0)}, "
+                         f"expected {expected.get(key, 0)}")
+    if check or not wrong:
+        return len(wrong)
+
+    with transaction.atomic():
+        PlayerLevelProgress.objects.all().delete()
+        PlayerLevelProgress.objects.bulk_create(
+            [
+                PlayerLevelProgress(player_id=player_id,
+                                    level_id=level_id,
+                                    situation_type_id=situation_type_id,
+                                    completed=completed)
+                for (player_id, level_id,
+                     situation_type_id), completed in expected.items()
+            ],
+            batch_size=COUNTER_BATCH_SIZE,
+        )
+    return len(wrong)
+
+
+def get_squad_progress(players, next_count=3):
+    """ Current levels, completion and next tasks of many players at once.
+
+    Runs in at most five queries however many players are in `players`:
+    the players with their levels, their counters, the task totals, and
+    for `next_count` the tasks of their current levels and their completed
+    tasks among those.
+    """
+    players = list(
+        players.values("id", "name", "current_level_id",
+                       "current_level__name", "current_level__order_number",
+                       "current_technical_level_id",
+                       "current_technical_level__name").order_by("name", "pk"))
+    player_ids = [player["id"] for player in players]
+    level_ids = {
+        player["current_level_id"]
+        for player in players if player["current_level_id"]
+    }
+
+    completed = {
+        (player_id, level_id, situation_type_id): count
+        for player_id, level_id, situation_type_id, count in
+        PlayerLevelProgress.objects.filter(
+            player_id__in=player_ids, level_id__in=level_ids).values_list(
+                "player_id", "level_id", "situation_type_id", "completed")
+    }
+    totals = defaultdict(list)
+    for row in task_totals(level_ids):
+        totals[row["level_id"]].append(row)
+    level_tasks, done_tasks = defaultdict(list), defaultdict(set)
+    if next_count:
+        task_ids = []
+        for task in Task.objects.filter(level_id__in=level_ids).order_by(
+                "level_id", "pk").values("id", "name", "situation_type_id",
+                                         "level_id"):
+            level_tasks[task.pop("level_id")].append(task)
+            task_ids.append(task["id"])
+        # task_id__in rather than a join on the task level, which is far slower
+        for player_id, task_id in PlayerProgress.objects.filter(
+                player_id__in=player_ids,
+                task_id__in=task_ids,
+                is_completed=True).values_list("player_id", "task_id"):
+            done_tasks[player_id].add(task_id)
+
+    results = []
+    for player in players:
+        level_id = player["current_level_id"]
+        situation_types = [{
+            "id": row["situation_type_id"],
+            "name": row["situation_type__name"],
+            "completed": completed.get(
+                (player["id"], level_id, row["situation_type_id"]), 0),
+            "total": row["total"],
+        } for row in totals.get(level_id, [])]
+        done = sum(row["completed"] for row in situation_types)
+        total = sum(row["total"] for row in situation_types)
+        next_tasks = list(
+            islice((task for task in level_tasks.get(level_id, [])
+                    if task["id"] not in done_tasks[player["id"]]),
+                   next_count))
+        results.append({
+            "player": {
+                "id": player["id"],
+                "name": player["name"]
+            },
+            "current_level": {
+                "id": level_id,
+                "name": player["current_level__name"],
+                "order_number": player["current_level__order_number"]
+            } if level_id else None,
+            "current_technical_level": {
+                "id": player["current_technical_level_id"],
+                "name": player["current_technical_level__name"]
+            } if player["current_technical_level_id"] else None,
+            "completed": done,
+            "total": total,
+            "percent": percent(done, total),
+            "situation_types": situation_types,
+            "next_tasks": next_tasks,
+        })
+    return results
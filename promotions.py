@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import Level, PendingPromotion, Player, PlayerLevelProgress, Task
+
+# Share of a level's tasks a player must complete to be proposed for the next one
+PROMOTION_THRESHOLD = getattr(settings, "PROMOTION_THRESHOLD", 1.0)
+
+
+def next_levels():
+    """ level id -> the next level by order_number, with its technical requirement """
+    levels = list(
+        Level.objects.order_by("order_number", "pk").values(
+            "id", "required_technical_level__order_number"))
+    return {
+        level["id"]: next_level
+        for level, next_level in zip(levels, levels[1:])
+    }
+
+
+def find_eligible_players(player_ids=None, threshold=None):
+    """ player id -> (from level id, to level id, completed, total).
+
+    A player is eligible once they completed `threshold` of the tasks of
+    their current level and their technical level is at least the one the
+    next level requires. Read from the progress counters in one grouped
+    query, whatever the number of players.
+    """
+    threshold = PROMOTION_THRESHOLD if threshold is None else threshold
+    following = next_levels()
+    totals = dict(
+        Task.objects.values_list("level_id").annotate(
+            total=Count("id")).order_by())
+
+    counters = PlayerLevelProgress.objects.filter(
+        level_id=F("player__current_level_id"))
+    if player_ids is not None:
+        counters = counters.filter(player_id__in=player_ids)
+    rows = counters.values_list(
+        "player_id", "level_id",
+        "player__current_technical_level__order_number").annotate(
+            completed=Sum("completed")).order_by()
+
+    eligible = {}
+    for player_id, level_id, technical_order, completed in rows:
+        next_level, total = following.get(level_id), totals.get(level_id, 0)
+        if not next_level or not total or completed < threshold * total:
+            continue
+        required = next_level["required_technical_level__order_number"]
+        if required is not None and (technical_order is None
+                                     or technical_order < required):
+            continue
+        eligible[player_id] = (level_id, next_level["id"], completed, total)
+    return eligible
+
+
+def evaluate_promotions(player_ids=None, threshold=None):
+    """ Brings the pending promotions in line with the current progress.
+
+    New eligible players get a pending promotion, pending ones that no
+    longer hold (progress reopened, level changed by hand) are removed and
+    a promotion a coach rejected is not proposed again.
+    """
+    eligible = find_eligible_players(player_ids, threshold)
+    result = {"created": 0, "updated": 0, "removed": 0}
+    with transaction.atomic():
+        promotions = PendingPromotion.objects.exclude(status="approved")
+        if player_ids is not None:
+            promotions = promotions.filter(player_id__in=player_ids)
+
+        pending, rejected, stale = {}, set(), []
+        for promotion in promotions.select_for_update().only(
+                "id", "player_id", "from_level_id", "to_level_id",
+                "completed", "total", "status"):
+            key = (promotion.from_level_id, promotion.to_level_id)
+            if promotion.status == "rejected":
+                rejected.add((promotion.player_id, *key))
+            elif eligible.get(promotion.player_id, (None, None))[:2] == key:
+                pending[promotion.player_id] = promotion
+            else:
+                stale.append(promotion.pk)
+
+        created, updated = [], []
+        for player_id, (from_level_id, to_level_id, completed,
+                        total) in eligible.items():
+            if (player_id, from_level_id, to_level_id) in rejected:
+                continue
+            promotion = pending.get(player_id)
+            if promotion is None:
+                created.append(
+                    PendingPromotion(player_id=player_id,
+                                     from_level_id=from_level_id,
+                                     to_level_id=to_level_id,
+                                     completed=completed,
+                                     total=total))
+            elif (promotion.completed, promotion.total) != (completed, total):
+                promotion.completed, promotion.total = completed, total
+                updated.append(promotion)
+
+        if stale:
+            PendingPromotion.objects.filter(pk__in=stale).delete()
+        # A concurrent evaluation of the same player may have inserted its
+        # pending row since the read above, that one stands
+        PendingPromotion.objects.bulk_create(created,
+                                             batch_size=2000,
+                                             ignore_conflicts=True)
+        PendingPromotion.objects.bulk_update(updated, ["completed", "total"],
+                                             batch_size=2000)
+    result.update(created=len(created),
+                  updated=len(updated),
+                  removed=len(stale))
+    return result
+
+
+def schedule_promotion_evaluation(player_ids):
+    player_ids = {player_id for player_id in player_ids if player_id}
+    if player_ids:
+        transaction.on_commit(lambda: evaluate_promotions(player_ids))
+
+
+def decide_promotions(promotions, approve):
+    """ Approves or rejects pending promotions; approving moves the players up.
+
+    A player whose level changed since the evaluation is not moved and the
+    promotion stays pending until the re-evaluation scheduled here withdraws
+    it. Returns the number of promotions decided.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        promotions = list(
+            promotions.filter(status="pending").select_for_update().only(
+                "id", "player_id", "from_level_id", "to_level_id"))
+        if approve:
+            current_levels = dict(
+                Player.objects.filter(
+                    pk__in={promotion.player_id
+                            for promotion in promotions
+                            }).select_for_update().values_list(
+                                "id", "current_level_id"))
+            movable, stale = [], []
+            for promotion in promotions:
+                (movable if current_levels.get(promotion.player_id)
+                 == promotion.from_level_id else stale).append(promotion)
+            promotions = movable
+            players = defaultdict(list)
+            for promotion in promotions:
+                players[promotion.to_level_id].append(promotion.player_id)
+            for to_level_id, player_ids in players.items():
+                Player.objects.filter(pk__in=player_ids).update(
+                    current_level_id=to_level_id)
+            # The new level may already be complete as well, and the stale
+            # promotions are withdrawn by the evaluation
+            schedule_promotion_evaluation(
+                [promotion.player_id for promotion in movable + stale])
+        PendingPromotion.objects.filter(
+            pk__in=[promotion.pk for promotion in promotions]).update(
+                status="approved" if approve else "rejected", decided_at=now)
+    return len(promotions)
@@ -0,0 +1,141 @@
+import re
+from html import escape
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from django.utils.text import Truncator
+
+from .models import Diagnosis, Drill, Level, MentalTask, PhysicalTask, Task, TechnicalLevel, TechnicalLevelTasks
+from .search import html_to_text
+
+EXCERPT_LENGTH = 200
+
+# ✅ model -> TinyMCE fields that get `<field>_html` / `<field>_excerpt` companions
+RICH_TEXT_FIELDS = {
+    TechnicalLevel: ("description", ),
+    Level: ("description", ),
+    Task: ("picture_desc", ),
+    TechnicalLevelTasks: ("picture_desc", ),
+    Diagnosis: ("diagnosis", "measure"),
+    Drill: ("description", ),
+    MentalTask: ("description", ),
+    PhysicalTask: ("description", ),
+}
+
+ALLOWED_TAGS = {
+    "a", "b", "blockquote", "br", "code", "em", "h1", "h2", "h3", "h4", "h5",
+    "h6", "hr", "i", "img", "li", "ol", "p", "pre", "s", "span", "strong",
+    "sub", "sup", "table", "tbody", "td", "th", "thead", "tr", "u", "ul"
+}
+VOID_TAGS = {"br", "hr", "img"}
+# Dropped together with everything inside them
+DROPPED_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed"}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title", "target"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "td": {"colspan", "rowspan"},
+    "th": {"colspan", "rowspan"},
+}
+# Replaced by a space in excerpts so paragraphs do not run together
+BLOCK_TAG_RE = re.compile(
+    r"</?(?:blockquote|br|h[1-6]|hr|li|p|pre|td|th|tr)\b[^>]*>")
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_URL_SCHEMES = {"", "http", "https", "mailto"}
+
+
+class Sanitizer(HTMLParser):
+    """ Allowlist sanitizer: unknown tags are unwrapped, unknown attributes and
+    unsafe URLs dropped, and every open tag is closed """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.open_tags = []
+        self.dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping += 1
+            return
+        if self.dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, ())
+        rendered = []
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not is_safe_url(value):
+                continue
+            rendered.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == "a" and any(name == "target" for name, _ in attrs):
+            rendered.append(' rel="noopener noreferrer"')
+        self.parts.append(f"<{tag}{''.join(rendered)}>")
+        if tag not in VOID_TAGS:
+            self.open_tags.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in self.open_tags and tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROPPED_CONTENT_TAGS:
+            self.dropping = max(self.dropping - 1, 0)
+            return
+        if self.dropping or tag not in self.open_tags:
+            return
+        # Closes anything left open inside it, like a browser would
+        while self.open_tags:
+            open_tag = self.open_tags.pop()
+            self.parts.append(f"</{open_tag}>")
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if not self.dropping:
+            self.parts.append(escape(data, quote=False))
+
+    def result(self):
+        self.close()
+        return "".join(self.parts) + "".join(
+            f"</{tag}>" for tag in reversed(self.open_tags))
+
+
+def is_safe_url(value):
+    # Browsers ignore whitespace and control characters inside the scheme
+    cleaned = "".join(char for char in value if char > " ")
+    try:
+        return urlsplit(cleaned).scheme.lower() in ALLOWED_URL_SCHEMES
+    except ValueError:
+        return False
+
+
+def sanitize_html(value):
+    if not value:
+        return ""
+    sanitizer = Sanitizer()
+    sanitizer.feed(value)
+    return sanitizer.result()
+
+
+def make_excerpt(safe_html, length=EXCERPT_LENGTH):
+    """ Plain text of sanitized HTML, cut at `length` characters with an ellipsis """
+    return Truncator(html_to_text(BLOCK_TAG_RE.sub(" ",
+                                                   safe_html))).chars(length)
+
+
+def companion_fields(field_names):
+    return [
+        companion for name in field_names
+        for companion in (f"{name}_html", f"{name}_excerpt")
+    ]
+
+
+def render_rich_text(instance, field_names=None):
+    """ Fills the companion columns from the raw TinyMCE fields of `instance` """
+    if field_names is None:
+        field_names = RICH_TEXT_FIELDS[type(instance)]
+    for name in field_names:
+        safe_html = sanitize_html(getattr(instance, name))
+        setattr(instance, f"{name}_html", safe_html)
+        setattr(instance, f"{name}_excerpt", make_excerpt(safe_html))
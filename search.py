@@ -0,0 +1,193 @@
+import html
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils.html import escape, strip_tags
+
+from .models import Diagnosis, Drill, SearchDocument, SearchTerm, Task, TechnicalLevelTasks
+
+TITLE_WEIGHT = 3
+BODY_WEIGHT = 1
+SNIPPET_WORDS = 30
+INDEX_BATCH_SIZE = 1000
+
+# ✅ kind -> (model, title field, body fields)
+SEARCH_SOURCES = {
+    "drill": (Drill, "name", ("description", )),
+    "task": (Task, "name", ("description", )),
+    "diagnosis": (Diagnosis, "name", ("diagnosis", "measure")),
+    "technical_level_task": (TechnicalLevelTasks, "name", ("description", )),
+}
+
+NORWEGIAN_LETTERS = str.maketrans({"æ": "ae", "ø": "o", "å": "a"})
+
+STOP_WORDS = {
+    "og", "i", "pa", "er", "en", "et", "ei", "av", "til", "med", "som",
+    "for", "det", "den", "de", "a", "at", "om", "har", "fra", "ikke", "skal",
+    "kan", "du", "vi", "seg", "sin", "eller", "nar", "the", "and", "of", "to"
+}
+
+# Light Norwegian stemmer: longest matching suffix first, keeping 3+ letters
+SUFFIXES = sorted([
+    "hetene", "hetens", "heten", "heter", "endes", "ande", "ende", "edes",
+    "enes", "erte", "ane", "ene", "ens", "ers", "ets", "het", "ast", "ert",
+    "en", "ar", "er", "as", "es", "et", "a", "e", "s"
+],
+                  key=len,
+                  reverse=True)
+
+
+def html_to_text(value):
+    """ Strips TinyMCE markup and entities down to plain text """
+    return re.sub(r"\s+", " ", html.unescape(strip_tags(value or ""))).strip()
+
+
+def fold(word):
+    """ Lowercases and folds æ/ø/å and other diacritics to ASCII """
+    word = word.lower().translate(NORWEGIAN_LETTERS)
+    return unicodedata.normalize("NFKD",
+                                 word).encode("ascii",
+                                              "ignore").decode("ascii")
+
+
+def stem(word):
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize_word(word):
+    word = fold(word)
+    if not word or word in STOP_WORDS:
+        return None
+    return stem(word)[:64]
+
+
+def tokenize(text):
+    terms = (normalize_word(word) for word in re.findall(r"\w+", text))
+    return [term for term in terms if term]
+
+
+def index_terms(kind, instance):
+    """ (title, plain text, term -> weight) of one object """
+    _, title_field, body_fields = SEARCH_SOURCES[kind]
+    title = getattr(instance, title_field) or ""
+    body = " ".join(
+        html_to_text(getattr(instance, field)) for field in body_fields)
+
+    weights = Counter()
+    for term in tokenize(title):
+        weights[term] += TITLE_WEIGHT
+    for term in tokenize(body):
+        weights[term] += BODY_WEIGHT
+    return title, body, weights
+
+
+def index_objects(kind, instances):
+    """ Replaces the index entries for many objects of one kind.
+
+    A fixed number of queries whatever the number of objects: one upsert of
+    the documents, one to read their ids, one delete of their old terms and
+    one insert of the new ones.
+    """
+    entries = {
+        instance.pk: index_terms(kind, instance)
+        for instance in instances
+    }
+    if not entries:
+        return
+    with transaction.atomic():
+        SearchDocument.objects.bulk_create(
+            [
+                SearchDocument(kind=kind,
+                               object_id=object_id,
+                               title=title[:200],
+                               plain_text=body)
+                for object_id, (title, body, _) in entries.items()
+            ],
+            batch_size=INDEX_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["kind", "object_id"],
+            update_fields=["title", "plain_text"],
+        )
+        document_ids = dict(
+            SearchDocument.objects.filter(
+                kind=kind, object_id__in=entries).values_list(
+                    "object_id", "id"))
+        SearchTerm.objects.filter(
+            document_id__in=document_ids.values()).delete()
+        SearchTerm.objects.bulk_create(
+            [
+                SearchTerm(document_id=document_ids[object_id],
+                           term=term,
+                           weight=weight)
+                for object_id, (_, _, weights) in entries.items()
+                for term, weight in weights.items()
+            ],
+            batch_size=INDEX_BATCH_SIZE,
+        )
+
+
+def index_object(kind, instance):
+    """ Replaces the index entries for one object """
+    index_objects(kind, [instance])
+
+
+def remove_object(kind, object_id):
+    SearchDocument.objects.filter(kind=kind, object_id=object_id).delete()
+
+
+def make_snippet(text, terms):
+    """ Returns an escaped excerpt around the first hit with matches wrapped in <mark> """
+    words = text.split()
+    matched = [
+        normalize_word(re.sub(r"\W+", "", word)) in terms for word in words
+    ]
+    hits = [i for i, is_match in enumerate(matched) if is_match]
+    start = max(hits[0] - SNIPPET_WORDS // 3, 0) if hits else 0
+    window = words[start:start + SNIPPET_WORDS]
+
+    parts = [
+        f"<mark>{escape(word)}</mark>" if is_match else escape(word)
+        for word, is_match in zip(window, matched[start:])
+    ]
+    snippet = " ".join(parts)
+    if start > 0:
+        snippet = "… " + snippet
+    if start + SNIPPET_WORDS < len(words):
+        snippet += " …"
+    return snippet
+
+
+def search(query, kinds=None, limit=20):
+    """ Ranked search: every query term must match, title hits weigh more """
+    terms = set(tokenize(query))
+    if not terms:
+        return []
+
+    matches = SearchTerm.objects.filter(term__in=terms)
+    if kinds:
+        matches = matches.filter(document__kind__in=kinds)
+    ranked = list(
+        matches.values("document_id").annotate(
+            matched=Count("term"),
+            score=Sum("weight")).filter(matched=len(terms)).order_by(
+                "-score", "document_id")[:limit])
+
+    documents = SearchDocument.objects.in_bulk(
+        [row["document_id"] for row in ranked])
+    results = []
+    for row in ranked:
+        document = documents[row["document_id"]]
+        results.append({
+            "kind": document.kind,
+            "id": document.object_id,
+            "title": document.title,
+            "score": row["score"],
+            "snippet": make_snippet(document.plain_text, terms),
+        })
+    return results
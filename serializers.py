@@ -1,8 +1,133 @@
+from django.db import transaction
+from django.db.models import Prefetch
 from rest_framework import serializers
-from .models import Level, Task, TechnicalLevel, TechnicalLevelTasks, SituationType, TournamentType, CoachReport, TechnicalPart, Diagnosis, TrainingPlan, TrainingPlanDrill, MentalTask, PhysicalTask, Drill, KeyPoint
+from .models import Level, Task, TechnicalLevel, TechnicalLevelTasks, SituationType, TournamentType, CoachReport, TechnicalPart, Diagnosis, TrainingPlan, TrainingPlanDrill, MentalTask, PhysicalTask, Drill, KeyPoint, PendingPromotion, Player, PlayerProgress
+from .plans import DRILL_CATEGORIES
+from .progress import task_progress_keys
+
+
+class EagerLoadingMixin:
+    """ Lets a serializer declare the relations it reads per row.
+
+    Views call `setup_eager_loading(queryset)` so list endpoints load those
+    relations up front instead of issuing one query per row per relation.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
+def invalid_pk_message(pk):
+    return f'Invalid pk "{pk}" - object does not exist.'
+
+
+def existing_pks(model, rows, field):
+    """ The pks of `model` referenced by `field` of `rows` that exist, in one query """
+    return set(
+        model.objects.filter(pk__in={row[field]
+                                     for row in rows}).values_list("pk",
+                                                                   flat=True))
+
+
+def check_row_pks(rows, known_pks):
+    """ Raises one error dict per row for pks missing from `known_pks`.
+
+    `known_pks` maps a row field to the pks that exist (any container), so
+    batch inputs are validated with one query per model, not per row.
+    """
+    errors = [{
+        field: [invalid_pk_message(row[field])]
+        for field, pks in known_pks.items() if row[field] not in pks
+    } for row in rows]
+    if any(errors):
+        raise serializers.ValidationError(errors)
+
+
+def split_query_param(value):
+    return {name.strip() for name in (value or "").split(",") if name.strip()}
+
+
+class SparseFieldsMixin:
+    """ ✅ `?fields=a,b` / `?omit=a,b` support for GET requests.
+
+    Fields listed in `deferrable_fields` (the large HTML bodies) are also
+    deferred at the ORM level when omitted, see `get_deferred_fields`.
+    """
+    deferrable_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return
+        requested = split_query_param(request.query_params.get("fields"))
+        omitted = split_query_param(request.query_params.get("omit"))
+        for name in list(self.fields):
+            if (requested and name not in requested) or name in omitted:
+                self.fields.pop(name)
+
+    @classmethod
+    def get_deferred_fields(cls, query_params):
+        requested = split_query_param(query_params.get("fields"))
+        omitted = split_query_param(query_params.get("omit"))
+        return [
+            name for name in cls.deferrable_fields
+            if (requested and name not in requested) or name in omitted
+        ]
 
 
-class CoachReportSerializer(serializers.ModelSerializer):
+class RenderedHTMLMixin:
+    """ ✅ `?render=safe` / `?render=excerpt` support for GET requests.
+
+    Each field in `html_fields` is served from its pre-rendered
+    `<field>_html` or `<field>_excerpt` column instead of the raw TinyMCE
+    markup. The companion columns never appear as fields of their own.
+    Put it before SparseFieldsMixin so unused columns are deferred as well.
+    """
+    html_fields = ()
+    render_suffixes = {"safe": "_html", "excerpt": "_excerpt"}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.html_fields:
+            for suffix in self.render_suffixes.values():
+                self.fields.pop(f"{name}{suffix}", None)
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return
+        suffix = self.render_suffixes.get(request.query_params.get("render"))
+        if suffix:
+            for name in self.html_fields:
+                if name in self.fields:
+                    self.fields[name] = serializers.ReadOnlyField(
+                        source=f"{name}{suffix}")
+
+    @classmethod
+    def get_deferred_fields(cls, query_params):
+        get_deferred_fields = getattr(super(), "get_deferred_fields", None)
+        deferred = list(
+            get_deferred_fields(query_params)) if get_deferred_fields else []
+        suffix = cls.render_suffixes.get(query_params.get("render"), "")
+        for name in cls.html_fields:
+            used = None if name in deferred else f"{name}{suffix}"
+            deferred += [
+                column for column in (name, *(
+                    f"{name}{column_suffix}"
+                    for column_suffix in cls.render_suffixes.values()))
+                if column != used and column not in deferred
+            ]
+        return deferred
+
+
+class CoachReportSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    prefetch_related_fields = ("tasks", "diagnoses")
 
     class Meta:
         model = CoachReport
@@ -16,7 +141,10 @@ class TournamentTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class TechnicalLevelSerializer(serializers.ModelSerializer):
+class TechnicalLevelSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                               serializers.ModelSerializer):
+    html_fields = ("description", )
+    deferrable_fields = ("description", )
 
     class Meta:
         model = TechnicalLevel
@@ -30,7 +158,12 @@ class SituationTypeSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
-class LevelSerializer(serializers.ModelSerializer):
+class LevelSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                      EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("description", )
+    deferrable_fields = ("description", )
+    select_related_fields = ("required_technical_level", )
+    prefetch_related_fields = ("type_of_tournament", )
     required_technical_level = TechnicalLevelSerializer(read_only=True)
 
     class Meta:
@@ -38,7 +171,11 @@ class LevelSerializer(serializers.ModelSerializer):
         fields = '__all__'  # Include all fields in JSON response
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                     EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("picture_desc", )
+    deferrable_fields = ("description", "picture_desc")
+    select_related_fields = ("situation_type", "level")
     situation_type = SituationTypeSerializer()
     level_name = serializers.CharField(source="level.name", read_only=True)
 
@@ -54,7 +191,12 @@ class TechnicalPartSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
-class TechnicalLevelTasksSerializer(serializers.ModelSerializer):
+class TechnicalLevelTasksSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                                    EagerLoadingMixin,
+                                    serializers.ModelSerializer):
+    html_fields = ("picture_desc", )
+    deferrable_fields = ("description", "picture_desc")
+    select_related_fields = ("technical_part", )
     technical_part = TechnicalPartSerializer()
     full_name = serializers.SerializerMethodField()
 
@@ -66,7 +208,11 @@ class TechnicalLevelTasksSerializer(serializers.ModelSerializer):
         return obj.full_name()
 
 
-class DiagnosisSerializer(serializers.ModelSerializer):
+class DiagnosisSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                          EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("diagnosis", "measure")
+    deferrable_fields = ("diagnosis", "measure")
+    select_related_fields = ("technical_level_task__technical_part", )
     category = serializers.CharField(source="technical_level_task.category",
                                      read_only=True)
     technical_part = serializers.CharField(
@@ -88,7 +234,11 @@ class DiagnosisSerializer(serializers.ModelSerializer):
         ]
 
 
-class DrillSerializer(serializers.ModelSerializer):
+class DrillSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                      EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("description", )
+    deferrable_fields = ("description", )
+    select_related_fields = ("situation_type", )
     situation_type_name = serializers.ReadOnlyField(
         source="situation_type.name")
 
@@ -101,7 +251,10 @@ class DrillSerializer(serializers.ModelSerializer):
         ]
 
 
-class KeyPointSerializer(serializers.ModelSerializer):
+class KeyPointSerializer(SparseFieldsMixin, EagerLoadingMixin,
+                         serializers.ModelSerializer):
+    deferrable_fields = ("description", )
+    select_related_fields = ("drill", "level")
     drill_name = serializers.ReadOnlyField(source="drill.name")
     level_name = serializers.ReadOnlyField(source="level.name")
 
@@ -112,6 +265,116 @@ class KeyPointSerializer(serializers.ModelSerializer):
         ]
 
 
+class KeyPointPairSerializer(serializers.Serializer):
+    drill_id = serializers.IntegerField(min_value=1)
+    level_id = serializers.IntegerField(min_value=1)
+
+
+class KeyPointBatchSerializer(serializers.Serializer):
+    """ ✅ Input of the key point batch lookup: `pairs` or a `training_plan`.
+
+    Validated data always has `pairs` as a de-duplicated list of
+    `(drill_id, level_id)` tuples in request order.
+    """
+    MAX_PAIRS = 1000
+
+    pairs = KeyPointPairSerializer(many=True,
+                                   required=False,
+                                   allow_empty=False,
+                                   max_length=MAX_PAIRS)
+    training_plan = serializers.PrimaryKeyRelatedField(
+        queryset=TrainingPlan.objects.all(), required=False)
+
+    def validate_pairs(self, pairs):
+        check_row_pks(
+            pairs, {
+                "drill_id": existing_pks(Drill, pairs, "drill_id"),
+                "level_id": existing_pks(Level, pairs, "level_id"),
+            })
+        return [(pair["drill_id"], pair["level_id"]) for pair in pairs]
+
+    def validate(self, attrs):
+        if ("pairs" in attrs) == ("training_plan" in attrs):
+            raise serializers.ValidationError(
+                "Send either pairs or training_plan.")
+        if "training_plan" in attrs:
+            attrs["pairs"] = list(
+                attrs["training_plan"].plan_drills.order_by("pk").values_list(
+                    "drill_id", "selected_level_id"))
+        attrs["pairs"] = list(dict.fromkeys(attrs["pairs"]))
+        return attrs
+
+
+class PlayerSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Player
+        fields = "__all__"
+
+
+class PlayerProgressSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    select_related_fields = ("task", )
+    task_name = serializers.ReadOnlyField(source="task.name")
+
+    class Meta:
+        model = PlayerProgress
+        fields = [
+            "id", "player", "task", "task_name", "is_completed",
+            "completion_date"
+        ]
+
+
+class PlayerProgressEntrySerializer(serializers.Serializer):
+    player = serializers.IntegerField(min_value=1)
+    task = serializers.IntegerField(min_value=1)
+    is_completed = serializers.BooleanField(default=True)
+
+
+class PlayerProgressBatchSerializer(serializers.Serializer):
+    """ ✅ Input of the progress batch update.
+
+    Validated data has `entries` as `(player_id, task_id, is_completed)`
+    tuples and `task_keys` mapping each task to its level and situation type.
+    """
+    MAX_ENTRIES = 5000
+
+    entries = PlayerProgressEntrySerializer(many=True,
+                                            allow_empty=False,
+                                            max_length=MAX_ENTRIES)
+
+    def validate_entries(self, entries):
+        self.task_keys = task_progress_keys(
+            {entry["task"]
+             for entry in entries})
+        check_row_pks(
+            entries, {
+                "player": existing_pks(Player, entries, "player"),
+                "task": self.task_keys,
+            })
+        return [(entry["player"], entry["task"], entry["is_completed"])
+                for entry in entries]
+
+    def validate(self, attrs):
+        attrs["task_keys"] = self.task_keys
+        return attrs
+
+
+class PendingPromotionSerializer(EagerLoadingMixin,
+                                 serializers.ModelSerializer):
+    select_related_fields = ("player", "from_level", "to_level")
+    player_name = serializers.ReadOnlyField(source="player.name")
+    from_level_name = serializers.ReadOnlyField(source="from_level.name")
+    to_level_name = serializers.ReadOnlyField(source="to_level.name")
+
+    class Meta:
+        model = PendingPromotion
+        fields = [
+            "id", "player", "player_name", "from_level", "from_level_name",
+            "to_level", "to_level_name", "completed", "total", "status",
+            "created_at", "decided_at"
+        ]
+
+
 class TrainingPlanSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -119,7 +382,9 @@ class TrainingPlanSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "date"]
 
 
-class TrainingPlanDrillSerializer(serializers.ModelSerializer):
+class TrainingPlanDrillSerializer(EagerLoadingMixin,
+                                  serializers.ModelSerializer):
+    select_related_fields = ("drill", "selected_level")
     drill_name = serializers.ReadOnlyField(source="drill.name")
     selected_level_name = serializers.ReadOnlyField(
         source="selected_level.name")
@@ -132,14 +397,167 @@ class TrainingPlanDrillSerializer(serializers.ModelSerializer):
         ]
 
 
-class MentalTaskSerializer(serializers.ModelSerializer):
+class TrainingPlanDrillInputSerializer(serializers.Serializer):
+    drill = serializers.IntegerField(min_value=1)
+    selected_level = serializers.IntegerField(min_value=1)
+    time_allocated = serializers.IntegerField(min_value=1, required=False)
+
+
+class TrainingPlanBulkSerializer(serializers.ModelSerializer):
+    """ ✅ Creates a training plan together with all of its drills.
+
+    Drill and level ids are validated with one query each, which also
+    resolves the `suggested_time` default for rows without `time_allocated`.
+    """
+    drills = TrainingPlanDrillInputSerializer(many=True)
+
+    class Meta:
+        model = TrainingPlan
+        fields = ["id", "name", "date", "drills"]
+
+    def validate_drills(self, drills):
+        suggested_times = dict(
+            Drill.objects.filter(id__in={row["drill"]
+                                         for row in drills}).values_list(
+                                             "id", "suggested_time"))
+        check_row_pks(
+            drills, {
+                "drill": suggested_times,
+                "selected_level": existing_pks(Level, drills,
+                                               "selected_level"),
+            })
+
+        for row in drills:
+            row.setdefault("time_allocated", suggested_times[row["drill"]])
+        return drills
+
+    def create(self, validated_data):
+        drills = validated_data.pop("drills")
+        with transaction.atomic():
+            plan = TrainingPlan.objects.create(**validated_data)
+            # bulk_create skips TrainingPlanDrill.save, defaults are resolved above
+            TrainingPlanDrill.objects.bulk_create([
+                TrainingPlanDrill(training_plan=plan,
+                                  drill_id=row["drill"],
+                                  selected_level_id=row["selected_level"],
+                                  time_allocated=row["time_allocated"])
+                for row in drills
+            ])
+        return plan
+
+
+class TrainingPlanGeneratorSerializer(serializers.Serializer):
+    """ ✅ Input of the training plan generator.
+
+    Ids are checked against the drill index passed in the `index` context
+    entry, without a query. `situation_type_mix` keys become ints. With a
+    `name` and a `date` the generated plan is saved as well.
+    """
+    MAX_DURATION = 600
+    MAX_REQUIRED_DRILLS = 50
+
+    level = serializers.IntegerField()
+    duration = serializers.IntegerField(min_value=1, max_value=MAX_DURATION)
+    category_mix = serializers.DictField(
+        child=serializers.FloatField(min_value=0), required=False)
+    situation_type_mix = serializers.DictField(
+        child=serializers.FloatField(min_value=0), required=False)
+    required_drills = serializers.ListField(child=serializers.IntegerField(),
+                                            max_length=MAX_REQUIRED_DRILLS,
+                                            required=False)
+    name = serializers.CharField(max_length=200, required=False)
+    date = serializers.DateField(required=False)
+
+    def validate_category_mix(self, mix):
+        unknown = sorted(set(mix) - set(DRILL_CATEGORIES))
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown categories: {', '.join(unknown)}")
+        return mix
+
+    def validate(self, attrs):
+        index = self.context["index"]
+        errors = {}
+        if attrs["level"] not in index.level_ids:
+            errors["level"] = [invalid_pk_message(attrs["level"])]
+
+        situation_type_mix = {}
+        for key, share in attrs.get("situation_type_mix", {}).items():
+            try:
+                situation_type_mix[int(key)] = share
+            except ValueError:
+                situation_type_mix[key] = share
+        unknown = [
+            key for key in situation_type_mix
+            if key not in index.situation_type_ids
+        ]
+        if unknown:
+            errors["situation_type_mix"] = [
+                invalid_pk_message(key) for key in unknown
+            ]
+
+        required = list(dict.fromkeys(attrs.get("required_drills", [])))
+        missing = [
+            drill_id for drill_id in required if drill_id not in index.drills
+        ]
+        if missing:
+            errors["required_drills"] = [
+                invalid_pk_message(drill_id) for drill_id in missing
+            ]
+        elif sum(index.drills[drill_id].suggested_time
+                 for drill_id in required) > attrs["duration"]:
+            errors["required_drills"] = [
+                "The required drills take longer than the duration."
+            ]
+
+        if ("name" in attrs) != ("date" in attrs):
+            errors["date" if "name" in attrs else "name"] = [
+                "name and date are needed together to save the plan."
+            ]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        attrs.update(situation_type_mix=situation_type_mix,
+                     required_drills=required)
+        return attrs
+
+
+class TrainingPlanWithDrillsSerializer(EagerLoadingMixin,
+                                       serializers.ModelSerializer):
+    prefetch_related_fields = (Prefetch(
+        "plan_drills",
+        queryset=TrainingPlanDrill.objects.select_related(
+            "drill", "selected_level").order_by("pk")), )
+    drills = TrainingPlanDrillSerializer(source="plan_drills",
+                                         many=True,
+                                         read_only=True)
+    total_minutes = serializers.SerializerMethodField()
+
+    class Meta:
+        model = TrainingPlan
+        fields = ["id", "name", "date", "drills", "total_minutes"]
+
+    def get_total_minutes(self, obj):
+        return sum(
+            plan_drill.time_allocated for plan_drill in obj.plan_drills.all())
+
+
+class MentalTaskSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                           EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("description", )
+    deferrable_fields = ("description", )
+    prefetch_related_fields = ("drills", )
 
     class Meta:
         model = MentalTask
         fields = "__all__"
 
 
-class PhysicalTaskSerializer(serializers.ModelSerializer):
+class PhysicalTaskSerializer(RenderedHTMLMixin, SparseFieldsMixin,
+                             EagerLoadingMixin, serializers.ModelSerializer):
+    html_fields = ("description", )
+    deferrable_fields = ("description", )
+    prefetch_related_fields = ("drills", )
 
     class Meta:
         model = PhysicalTask
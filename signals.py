@@ -1,13 +1,338 @@
-from django.db.models.signals import post_save
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
-from .models import Drill, KeyPoint, Level
+from django.utils import timezone
+from .analytics import ROLLUPS, apply_report_delta, apply_rollup_delta, report_day
+from .catalogue import CATALOGUE_MODELS, bump_catalogue_version
+from .charts import invalidate_chart_data
+from .search import SEARCH_SOURCES, index_object, remove_object
+from .models import CoachReport, Drill, KeyPoint, Level, MentalTask, PhysicalTask, Player, PlayerProgress, SituationType, Task, TechnicalLevel, TournamentType
+from .pathway import rebuild_pathways
+from .progress import apply_progress_deltas, move_task_progress, task_progress_keys
+from .promotions import schedule_promotion_evaluation
+from .richtext import RICH_TEXT_FIELDS, render_rich_text
+
+KEY_POINT_BATCH_SIZE = 500
+
+
+def bulk_create_key_points(pairs):
+    """ Inserts an empty KeyPoint for every (drill_id, level_id) pair in batches """
+    key_points = [
+        KeyPoint(drill_id=drill_id, level_id=level_id, description="")
+        for drill_id, level_id in pairs
+    ]
+    with transaction.atomic():
+        # ✅ The (drill, level) unique constraint makes re-provisioning a no-op
+        KeyPoint.objects.bulk_create(key_points,
+                                     batch_size=KEY_POINT_BATCH_SIZE,
+                                     ignore_conflicts=True)
+        if key_points:
+            # bulk_create skips post_save, so invalidate the catalogue here
+            transaction.on_commit(bump_catalogue_version)
+    return len(key_points)
 
 
 @receiver(post_save, sender=Drill)
 def create_keypoints_for_levels(sender, instance, created, **kwargs):
     if created:
-        levels = Level.objects.all()  # ✅ Get all levels
-        for level in levels:
-            KeyPoint.objects.create(drill=instance,
-                                    level=level,
-                                    description="")
+        level_ids = Level.objects.values_list("id", flat=True)  # ✅ Get all levels
+        bulk_create_key_points(
+            (instance.id, level_id) for level_id in level_ids)
+
+
+@receiver(post_save, sender=Level)
+def create_keypoints_for_drills(sender, instance, created, **kwargs):
+    """ ✅ Back-fill key points for every existing drill when a level is added """
+    if created:
+        drill_ids = Drill.objects.values_list("id", flat=True)
+        bulk_create_key_points(
+            (drill_id, instance.id) for drill_id in drill_ids)
+
+
+@receiver(post_save, sender=Level)
+@receiver(post_delete, sender=Level)
+def invalidate_level_chart_data(sender, instance, **kwargs):
+    level_id = instance.id
+    transaction.on_commit(lambda: invalidate_chart_data(level_id))
+
+
+def invalidate_catalogue(sender, **kwargs):
+    """ ✅ Any admin edit to curriculum content moves the catalogue to a new version """
+    transaction.on_commit(bump_catalogue_version)
+
+
+for catalogue_model in CATALOGUE_MODELS:
+    post_save.connect(invalidate_catalogue,
+                      sender=catalogue_model,
+                      dispatch_uid=f"catalogue_save_{catalogue_model.__name__}")
+    post_delete.connect(
+        invalidate_catalogue,
+        sender=catalogue_model,
+        dispatch_uid=f"catalogue_delete_{catalogue_model.__name__}")
+    for m2m_field in catalogue_model._meta.many_to_many:
+        m2m_changed.connect(
+            invalidate_catalogue,
+            sender=m2m_field.remote_field.through,
+            dispatch_uid=
+            f"catalogue_m2m_{catalogue_model.__name__}_{m2m_field.name}")
+
+
+def make_search_handlers(kind):
+
+    def update_search_index(sender, instance, **kwargs):
+        index_object(kind, instance)
+
+    def remove_from_search_index(sender, instance, **kwargs):
+        remove_object(kind, instance.pk)
+
+    return update_search_index, remove_from_search_index
+
+
+# ✅ Keep the search index in step with every indexed model
+for search_kind, (search_model, _, _) in SEARCH_SOURCES.items():
+    on_save, on_delete = make_search_handlers(search_kind)
+    post_save.connect(on_save,
+                      sender=search_model,
+                      weak=False,
+                      dispatch_uid=f"search_index_save_{search_kind}")
+    post_delete.connect(on_delete,
+                        sender=search_model,
+                        weak=False,
+                        dispatch_uid=f"search_index_delete_{search_kind}")
+
+
+def render_rich_text_fields(sender, instance, **kwargs):
+    """ ✅ Sanitized HTML and excerpts are rendered once per save, not per read """
+    deferred = instance.get_deferred_fields()
+    render_rich_text(instance, [
+        name for name in RICH_TEXT_FIELDS[sender] if name not in deferred
+    ])
+
+
+for rich_text_model in RICH_TEXT_FIELDS:
+    pre_save.connect(
+        render_rich_text_fields,
+        sender=rich_text_model,
+        dispatch_uid=f"rich_text_render_{rich_text_model.__name__}")
+
+
+def schedule_pathway_rebuild(level_ids):
+    level_ids = {level_id for level_id in level_ids if level_id}
+    if level_ids:
+        transaction.on_commit(lambda: rebuild_pathways(level_ids))
+
+
+@receiver(post_save, sender=Level)
+def rebuild_level_pathway(sender, instance, **kwargs):
+    schedule_pathway_rebuild([instance.pk])
+
+
+@receiver(post_save, sender=TechnicalLevel)
+@receiver(pre_delete, sender=TechnicalLevel)
+def rebuild_pathways_for_technical_level(sender, instance, **kwargs):
+    # pre_delete: the levels are SET_NULL (without post_save) before post_delete
+    schedule_pathway_rebuild(
+        Level.objects.filter(required_technical_level=instance).values_list(
+            "id", flat=True))
+
+
+@receiver(post_save, sender=TournamentType)
+@receiver(pre_delete, sender=TournamentType)
+def rebuild_pathways_for_tournament_type(sender, instance, **kwargs):
+    schedule_pathway_rebuild(instance.level_set.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=SituationType)
+def rebuild_pathways_for_situation_type(sender, instance, **kwargs):
+    schedule_pathway_rebuild(
+        Task.objects.filter(situation_type=instance).values_list("level_id",
+                                                                 flat=True))
+
+
+@receiver(pre_save, sender=Task)
+@receiver(pre_save, sender=MentalTask)
+@receiver(pre_save, sender=PhysicalTask)
+def remember_previous_level(sender, instance, **kwargs):
+    """ ✅ A task moved to another level must also leave the old level's pathway """
+    instance._previous_level_id = sender.objects.filter(
+        pk=instance.pk).values_list("level_id",
+                                    flat=True).first() if instance.pk else None
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=MentalTask)
+@receiver(post_save, sender=PhysicalTask)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=MentalTask)
+@receiver(post_delete, sender=PhysicalTask)
+def rebuild_pathways_for_task(sender, instance, **kwargs):
+    schedule_pathway_rebuild(
+        [instance.level_id,
+         getattr(instance, "_previous_level_id", None)])
+
+
+@receiver(m2m_changed, sender=Level.type_of_tournament.through)
+@receiver(m2m_changed, sender=MentalTask.drills.through)
+@receiver(m2m_changed, sender=PhysicalTask.drills.through)
+def rebuild_pathways_for_m2m(sender, instance, action, reverse, model,
+                             pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        schedule_pathway_rebuild([
+            instance.pk if isinstance(instance, Level) else instance.level_id
+        ])
+        return
+    # ✅ Reverse side: `instance` is the TournamentType / Drill, `model` owns the field
+    if pk_set:
+        owners = model.objects.filter(pk__in=pk_set)
+    else:
+        field_name = next(field.name for field in model._meta.many_to_many
+                          if field.remote_field.through is sender)
+        owners = model.objects.filter(**{field_name: instance})
+    schedule_pathway_rebuild(
+        owners.values_list("id" if model is Level else "level_id", flat=True))
+
+
+@receiver(pre_save, sender=CoachReport)
+def remember_previous_rollup_key(sender, instance, **kwargs):
+    previous = sender.objects.filter(pk=instance.pk).values_list(
+        "created_at", "technical_level_id").first() if instance.pk else None
+    instance._previous_rollup_key = (timezone.localdate(previous[0]),
+                                     previous[1]) if previous else None
+
+
+@receiver(post_save, sender=CoachReport)
+def move_coach_report_rollups(sender, instance, created, **kwargs):
+    """ ✅ A report moved to another technical level moves its counts along """
+    previous = getattr(instance, "_previous_rollup_key", None)
+    current = (report_day(instance), instance.technical_level_id)
+    if not created and previous and previous != current:
+        apply_report_delta(instance, -1, *previous)
+        apply_report_delta(instance, 1, *current)
+
+
+@receiver(pre_delete, sender=CoachReport)
+def remove_coach_report_rollups(sender, instance, **kwargs):
+    # The through rows are deleted without m2m_changed, uncount them here
+    apply_report_delta(instance, -1, report_day(instance),
+                       instance.technical_level_id)
+
+
+def make_rollup_handler(dimension, m2m_field):
+
+    def update_coach_report_rollups(sender, instance, action, reverse,
+                                    pk_set, **kwargs):
+        if action not in ("post_add", "post_remove", "pre_clear"):
+            return
+        delta = 1 if action == "post_add" else -1
+        if not reverse:
+            if action == "pre_clear":
+                pk_set = getattr(instance,
+                                 m2m_field).values_list("pk", flat=True)
+            apply_rollup_delta(dimension, report_day(instance),
+                               instance.technical_level_id, pk_set, delta)
+            return
+        # ✅ Reverse side: `instance` is the task / diagnosis, pk_set the reports
+        reports = instance.coachreport_set.all(
+        ) if action == "pre_clear" else CoachReport.objects.filter(
+            pk__in=pk_set)
+        for report in reports.only("created_at", "technical_level_id"):
+            apply_rollup_delta(dimension, report_day(report),
+                               report.technical_level_id, [instance.pk], delta)
+
+    return update_coach_report_rollups
+
+
+# ✅ Keep the coach report rollups in step with the report m2m fields
+for rollup_dimension, (_, _, rollup_m2m_field) in ROLLUPS.items():
+    m2m_changed.connect(
+        make_rollup_handler(rollup_dimension, rollup_m2m_field),
+        sender=getattr(CoachReport, rollup_m2m_field).through,
+        weak=False,
+        dispatch_uid=f"coach_report_rollup_{rollup_dimension}")
+
+
+def touch_coach_reports(sender, instance, action, reverse, pk_set, **kwargs):
+    """ ✅ A changed task / diagnosis selection changes the report's ETag too """
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    now = timezone.now()
+    if not reverse:
+        instance.updated_at = now
+        reports = CoachReport.objects.filter(pk=instance.pk)
+    elif action == "pre_clear":
+        reports = CoachReport.objects.filter(
+            pk__in=list(instance.coachreport_set.values_list("pk", flat=True)))
+    else:
+        reports = CoachReport.objects.filter(pk__in=pk_set)
+    reports.update(updated_at=now)
+
+
+for coach_report_m2m_field in ("tasks", "diagnoses"):
+    m2m_changed.connect(
+        touch_coach_reports,
+        sender=getattr(CoachReport, coach_report_m2m_field).through,
+        dispatch_uid=f"coach_report_touch_{coach_report_m2m_field}")
+
+
+@receiver(pre_save, sender=PlayerProgress)
+def remember_previous_progress(sender, instance, **kwargs):
+    instance._previous_progress = sender.objects.filter(
+        pk=instance.pk).values_list(
+            "player_id", "task_id",
+            "is_completed").first() if instance.pk else None
+
+
+@receiver(post_save, sender=PlayerProgress)
+def count_player_progress(sender, instance, **kwargs):
+    """ ✅ Moves the progress counters in the same transaction as the save """
+    changes = []
+    if instance.is_completed:
+        changes.append((instance.player_id, instance.task_id, 1))
+    previous = getattr(instance, "_previous_progress", None)
+    if previous and previous[2]:
+        changes.append((previous[0], previous[1], -1))
+    if len(changes) == 2 and changes[0][:2] == changes[1][:2]:
+        return
+    task_keys = task_progress_keys({task_id for _, task_id, _ in changes})
+    deltas = defaultdict(int)
+    for player_id, task_id, delta in changes:
+        deltas[(player_id, *task_keys[task_id])] += delta
+    apply_progress_deltas(deltas)
+
+
+@receiver(post_delete, sender=PlayerProgress)
+def uncount_player_progress(sender, instance, **kwargs):
+    if not instance.is_completed:
+        return
+    task_key = task_progress_keys([instance.task_id]).get(instance.task_id)
+    if task_key:
+        apply_progress_deltas({(instance.player_id, *task_key): -1})
+
+
+@receiver(post_save, sender=PlayerProgress)
+@receiver(post_delete, sender=PlayerProgress)
+@receiver(post_save, sender=Player)
+def evaluate_player_promotion(sender, instance, **kwargs):
+    """ ✅ Re-checks the player's pending promotion once the change is committed """
+    schedule_promotion_evaluation(
+        [instance.pk if sender is Player else instance.player_id])
+
+
+@receiver(pre_save, sender=Task)
+def remember_previous_progress_key(sender, instance, **kwargs):
+    instance._previous_progress_key = sender.objects.filter(
+        pk=instance.pk).values_list(
+            "level_id", "situation_type_id").first() if instance.pk else None
+
+
+@receiver(post_save, sender=Task)
+def move_progress_counters(sender, instance, created, **kwargs):
+    """ ✅ A task moved to another level or situation type takes its completions along """
+    previous_key = getattr(instance, "_previous_progress_key", None)
+    if previous_key:
+        move_task_progress(instance.pk, previous_key,
+                           (instance.level_id, instance.situation_type_id))
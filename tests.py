@@ -1,3 +1,1867 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
 
-# Create your tests here.
+from io import StringIO
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from . import exporter
+from .middleware import QueryCollector, RequestStatsMiddleware, request_stats
+from .models import CoachReport, CoachReportDiagnosisDaily, CoachReportTaskDaily, Diagnosis, Drill, KeyPoint, Level, LevelPathway, MentalTask, PendingPromotion, PhysicalTask, Player, PlayerLevelProgress, PlayerProgress, SearchDocument, SearchTerm, SituationType, Task, TechnicalLevel, TechnicalLevelTasks, TechnicalPart, TournamentType, TrainingPlan, TrainingPlanDrill
+from .progress import set_progress
+from .promotions import evaluate_promotions
+from .richtext import sanitize_html
+from .search import search
+from .signals import bulk_create_key_points
+
+
+class DrillCountsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.level_a = Level.objects.create(name="A", description="")
+        cls.level_b = Level.objects.create(name="B", description="")
+        cls.rally = SituationType.objects.create(name="Rally",
+                                                 category="Taktisk")
+        cls.net = SituationType.objects.create(name="Net", category="Taktisk")
+        for i in range(10):
+            Drill.objects.create(name=f"Drill {i}",
+                                 description="",
+                                 situation_type=cls.rally if i %
+                                 2 else cls.net)
+        # Every drill gets content for level A, only the first three for B
+        KeyPoint.objects.filter(level=cls.level_a).update(description="Ok")
+        KeyPoint.objects.filter(level=cls.level_b,
+                                drill__name__in=["Drill 0", "Drill 1",
+                                                 "Drill 2"]).update(
+                                                     description="Ok")
+
+    def test_counts_for_one_level(self):
+        url = reverse("drill-count-by-situation-type")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"level": self.level_b.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"Net": 2, "Rally": 1})
+
+    def test_counts_for_all_levels(self):
+        url = reverse("drill-count-by-situation-type")
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"level": "all"})
+        self.assertEqual(
+            response.json(), {
+                str(self.level_a.id): {
+                    "Net": 5,
+                    "Rally": 5
+                },
+                str(self.level_b.id): {
+                    "Net": 2,
+                    "Rally": 1
+                },
+            })
+
+    def test_query_count_does_not_grow_with_drills(self):
+        for i in range(10, 30):
+            Drill.objects.create(name=f"Drill {i}",
+                                 description="",
+                                 situation_type=self.rally)
+        url = reverse("drill-count-by-situation-type")
+        with self.assertNumQueries(1):
+            self.client.get(url, {"level": self.level_a.id})
+
+    def test_missing_or_invalid_level(self):
+        url = reverse("drill-count-by-situation-type")
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(
+            self.client.get(url, {
+                "level": "abc"
+            }).status_code, 400)
+
+
+class KeyPointProvisioningTests(TestCase):
+
+    def setUp(self):
+        self.situation_type = SituationType.objects.create(
+            name="Rally", category="Taktisk")
+
+    def create_drill(self, name):
+        return Drill.objects.create(name=name,
+                                    description="",
+                                    situation_type=self.situation_type)
+
+    def test_new_drill_gets_key_point_per_level_in_one_insert(self):
+        for i in range(5):
+            Level.objects.create(name=f"Level {i}", description="")
+        with CaptureQueriesContext(connection) as context:
+            drill = self.create_drill("Drill")
+        inserts = [
+            q for q in context.captured_queries
+            if q["sql"].startswith("INSERT")
+            and 'INTO "core_keypoint"' in q["sql"]
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(drill.key_points.count(), 5)
+
+    def test_new_level_backfills_existing_drills(self):
+        drills = [self.create_drill(f"Drill {i}") for i in range(3)]
+        level = Level.objects.create(name="New", description="")
+        self.assertEqual(
+            set(level.key_points.values_list("drill_id", flat=True)),
+            {drill.id for drill in drills})
+
+    def test_key_points_are_unique_per_pair(self):
+        level = Level.objects.create(name="Level", description="")
+        drill = self.create_drill("Drill")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            KeyPoint.objects.create(drill=drill, level=level, description="")
+
+        # Provisioning the same pairs again inserts nothing
+        bulk_create_key_points([(drill.id, level.id)] * 2)
+        self.assertEqual(KeyPoint.objects.filter(drill=drill).count(), 1)
+
+    def test_reconcile_command_creates_only_missing_pairs(self):
+        levels = [
+            Level.objects.create(name=f"Level {i}", description="")
+            for i in range(3)
+        ]
+        drills = [self.create_drill(f"Drill {i}") for i in range(4)]
+        KeyPoint.objects.filter(drill=drills[0], level=levels[1]).delete()
+        KeyPoint.objects.filter(drill=drills[3]).delete()
+
+        out = StringIO()
+        call_command("reconcile_keypoints", chunk_size=2, stdout=out)
+        self.assertIn("Created 4 missing key points", out.getvalue())
+        self.assertEqual(KeyPoint.objects.count(), 12)
+
+        call_command("reconcile_keypoints", stdout=out)
+        self.assertEqual(KeyPoint.objects.count(), 12)
+
+
+def create_catalogue_rows(suffix):
+    """ Creates one row per model, wired to every relation the serializers read """
+    technical_level = TechnicalLevel.objects.create(name=f"TL {suffix}",
+                                                    description="")
+    tournament_type = TournamentType.objects.create(name=f"TT {suffix}")
+    level = Level.objects.create(name=f"Level {suffix}",
+                                 description="",
+                                 required_technical_level=technical_level)
+    level.type_of_tournament.add(tournament_type)
+    situation_type = SituationType.objects.create(name=f"ST {suffix}",
+                                                  category="Taktisk")
+    Task.objects.create(name=f"Task {suffix}",
+                        description="",
+                        level=level,
+                        situation_type=situation_type)
+    technical_part = TechnicalPart.objects.create(name=f"TP {suffix}")
+    technical_task = TechnicalLevelTasks.objects.create(
+        name=f"TLT {suffix}",
+        description="",
+        technical_level=technical_level,
+        technical_part=technical_part)
+    diagnosis = Diagnosis.objects.create(technical_level_task=technical_task,
+                                         name=f"Diagnosis {suffix}",
+                                         diagnosis="",
+                                         measure="")
+    report = CoachReport.objects.create(coach_name="Coach",
+                                        player_name="Player",
+                                        technical_level=technical_level)
+    report.tasks.add(technical_task)
+    report.diagnoses.add(diagnosis)
+    drill = Drill.objects.create(name=f"Drill {suffix}",
+                                 description="",
+                                 situation_type=situation_type)
+    plan = TrainingPlan.objects.create(name=f"Plan {suffix}",
+                                       date=datetime.date(2025, 1, 1))
+    TrainingPlanDrill.objects.create(training_plan=plan,
+                                     drill=drill,
+                                     selected_level=level,
+                                     time_allocated=10)
+    mental_task = MentalTask.objects.create(name=f"MT {suffix}",
+                                            description="",
+                                            level=level,
+                                            category="Gameplan")
+    mental_task.drills.add(drill)
+    physical_task = PhysicalTask.objects.create(name=f"PT {suffix}",
+                                                description="",
+                                                level=level,
+                                                category="Strength")
+    physical_task.drills.add(drill)
+
+
+class ListEndpointQueryCountTests(TestCase):
+    LIST_ROUTES = [
+        "level-list",
+        "task-list",
+        "technicallevel-list",
+        "situationtype-list",
+        "tournamenttype-list",
+        "diagnosis-list",
+        "technicalpart-list",
+        "coach-report-list",
+        "drill-list",
+        "trainingplan-list",
+        "trainingplandrill-list",
+        "mentaltask-list",
+        "physicaltask-list",
+        "keypoint-list",
+    ]
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_is_constant_per_list_endpoint(self):
+        for i in range(2):
+            create_catalogue_rows(i)
+        before = {
+            name: self.count_queries(reverse(name))
+            for name in self.LIST_ROUTES
+        }
+        for i in range(2, 8):
+            create_catalogue_rows(i)
+        for name in self.LIST_ROUTES:
+            with self.subTest(route=name):
+                self.assertEqual(self.count_queries(reverse(name)),
+                                 before[name])
+
+
+class CatalogueSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalogue_rows(0)
+
+    def test_snapshot_contains_every_section(self):
+        response = self.client.get(reverse("catalogue"))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        for section in ("levels", "technical_levels", "tasks",
+                        "technical_level_tasks", "diagnoses", "drills",
+                        "key_points"):
+            self.assertEqual(len(data[section]), 1)
+        self.assertTrue(response["ETag"].startswith('"'))
+
+    def test_repeat_visit_is_served_from_cache(self):
+        etag = self.client.get(reverse("catalogue"))["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("catalogue"))
+        self.assertEqual(response["ETag"], etag)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("catalogue"),
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_admin_edit_changes_version(self):
+        etag = self.client.get(reverse("catalogue"))["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Level.objects.create(name="New level", description="")
+        response = self.client.get(reverse("catalogue"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()["levels"]), 2)
+
+    def test_m2m_change_changes_version(self):
+        etag = self.client.get(reverse("catalogue"))["ETag"]
+        level = Level.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            level.type_of_tournament.clear()
+        self.assertNotEqual(
+            self.client.get(reverse("catalogue"))["ETag"], etag)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        create_catalogue_rows(0)
+        self.drill = Drill.objects.get()
+
+    def test_list_returns_304_for_matching_etag(self):
+        response = self.client.get(reverse("drill-list"))
+        self.assertNotIn("Last-Modified", response)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("drill-list"),
+                                       HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_ignores_if_modified_since_after_a_delete(self):
+        older = TournamentType.objects.create(name="Older")
+        url = reverse("tournamenttype-list")
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            older.delete()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+    def test_coach_report_selection_changes_the_etag(self):
+        report = CoachReport.objects.get()
+        task = TechnicalLevelTasks.objects.create(
+            name="Added",
+            description="",
+            technical_level=report.technical_level,
+            technical_part=TechnicalPart.objects.get())
+        url = reverse("coach-report-list")
+        etag = self.client.get(url)["ETag"]
+        report.tasks.add(task)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        task.coachreport_set.clear()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_follows_related_edits(self):
+        url = reverse("drill-detail", args=[self.drill.id])
+        response = self.client.get(url)
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(
+            self.client.get(url,
+                            HTTP_IF_NONE_MATCH=response["ETag"]).status_code,
+            304)
+
+        situation_type = self.drill.situation_type
+        situation_type.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            situation_type.save()
+        response = self.client.get(url,
+                                   HTTP_IF_MODIFIED_SINCE=http_date(),
+                                   HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["situation_type_name"], "Renamed")
+
+    def test_saving_a_row_changes_the_etag(self):
+        etag = self.client.get(reverse("drill-list"))["ETag"]
+        self.drill.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.drill.save()
+        response = self.client.get(reverse("drill-list"),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_editing_a_related_row_changes_the_etag(self):
+        url = reverse("drill-detail", args=[self.drill.id])
+        etag = self.client.get(url)["ETag"]
+        situation_type = SituationType.objects.get()
+        situation_type.name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            situation_type.save()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SparseFieldsAndPaginationTests(TestCase):
+
+    def setUp(self):
+        for i in range(5):
+            create_catalogue_rows(i)
+
+    def test_fields_param_limits_output_and_defers_html(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse("drill-list"),
+                                       {"fields": "id,name"})
+        self.assertEqual(set(response.json()[0]), {"id", "name"})
+        select = [
+            q["sql"] for q in context.captured_queries
+            if 'FROM "core_drill"' in q["sql"] and "COUNT" not in q["sql"]
+        ][0]
+        self.assertNotIn('"core_drill"."description"', select)
+
+    def test_omit_param_drops_fields(self):
+        response = self.client.get(reverse("diagnosis-list"),
+                                   {"omit": "diagnosis,measure"})
+        row = response.json()[0]
+        self.assertNotIn("diagnosis", row)
+        self.assertIn("technical_part", row)
+
+    def test_pagination_is_opt_in(self):
+        self.assertIsInstance(self.client.get(reverse("task-list")).json(),
+                              list)
+        page = self.client.get(reverse("task-list"), {"page_size": 2}).json()
+        self.assertEqual(len(page["results"]), 2)
+        Task.objects.create(name="Inserted",
+                            description="",
+                            level=Level.objects.first(),
+                            situation_type=SituationType.objects.first())
+        seen = [row["id"] for row in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).json()
+            seen += [row["id"] for row in page["results"]]
+        self.assertEqual(seen, sorted(Task.objects.values_list("id",
+                                                               flat=True)))
+
+
+class ChartDataTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.level = Level.objects.create(name="A",
+                                          description="",
+                                          coaching_hours=2,
+                                          own_practice_hours=2)
+        self.empty_level = Level.objects.create(name="B", description="")
+
+    def test_single_level(self):
+        response = self.client.get(reverse("chart-data", args=[self.level.id]))
+        self.assertEqual(response.json()[0], {"name": "Med trener", "value": 50})
+        self.assertEqual(
+            self.client.get(reverse("chart-data", args=[999])).status_code,
+            404)
+
+    def test_zero_total_does_not_fail(self):
+        response = self.client.get(
+            reverse("chart-data", args=[self.empty_level.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row["value"] for row in response.json()}, {0})
+
+    def test_batch_is_cached_and_invalidated_on_save(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("chart-data-batch"))
+        self.assertEqual(set(response.json()),
+                         {str(self.level.id), str(self.empty_level.id)})
+        with self.assertNumQueries(0):
+            self.client.get(reverse("chart-data-batch"),
+                            {"levels": f"{self.level.id},{self.empty_level.id}"})
+
+        self.level.own_practice_hours = 6
+        with self.captureOnCommitCallbacks(execute=True):
+            self.level.save()
+        response = self.client.get(reverse("chart-data-batch"),
+                                   {"levels": str(self.level.id)})
+        self.assertEqual(response.json()[str(self.level.id)][0]["value"], 25)
+
+    def test_batch_rejects_bad_ids(self):
+        response = self.client.get(reverse("chart-data-batch"),
+                                   {"levels": "1,x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        situation_type = SituationType.objects.create(name="Rally",
+                                                      category="Taktisk")
+        self.drill = Drill.objects.create(
+            name="Crosscourt forehand",
+            description="<p>Slå <strong>forehanden</strong> dypt på "
+            "baklinjen &amp; hold ballen i spill.</p>",
+            situation_type=situation_type)
+        Drill.objects.create(name="Serve",
+                             description="<p>Førsteserven</p>",
+                             situation_type=situation_type)
+
+    def test_search_strips_html_stems_and_folds_diacritics(self):
+        response = self.client.get(reverse("search"), {"q": "Forehand SLA"})
+        results = response.json()
+        self.assertEqual([row["id"] for row in results], [self.drill.id])
+        self.assertIn("<mark>forehanden</mark>", results[0]["snippet"])
+        self.assertNotIn("<strong>", results[0]["snippet"])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.drill.description = "<p>Volley ved nettet</p>"
+        self.drill.save()
+        self.assertEqual(
+            self.client.get(reverse("search"), {
+                "q": "baklinjen"
+            }).json(), [])
+        self.assertEqual(
+            len(self.client.get(reverse("search"), {
+                "q": "volley"
+            }).json()), 1)
+        self.drill.delete()
+        self.assertEqual(
+            self.client.get(reverse("search"), {
+                "q": "volley"
+            }).json(), [])
+
+    def test_rebuild_command(self):
+        SearchTerm.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("rebuild_search_index", stdout=StringIO())
+        situation_type = SituationType.objects.first()
+        Drill.objects.bulk_create([
+            Drill(name=f"Drill {i}",
+                  description="",
+                  situation_type=situation_type) for i in range(10)
+        ])
+        # Indexed per chunk, more rows cost no more queries
+        with self.assertNumQueries(len(queries)):
+            call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(
+            len(self.client.get(reverse("search"), {
+                "q": "serve",
+                "kinds": "drill"
+            }).json()), 1)
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.client.get(reverse("search")).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse("search"), {
+                "q": "x",
+                "kinds": "players"
+            }).status_code, 400)
+        for limit in ("-1", "0"):
+            self.assertEqual(
+                self.client.get(reverse("search"), {
+                    "q": "x",
+                    "limit": limit
+                }).status_code, 400)
+
+
+class TrainingPlanBulkTests(TestCase):
+
+    def setUp(self):
+        self.level = Level.objects.create(name="A", description="")
+        situation_type = SituationType.objects.create(name="Rally",
+                                                      category="Taktisk")
+        self.drills = [
+            Drill.objects.create(name=f"Drill {i}",
+                                 description="",
+                                 situation_type=situation_type,
+                                 suggested_time=5 + i) for i in range(15)
+        ]
+
+    def payload(self, drills):
+        return {"name": "Monday", "date": "2025-03-03", "drills": drills}
+
+    def test_creates_plan_with_drills_in_constant_queries(self):
+        rows = [{
+            "drill": drill.id,
+            "selected_level": self.level.id
+        } for drill in self.drills]
+        rows[0]["time_allocated"] = 30
+        # validate drills + validate levels, savepoint, insert plan, one bulk
+        # insert for all drills, release, read back plan + drills
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse("trainingplan-bulk-create"),
+                                        self.payload(rows),
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(len(data["drills"]), 15)
+        self.assertEqual(data["drills"][0]["time_allocated"], 30)
+        self.assertEqual(data["drills"][1]["time_allocated"], 6)
+        self.assertEqual(data["total_minutes"],
+                         30 + sum(d.suggested_time for d in self.drills[1:]))
+
+    def test_invalid_ids_create_nothing(self):
+        rows = [{
+            "drill": self.drills[0].id,
+            "selected_level": self.level.id
+        }, {
+            "drill": 9999,
+            "selected_level": self.level.id
+        }]
+        response = self.client.post(reverse("trainingplan-bulk-create"),
+                                    self.payload(rows),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("drill", response.json()["drills"][1])
+        self.assertFalse(TrainingPlan.objects.exists())
+
+
+class LevelPathwayTests(TestCase):
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_catalogue_rows(0)
+            create_catalogue_rows(1)
+        self.level = Level.objects.get(name="Level 0")
+
+    def get_pathway(self, level_id):
+        return self.client.get(reverse("level-pathway", args=[level_id]))
+
+    def test_pathway_is_a_single_lookup(self):
+        with self.assertNumQueries(1):
+            response = self.get_pathway(self.level.id)
+        data = response.json()
+        self.assertEqual(data["level"]["name"], "Level 0")
+        self.assertEqual(data["level"]["required_technical_level"]["name"],
+                         "TL 0")
+        self.assertEqual(len(data["tasks_by_situation_type"]), 1)
+        self.assertEqual(data["tournament_types"][0]["name"], "TT 0")
+        self.assertEqual(len(data["mental_tasks"]), 1)
+        self.assertEqual(self.get_pathway(999).status_code, 404)
+        self.assertEqual(self.get_pathway("abc").status_code, 404)
+
+    def test_document_follows_related_changes(self):
+        task = Task.objects.get(level=self.level)
+        other_level = Level.objects.get(name="Level 1")
+        task.level = other_level
+        with self.captureOnCommitCallbacks(execute=True):
+            task.save()
+        self.assertEqual(
+            self.get_pathway(self.level.id).json()["tasks_by_situation_type"],
+            [])
+        self.assertEqual(
+            len(
+                self.get_pathway(other_level.id).json()
+                ["tasks_by_situation_type"]), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TournamentType.objects.get(name="TT 0").level_set.clear()
+        self.assertEqual(
+            self.get_pathway(self.level.id).json()["tournament_types"], [])
+
+    def test_rebuild_command(self):
+        LevelPathway.objects.all().delete()
+        out = StringIO()
+        call_command("rebuild_pathways", stdout=out)
+        self.assertIn("Rebuilt 2 pathway documents", out.getvalue())
+
+
+class SyntheticBenchmarkTests(TestCase):
+
+    def generate(self):
+        call_command("generate_synthetic_catalogue",
+                     levels=2,
+                     technical_levels=2,
+                     drills=5,
+                     tasks_per_level=2,
+                     technical_tasks_per_level=3,
+                     coach_reports=4,
+                     training_plans=2,
+                     drills_per_plan=2,
+                     skip_search_index=True,
+                     stdout=StringIO())
+
+    def test_generate_twice_with_the_same_seed(self):
+        self.generate()
+        self.generate()
+        self.assertEqual(TechnicalPart.objects.count(), 6)
+        self.assertEqual(CoachReport.objects.count(), 8)
+
+    def test_generate_and_benchmark(self):
+        self.generate()
+        self.assertEqual(KeyPoint.objects.count(), 10)
+        self.assertEqual(CoachReport.objects.count(), 4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command("benchmark_api",
+                         iterations=2,
+                         output=output,
+                         stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report["endpoints"]["drill-list"]["status"], 200)
+        self.assertIn("p95_ms", report["endpoints"]["catalogue"])
+
+
+@override_settings(MIDDLEWARE=[
+    *settings.MIDDLEWARE, "core.middleware.RequestStatsMiddleware"
+])
+class RequestStatsTests(TestCase):
+
+    def setUp(self):
+        request_stats.reset()
+        create_catalogue_rows(0)
+        self.staff = get_user_model().objects.create_user("staff",
+                                                          password="x",
+                                                          is_staff=True)
+
+    def test_stats_endpoint_reports_percentiles_per_view(self):
+        for _ in range(3):
+            self.client.get(reverse("drill-list"))
+        self.client.force_login(self.staff)
+        stats = self.client.get(reverse("request-stats")).json()
+        drill_stats = stats["drill-list"]
+        self.assertEqual(drill_stats["requests"], 3)
+        self.assertEqual(drill_stats["n_plus_one_requests"], 0)
+        self.assertGreater(drill_stats["queries"]["p50"], 0)
+        self.assertGreater(drill_stats["bytes"]["p99"], 0)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(
+            self.client.get(reverse("request-stats")).status_code, 403)
+
+    def test_stats_file_is_flushed_whole_from_many_threads(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, "stats.json")
+        with override_settings(REQUEST_STATS_FILE=path,
+                               REQUEST_STATS_FLUSH_EVERY=1):
+            middleware = RequestStatsMiddleware(lambda request: None)
+        request = SimpleNamespace(
+            resolver_match=SimpleNamespace(view_name="view"), path="/")
+        response = SimpleNamespace(streaming=False, content=b"{}")
+
+        def record_many():
+            for _ in range(50):
+                middleware.record(request, response, QueryCollector(), 0.0,
+                                  0.001)
+
+        threads = [threading.Thread(target=record_many) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(middleware.recorded, 400)
+        self.assertEqual(os.listdir(directory), ["stats.json"])
+        with open(path) as stats_file:
+            self.assertEqual(json.load(stats_file)["view"]["requests"], 400)
+
+    def test_repeated_sql_templates_are_flagged(self):
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            for drill_id in range(6):
+                list(Drill.objects.filter(id=drill_id))
+            list(Level.objects.all())
+        repeated = collector.repeated_templates(5)
+        self.assertEqual(list(repeated.values()), [6])
+
+
+class AdminQueryCountTests(TestCase):
+    """ Changelists and change views run a fixed number of queries """
+
+    CHANGELISTS = [
+        "admin:core_technicalleveltasks_changelist",
+        "admin:core_drill_changelist",
+        "admin:core_trainingplan_changelist",
+        "admin:core_trainingplandrill_changelist",
+        "admin:core_keypoint_changelist",
+        "admin:core_diagnosis_changelist",
+        "admin:core_coachreport_changelist",
+        "admin:core_task_changelist",
+    ]
+
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser(
+            "admin", password="x"))
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        create_catalogue_rows(0)
+        counts = {
+            name: self.count_queries(reverse(name))
+            for name in self.CHANGELISTS
+        }
+        for suffix in range(1, 5):
+            create_catalogue_rows(suffix)
+        for name in self.CHANGELISTS:
+            with self.subTest(name=name):
+                self.assertEqual(self.count_queries(reverse(name)),
+                                 counts[name])
+
+    def test_annotated_columns(self):
+        create_catalogue_rows(0)
+        technical_task = TechnicalLevelTasks.objects.get()
+        Diagnosis.objects.create(technical_level_task=technical_task,
+                                 name="Second <b>diagnosis</b>",
+                                 diagnosis="",
+                                 measure="")
+        KeyPoint.objects.update(description="Keep the racket up")
+        plan = TrainingPlan.objects.get()
+        TrainingPlanDrill.objects.create(training_plan=plan,
+                                         drill=Drill.objects.get(),
+                                         selected_level=Level.objects.get(),
+                                         time_allocated=15)
+
+        response = self.client.get(
+            reverse("admin:core_technicalleveltasks_changelist"),
+            {"o": "4"})
+        self.assertContains(response, '<td class="field-diagnosis_count">2<')
+        response = self.client.get(reverse("admin:core_drill_changelist"))
+        self.assertContains(response, '<td class="field-key_point_count">1<')
+        response = self.client.get(reverse("admin:core_trainingplan_changelist"))
+        self.assertContains(response, '<td class="field-drill_count">2<')
+        self.assertContains(response, '<td class="field-total_minutes">25<')
+
+        response = self.client.get(
+            reverse("admin:core_technicalleveltasks_change",
+                    args=[technical_task.id]))
+        self.assertContains(response, "Second &lt;b&gt;diagnosis&lt;/b&gt;")
+
+    def test_drill_change_view_loads_level_choices_once(self):
+        create_catalogue_rows(0)
+        drill = Drill.objects.get()
+        url = reverse("admin:core_drill_change", args=[drill.id])
+        self.client.get(url)  # warms the content type cache
+        baseline = self.count_queries(url)
+        for suffix in range(1, 5):
+            Level.objects.create(name=f"Extra level {suffix}", description="")
+        self.assertEqual(self.count_queries(url), baseline)
+
+
+class StreamingImportTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        self.level = Level.objects.get()
+        Level.objects.create(name="Level 1", description="")
+
+    def write_csv(self, lines):
+        handle = tempfile.NamedTemporaryFile("w",
+                                             suffix=".csv",
+                                             delete=False,
+                                             encoding="utf-8")
+        with handle:
+            handle.write("\n".join(lines) + "\n")
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def import_tasks(self, path, **options):
+        stdout, stderr = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("import_spreadsheet",
+                         "tasks",
+                         path,
+                         stdout=stdout,
+                         stderr=stderr,
+                         **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_upserts_by_name_and_reports_row_errors(self):
+        player = Player.objects.create(name="Player",
+                                       date_of_birth=datetime.date(2012, 1, 1))
+        PlayerProgress.objects.create(player=player,
+                                      task=Task.objects.get(name="Task 0"),
+                                      is_completed=True)
+        path = self.write_csv([
+            "name,level,situation_type,description,video_url",
+            "Task 0,Level 1,ST 0,Moved to level 1,",
+            "Serve toss,Level 0,ST 0,Kast ballen høyt,https://example.com/v",
+            "Bad level,Level 9,ST 0,,",
+            "Bad url,Level 0,ST 0,,not a url",
+        ])
+        stdout, stderr = self.import_tasks(path)
+
+        self.assertIn("4 rows: 1 created, 1 updated, 2 errors", stdout)
+        self.assertIn("Row 4: Unknown level: Level 9", stderr)
+        self.assertIn("Row 5: Enter a valid URL.", stderr)
+        moved = Task.objects.get(name="Task 0")
+        self.assertEqual(moved.level.name, "Level 1")
+        self.assertEqual(moved.description, "Moved to level 1")
+        self.assertEqual(
+            list(
+                PlayerLevelProgress.objects.filter(completed__gt=0).values_list(
+                    "level__name", flat=True)), ["Level 1"])
+        created = Task.objects.get(name="Serve toss")
+        self.assertEqual(created.video_url, "https://example.com/v")
+        self.assertTrue(
+            SearchTerm.objects.filter(document__object_id=created.id,
+                                      document__kind="task",
+                                      term="kast").exists())
+        # Both the old and the new level of the moved task are rebuilt
+        old_document = LevelPathway.objects.get(level=self.level).document
+        self.assertNotIn("Task 0", json.dumps(old_document))
+        self.assertIn("Serve toss", json.dumps(old_document))
+
+    def test_queries_are_per_batch_not_per_row(self):
+
+        def count_import_queries(rows, level="Level 0"):
+            path = self.write_csv(
+                ["name,level,situation_type,description"] +
+                [f"New {i},{level},ST 0,Racket {i}" for i in rows])
+            with CaptureQueriesContext(connection) as queries:
+                self.import_tasks(path, batch_size=100)
+            return len(queries)
+
+        count_import_queries(range(1))  # creates the level's pathway row
+        self.assertEqual(count_import_queries(range(1, 11)),
+                         count_import_queries(range(11, 91)))
+        self.assertEqual(
+            SearchDocument.objects.filter(kind="task",
+                                          title__startswith="New").count(),
+            91)
+        self.assertEqual(len(search("racket", kinds=["task"], limit=100)), 91)
+
+        # Updates moving completed tasks to another level
+        player = Player.objects.create(name="Player",
+                                       date_of_birth=datetime.date(2012, 1, 1))
+        for task in Task.objects.filter(name__startswith="New "):
+            PlayerProgress.objects.create(player=player,
+                                          task=task,
+                                          is_completed=True)
+        count_import_queries(range(1), "Level 1")
+        self.assertEqual(count_import_queries(range(1, 11), "Level 1"),
+                         count_import_queries(range(11, 91), "Level 1"))
+        self.assertEqual(
+            PlayerLevelProgress.objects.get(player=player,
+                                            level__name="Level 1").completed,
+            91)
+
+    def test_missing_required_column(self):
+        path = self.write_csv(["name,description", "Task,Text"])
+        with self.assertRaisesMessage(CommandError,
+                                      "Missing columns: level, situation_type"):
+            self.import_tasks(path)
+
+    def test_admin_streaming_import(self):
+        self.client.force_login(get_user_model().objects.create_superuser(
+            "admin", password="x"))
+        upload = SimpleUploadedFile(
+            "technical.csv", b"name,technical_level,category,description\n"
+            b"Kick serve,TL 0,Serve,Spinn\n")
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("admin:core_technicalleveltasks_streaming_import"),
+                {"file": upload},
+                follow=True)
+        self.assertContains(response, "1 created, 0 updated, 0 errors")
+        self.assertEqual(
+            TechnicalLevelTasks.objects.get(name="Kick serve").category,
+            "Serve")
+
+
+class StreamingExportTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        report = CoachReport.objects.first()
+        report.tasks.add(*TechnicalLevelTasks.objects.all())
+        KeyPoint.objects.update(description="Hold, racketen oppe")
+        self.client.force_login(get_user_model().objects.create_user(
+            "staff", password="x", is_staff=True))
+
+    def export(self, source, file_format, **params):
+        response = self.client.get(
+            reverse("export", args=[source, file_format]), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_coach_reports_csv(self):
+        rows = list(
+            csv.DictReader(
+                io.StringIO(
+                    self.export("coach-reports",
+                                "csv").decode("utf-8-sig"))))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["tasks"], "TLT 0; TLT 1")
+        self.assertEqual(rows[0]["diagnoses"], "Diagnosis 0")
+        self.assertEqual(rows[1]["technical_level"], "TL 1")
+
+    def test_key_points_ndjson(self):
+        lines = self.export("key-points", "ndjson").decode().splitlines()
+        # Two drills times two levels
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(json.loads(lines[0])["key_point"],
+                         "Hold, racketen oppe")
+
+    def test_prefetches_once_per_chunk(self):
+        for suffix in range(2, 6):
+            create_catalogue_rows(suffix)
+        with CaptureQueriesContext(connection) as queries:
+            self.export("coach-reports", "ndjson")
+        # session, user, reports, tasks, diagnoses
+        self.assertEqual(len(queries), 5)
+
+    def test_date_filters(self):
+        CoachReport.objects.filter(pk=CoachReport.objects.first().pk).update(
+            created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+        body = self.export("coach-reports", "ndjson", since="2025-01-01")
+        self.assertEqual(len(body.splitlines()), 1)
+        response = self.client.get(
+            reverse("export", args=["coach-reports", "csv"]),
+            {"since": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+
+    def test_unknown_source_and_staff_only(self):
+        self.assertEqual(
+            self.client.get(reverse("export", args=["players",
+                                                    "csv"])).status_code, 404)
+        self.client.logout()
+        self.assertEqual(
+            self.client.get(reverse("export",
+                                    args=["coach-reports",
+                                          "csv"])).status_code, 403)
+
+    def test_xlsx(self):
+        url = reverse("export", args=["key-points", "xlsx"])
+        if exporter.openpyxl is None:
+            self.assertEqual(self.client.get(url).status_code, 400)
+        else:
+            self.assertTrue(self.export("key-points", "xlsx").startswith(b"PK"))
+
+
+class CoachReportRollupTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        self.report = CoachReport.objects.first()
+        self.technical_tasks = list(TechnicalLevelTasks.objects.order_by("pk"))
+        self.diagnoses = list(Diagnosis.objects.order_by("pk"))
+
+    def rollup_counts(self):
+        return {
+            (row.technical_level.name, row.task.name): row.count
+            for row in CoachReportTaskDaily.objects.filter(count__gt=0)
+        }, {
+            (row.technical_level.name, row.diagnosis.name): row.count
+            for row in CoachReportDiagnosisDaily.objects.filter(count__gt=0)
+        }
+
+    def test_rollups_follow_m2m_changes(self):
+        tasks, diagnoses = self.rollup_counts()
+        self.assertEqual(tasks, {("TL 0", "TLT 0"): 1, ("TL 1", "TLT 1"): 1})
+        self.assertEqual(diagnoses[("TL 0", "Diagnosis 0")], 1)
+
+        self.report.tasks.add(self.technical_tasks[1])
+        self.technical_tasks[1].coachreport_set.add(
+            CoachReport.objects.last())  # already linked, not counted twice
+        self.report.diagnoses.remove(self.diagnoses[0])
+        tasks, diagnoses = self.rollup_counts()
+        self.assertEqual(tasks[("TL 0", "TLT 1")], 1)
+        self.assertEqual(tasks[("TL 1", "TLT 1")], 1)
+        self.assertNotIn(("TL 0", "Diagnosis 0"), diagnoses)
+
+        self.report.tasks.clear()
+        self.report.technical_level = TechnicalLevel.objects.get(name="TL 1")
+        self.report.save()
+        self.report.tasks.add(self.technical_tasks[0])
+        self.assertEqual(self.rollup_counts()[0], {
+            ("TL 1", "TLT 0"): 1,
+            ("TL 1", "TLT 1"): 1
+        })
+
+        CoachReport.objects.last().delete()
+        self.assertEqual(self.rollup_counts()[0], {("TL 1", "TLT 0"): 1})
+
+    def test_backfill_matches_incremental_counts(self):
+        self.report.tasks.add(self.technical_tasks[1])
+        expected = self.rollup_counts()
+        CoachReportTaskDaily.objects.all().delete()
+        CoachReportDiagnosisDaily.objects.all().delete()
+        call_command("backfill_coach_report_rollups", stdout=StringIO())
+        self.assertEqual(self.rollup_counts(), expected)
+
+    def test_analytics_endpoint(self):
+        CoachReport.objects.create(
+            coach_name="Coach",
+            player_name="Other",
+            technical_level=self.report.technical_level).diagnoses.add(
+                self.diagnoses[0])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("coach-report-analytics"))
+        results = response.json()["results"]
+        self.assertEqual(results[0]["technical_level"]["name"], "TL 0")
+        self.assertEqual(results[0]["items"], [{
+            "id": self.diagnoses[0].id,
+            "name": "Diagnosis 0",
+            "count": 2
+        }])
+
+        response = self.client.get(reverse("coach-report-analytics"), {
+            "dimension": "tasks",
+            "until": "2000-01-01"
+        })
+        self.assertEqual(response.json()["results"], [])
+        response = self.client.get(reverse("coach-report-analytics"),
+                                   {"since": "last week"})
+        self.assertEqual(response.status_code, 400)
+        for limit in ("-1", "0"):
+            response = self.client.get(reverse("coach-report-analytics"),
+                                       {"limit": limit})
+            self.assertEqual(response.status_code, 400)
+
+
+class AsyncReadEndpointTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        KeyPoint.objects.update(description="Ok")
+
+    async def assert_same_json(self, async_url, sync_url):
+        response = await self.async_client.get(async_url)
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(self.client.get)(sync_url)
+        self.assertEqual(response.json(), expected.json())
+
+    async def test_matches_sync_routes(self):
+        level = await Level.objects.afirst()
+        drill = await Drill.objects.afirst()
+        await self.assert_same_json(
+            reverse("async-technical-level-tasks", args=["TL 0"]),
+            reverse("get-technical-level-tasks", args=["TL 0"]))
+        await self.assert_same_json(reverse("async-chart-data",
+                                            args=[level.id]),
+                                    reverse("chart-data", args=[level.id]))
+        await self.assert_same_json(reverse("async-drills"),
+                                    reverse("drill-list"))
+        await self.assert_same_json(
+            reverse("async-keypoints") + f"?drill={drill.id}",
+            reverse("keypoint-list") + f"?drill={drill.id}")
+
+    async def test_diagnoses_and_errors(self):
+        task = await TechnicalLevelTasks.objects.afirst()
+        response = await self.async_client.get(
+            reverse("async-diagnoses"), {"technical_level_task": task.id})
+        self.assertEqual([row["name"] for row in response.json()],
+                         ["Diagnosis 0"])
+        response = await self.async_client.get(reverse("async-keypoints"),
+                                               {"level": "x"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(reverse("async-diagnoses"),
+                                               {"technical_level_task": "x"})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(
+            reverse("async-chart-data", args=[999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class AsyncBenchmarkTests(TransactionTestCase):
+    """ The benchmark serves requests from other threads, which only see committed rows """
+
+    def test_benchmark_async(self):
+        create_catalogue_rows(0)
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command("benchmark_async",
+                         requests=4,
+                         concurrency=2,
+                         workers=2,
+                         output=output,
+                         stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report["routes"]["drills"]["sync"]["statuses"], [200])
+        self.assertEqual(report["routes"]["drills"]["async"]["statuses"],
+                         [200])
+
+
+class KeyPointBatchTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        self.drills = list(Drill.objects.order_by("pk"))
+        self.levels = list(Level.objects.order_by("pk"))
+        KeyPoint.objects.exclude(drill=self.drills[1],
+                                 level=self.levels[0]).update(
+                                     description="Keep the racket up")
+        self.url = reverse("keypoint-batch")
+
+    def post(self, body):
+        return self.client.post(self.url, body, content_type="application/json")
+
+    def test_pairs_in_one_query(self):
+        pairs = [{
+            "drill_id": drill.id,
+            "level_id": level.id
+        } for drill in self.drills for level in self.levels]
+        with self.assertNumQueries(3):
+            response = self.post({"pairs": pairs + pairs[:1]})
+        results = response.json()
+        self.assertEqual(len(results), 4)
+        self.assertEqual(
+            [len(result["key_points"]) for result in results], [1, 1, 0, 1])
+        self.assertEqual(results[0]["key_points"][0]["level_name"], "Level 0")
+
+    def test_training_plan(self):
+        plan = TrainingPlan.objects.first()
+        TrainingPlanDrill.objects.create(training_plan=plan,
+                                         drill=self.drills[1],
+                                         selected_level=self.levels[1],
+                                         time_allocated=5)
+        response = self.post({"training_plan": plan.id})
+        self.assertEqual([(result["drill_id"], result["level_id"])
+                          for result in response.json()],
+                         [(self.drills[0].id, self.levels[0].id),
+                          (self.drills[1].id, self.levels[1].id)])
+
+    def test_bad_input(self):
+        for body in [{}, {
+                "pairs": [],
+        }, {
+                "pairs": [{
+                    "drill_id": "x",
+                    "level_id": 1
+                }]
+        }, {
+                "pairs": [{
+                    "drill_id": self.drills[0].id,
+                    "level_id": 999
+                }]
+        }, {
+                "pairs": [{
+                    "drill_id": 1,
+                    "level_id": 1
+                }] * 1001
+        }, {
+                "training_plan": 999
+        }]:
+            with self.subTest(body=str(body)[:60]):
+                self.assertEqual(self.post(body).status_code, 400)
+
+        response = self.post({
+            "pairs": [{
+                "drill_id": self.drills[0].id,
+                "level_id": 999
+            }]
+        })
+        self.assertEqual(response.json()["pairs"][0]["level_id"],
+                         ['Invalid pk "999" - object does not exist.'])
+
+    def test_filter_by_drills_and_level_validates_ids(self):
+        url = reverse("keypoint-filter-by-drills-and-level")
+        response = self.client.get(url, {"level": "1", "drills": "1,x"})
+        self.assertEqual(response.status_code, 400)
+
+
+class RichTextRenderTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        self.drill = Drill.objects.get()
+        self.drill.description = (
+            '<p onclick="steal()">Split <b>step</b><script>alert(1)</script>'
+            ' <a href="javascript:alert(1)">early</a></p>' + "<p>x</p>" * 150)
+        self.drill.save()
+
+    def test_sanitize_html(self):
+        self.assertEqual(
+            sanitize_html('<p style="color:red">A &amp; <em>b</em>'
+                          '<iframe src="https://x"><p>gone</p></iframe>'
+                          '<img src="JaVa\tScript:x" alt="pic">'
+                          '<a href="https://example.com" target="_blank">c'),
+            '<p>A &amp; <em>b</em><img alt="pic">'
+            '<a href="https://example.com" target="_blank" '
+            'rel="noopener noreferrer">c</a></p>')
+        self.assertEqual(sanitize_html(None), "")
+
+    def test_save_renders_companion_columns(self):
+        drill = Drill.objects.get()
+        self.assertTrue(
+            drill.description_html.startswith(
+                "<p>Split <b>step</b> <a>early</a></p>"))
+        self.assertTrue(
+            drill.description_excerpt.startswith("Split step early x x"))
+        self.assertLessEqual(len(drill.description_excerpt), 200)
+        self.assertTrue(drill.description_excerpt.endswith("…"))
+
+    def test_default_payload_is_unchanged(self):
+        row = self.client.get(reverse("drill-list")).json()[0]
+        self.assertEqual(row["description"], self.drill.description)
+        self.assertNotIn("description_html", row)
+        row = self.client.get(reverse("task-list")).json()[0]
+        self.assertNotIn("picture_desc_excerpt", row)
+
+    def test_render_param_serves_rendered_columns(self):
+        with CaptureQueriesContext(connection) as context:
+            row = self.client.get(reverse("drill-list"), {
+                "render": "excerpt"
+            }).json()[0]
+        self.assertEqual(row["description"], self.drill.description_excerpt)
+        select = [
+            q["sql"] for q in context.captured_queries
+            if 'FROM "core_drill"' in q["sql"]
+        ][0]
+        self.assertNotIn('"core_drill"."description",', select)
+        self.assertNotIn('"core_drill"."description_html"', select)
+
+        row = self.client.get(reverse("diagnosis-list"), {
+            "render": "safe"
+        }).json()[0]
+        diagnosis = Diagnosis.objects.get()
+        self.assertEqual(row["measure"], diagnosis.measure_html)
+
+
+class PlayerProgressDeleteTests(TransactionTestCase):
+    """ Cascades delete the counters before the progress rows """
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        self.level = Level.objects.get()
+        self.player = Player.objects.create(
+            name="Player", date_of_birth=datetime.date(2012, 1, 1))
+        self.progress = PlayerProgress.objects.create(player=self.player,
+                                                      task=Task.objects.get(),
+                                                      is_completed=True)
+
+    def test_deleting_progress_uncounts_it(self):
+        self.progress.delete()
+        self.assertEqual(
+            PlayerLevelProgress.objects.get(player=self.player).completed, 0)
+
+    def test_deleting_a_player_with_progress(self):
+        self.player.delete()
+        self.assertFalse(PlayerLevelProgress.objects.exists())
+        self.assertFalse(PlayerProgress.objects.exists())
+
+    def test_deleting_a_level_with_progress(self):
+        self.level.delete()
+        self.assertFalse(PlayerLevelProgress.objects.exists())
+        self.assertTrue(Player.objects.filter(pk=self.player.pk).exists())
+
+
+class PlayerProgressTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        self.level = Level.objects.get()
+        self.situation_type = SituationType.objects.get()
+        self.other_type = SituationType.objects.create(name="Other",
+                                                       category="Fysisk")
+        self.tasks = [Task.objects.get()] + [
+            Task.objects.create(name=f"Task {i}",
+                                description="",
+                                level=self.level,
+                                situation_type=self.other_type)
+            for i in range(3)
+        ]
+        self.players = [
+            Player.objects.create(name=f"Player {i}",
+                                  date_of_birth=datetime.date(2012, 1, 1))
+            for i in range(3)
+        ]
+        self.url = reverse("playerprogress-batch")
+
+    def counters(self):
+        return dict(
+            ((player_id, situation_type_id), completed)
+            for player_id, situation_type_id, completed in
+            PlayerLevelProgress.objects.filter(completed__gt=0).values_list(
+                "player_id", "situation_type_id", "completed"))
+
+    def post(self, entries):
+        return self.client.post(self.url, {"entries": entries},
+                                content_type="application/json")
+
+    def test_batch_updates_rows_and_counters(self):
+        entries = [{
+            "player": player.id,
+            "task": task.id
+        } for player in self.players[:2] for task in self.tasks]
+        # Counters move with one UPDATE per situation type, not per entry
+        with self.assertNumQueries(12):
+            response = self.post(entries)
+        self.assertEqual(response.json(), {
+            "completed": 8,
+            "reopened": 0,
+            "unchanged": 0
+        })
+        self.assertEqual(
+            PlayerProgress.objects.filter(
+                is_completed=True, completion_date__isnull=False).count(), 8)
+
+        response = self.post([{
+            "player": self.players[0].id,
+            "task": self.tasks[1].id,
+            "is_completed": False
+        }, {
+            "player": self.players[0].id,
+            "task": self.tasks[2].id
+        }, {
+            "player": self.players[2].id,
+            "task": self.tasks[3].id,
+            "is_completed": False
+        }])
+        self.assertEqual(response.json(), {
+            "completed": 0,
+            "reopened": 1,
+            "unchanged": 2
+        })
+        self.assertEqual(
+            self.counters(), {
+                (self.players[0].id, self.situation_type.id): 1,
+                (self.players[0].id, self.other_type.id): 2,
+                (self.players[1].id, self.situation_type.id): 1,
+                (self.players[1].id, self.other_type.id): 3,
+            })
+
+    def test_batch_validates_entries(self):
+        response = self.post([{"player": self.players[0].id, "task": 999}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["entries"][0]["task"],
+                         ['Invalid pk "999" - object does not exist.'])
+        self.assertFalse(PlayerProgress.objects.exists())
+
+    def test_single_saves_and_task_moves_keep_counters(self):
+        player = self.players[0]
+        progress = PlayerProgress.objects.create(player=player,
+                                                 task=self.tasks[0],
+                                                 is_completed=True)
+        PlayerProgress.objects.create(player=player,
+                                      task=self.tasks[1],
+                                      is_completed=True)
+        progress.save()
+        self.assertEqual(self.counters(), {
+            (player.id, self.situation_type.id): 1,
+            (player.id, self.other_type.id): 1
+        })
+
+        self.tasks[1].situation_type = self.situation_type
+        self.tasks[1].save()
+        self.assertEqual(self.counters(),
+                         {(player.id, self.situation_type.id): 2})
+
+        progress.is_completed = False
+        progress.save()
+        self.tasks[1].delete()
+        self.assertEqual(self.counters(), {})
+        self.assertEqual(call_command("rebuild_progress_counters", "--check",
+                                      stdout=StringIO()), None)
+
+    def test_read_endpoints(self):
+        self.post([{
+            "player": self.players[0].id,
+            "task": task.id
+        } for task in self.tasks[:3]])
+        document = self.client.get(
+            reverse("player-progress", args=[self.players[0].id])).json()
+        level = document["levels"][0]
+        self.assertEqual((level["completed"], level["total"], level["percent"]),
+                         (3, 4, 75.0))
+
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("playerprogress-completion"), {
+                    "level": self.level.id,
+                    "players": f"{self.players[0].id},{self.players[1].id}"
+                })
+        rows = response.json()
+        self.assertEqual([(row["player"]["name"], row["completed"])
+                          for row in rows], [("Player 0", 3),
+                                             ("Player 1", 0)])
+        self.assertEqual(
+            self.client.get(reverse("playerprogress-completion"), {
+                "level": "x"
+            }).status_code, 400)
+
+    def test_rebuild_command_fixes_counters(self):
+        self.post([{"player": self.players[0].id, "task": self.tasks[0].id}])
+        PlayerLevelProgress.objects.update(completed=5)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_progress_counters",
+                         "--check",
+                         stdout=StringIO())
+        call_command("rebuild_progress_counters", stdout=StringIO())
+        self.assertEqual(self.counters(),
+                         {(self.players[0].id, self.situation_type.id): 1})
+
+
+class SquadProgressTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        self.level = Level.objects.get()
+        self.tasks = [Task.objects.get()] + [
+            Task.objects.create(name=f"Task {i}",
+                                description="",
+                                level=self.level,
+                                situation_type=SituationType.objects.get())
+            for i in range(1, 4)
+        ]
+        self.url = reverse("squad-progress")
+
+    def create_players(self, count):
+        technical_level = TechnicalLevel.objects.get()
+        players = [
+            Player.objects.create(name=f"Player {i:03}",
+                                  date_of_birth=datetime.date(2012, 1, 1),
+                                  current_level=self.level,
+                                  current_technical_level=technical_level)
+            for i in range(count)
+        ]
+        set_progress([(player.id, task.id, True) for player in players
+                      for task in self.tasks[:2]], {
+                          task.id: (self.level.id, task.situation_type_id)
+                          for task in self.tasks
+                      })
+        return players
+
+    def test_query_count_does_not_grow_with_players(self):
+        players = self.create_players(20)
+        for count in (2, 20):
+            ids = ",".join(str(player.id) for player in players[:count])
+            with self.subTest(count=count), self.assertNumQueries(5):
+                response = self.client.get(self.url, {"players": ids})
+            self.assertEqual(len(response.json()), count)
+
+        row = response.json()[0]
+        self.assertEqual(row["current_level"]["name"], "Level 0")
+        self.assertEqual(row["current_technical_level"]["name"], "TL 0")
+        self.assertEqual((row["completed"], row["total"], row["percent"]),
+                         (2, 4, 50.0))
+        self.assertEqual([task["name"] for task in row["next_tasks"]],
+                         ["Task 2", "Task 3"])
+
+    def test_level_filter_and_parameters(self):
+        self.create_players(3)
+        Player.objects.create(name="Elsewhere",
+                              date_of_birth=datetime.date(2012, 1, 1))
+        rows = self.client.get(self.url, {
+            "level": self.level.id,
+            "next": 1
+        }).json()
+        self.assertEqual([len(row["next_tasks"]) for row in rows], [1, 1, 1])
+        for params in ({}, {"players": "1,x"}, {"level": 1, "next": 99}):
+            with self.subTest(params=params):
+                self.assertEqual(
+                    self.client.get(self.url, params).status_code, 400)
+
+    def test_benchmark_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "report.json")
+            call_command("benchmark_squad_progress",
+                         sizes="2,5",
+                         tasks_per_level=3,
+                         iterations=1,
+                         output=output,
+                         stdout=StringIO())
+            with open(output) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(report["sizes"]["2"]["queries"],
+                         report["sizes"]["5"]["queries"])
+        self.assertFalse(Player.objects.exists())
+
+
+class PromotionTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        self.levels = list(Level.objects.order_by("pk"))
+        Level.objects.filter(pk=self.levels[1].pk).update(order_number=1)
+        self.technical_levels = list(TechnicalLevel.objects.order_by("pk"))
+        TechnicalLevel.objects.filter(pk=self.technical_levels[1].pk).update(
+            order_number=1)
+        self.task = Task.objects.get(level=self.levels[0])
+        self.players = [
+            Player.objects.create(
+                name=f"Player {i}",
+                date_of_birth=datetime.date(2012, 1, 1),
+                current_level=self.levels[0],
+                current_technical_level=self.technical_levels[i])
+            for i in range(2)
+        ]
+
+    def complete(self, player, is_completed=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("playerprogress-batch"), {
+                "entries": [{
+                    "player": player.id,
+                    "task": self.task.id,
+                    "is_completed": is_completed
+                }]
+            },
+                             content_type="application/json")
+
+    def test_completing_a_level_proposes_the_next_one(self):
+        # Level 1 requires TL 1, which only the second player has
+        for player in self.players:
+            self.complete(player)
+        promotion = PendingPromotion.objects.get()
+        self.assertEqual(
+            (promotion.player, promotion.from_level, promotion.to_level,
+             promotion.completed, promotion.total),
+            (self.players[1], self.levels[0], self.levels[1], 1, 1))
+
+        self.complete(self.players[1], is_completed=False)
+        self.assertFalse(PendingPromotion.objects.exists())
+
+    def test_approve_and_reject(self):
+        self.complete(self.players[1])
+        promotion = PendingPromotion.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("pendingpromotion-approve", args=[promotion.id]))
+        self.assertEqual(response.json()["status"], "approved")
+        self.players[1].refresh_from_db()
+        self.assertEqual(self.players[1].current_level, self.levels[1])
+        self.assertEqual(
+            self.client.post(
+                reverse("pendingpromotion-approve",
+                        args=[promotion.id])).status_code, 400)
+
+        Player.objects.filter(pk=self.players[1].pk).update(
+            current_level=self.levels[0])
+        evaluate_promotions()
+        promotion = PendingPromotion.objects.get(status="pending")
+        self.client.post(reverse("pendingpromotion-reject",
+                                 args=[promotion.id]))
+        self.assertEqual(evaluate_promotions(), {
+            "created": 0,
+            "updated": 0,
+            "removed": 0
+        })
+        self.assertEqual(
+            self.client.get(reverse("pendingpromotion-list")).json(), [])
+
+    def test_stale_promotion_is_not_approved(self):
+        self.complete(self.players[1])
+        promotion = PendingPromotion.objects.get()
+        self.assertEqual(
+            self.client.post(
+                reverse("pendingpromotion-approve",
+                        args=["abc"])).status_code, 404)
+
+        # Moved by hand since the evaluation
+        Player.objects.filter(pk=self.players[1].pk).update(
+            current_level=self.levels[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("pendingpromotion-approve", args=[promotion.id]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(
+            PendingPromotion.objects.filter(status="approved").exists())
+        # The re-evaluation withdrew it
+        self.assertFalse(PendingPromotion.objects.exists())
+
+    def test_evaluation_is_set_based(self):
+        players = [
+            Player.objects.create(
+                name=f"Bulk {i}",
+                date_of_birth=datetime.date(2012, 1, 1),
+                current_level=self.levels[0],
+                current_technical_level=self.technical_levels[1])
+            for i in range(20)
+        ]
+        set_progress(
+            [(player.id, self.task.id, True) for player in players], {
+                self.task.id: (self.levels[0].id, self.task.situation_type_id)
+            })
+        with self.assertNumQueries(7):
+            result = evaluate_promotions()
+        self.assertEqual(result["created"], 20)
+        out = StringIO()
+        call_command("evaluate_promotions", stdout=out)
+        self.assertIn("0 promotions proposed", out.getvalue())
+
+
+class TrainingPlanSummaryTests(TestCase):
+
+    def setUp(self):
+        create_catalogue_rows(0)
+        create_catalogue_rows(1)
+        self.plans = list(TrainingPlan.objects.order_by("pk"))
+        drills = list(Drill.objects.order_by("pk"))
+        levels = list(Level.objects.order_by("pk"))
+        Drill.objects.filter(pk=drills[1].pk).update(category="Live")
+        Level.objects.filter(pk=levels[0].pk).update(order_number=5)
+        TrainingPlanDrill.objects.filter(training_plan=self.plans[0]).delete()
+        for drill, level, minutes in ((drills[0], levels[0], 10),
+                                      (drills[0], levels[1], 5),
+                                      (drills[1], levels[1], 20)):
+            TrainingPlanDrill.objects.create(training_plan=self.plans[0],
+                                             drill=drill,
+                                             selected_level=level,
+                                             time_allocated=minutes)
+
+    def test_summary(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("trainingplan-summary", args=[self.plans[0].id]))
+        summary = response.json()
+        self.assertEqual((summary["total_minutes"], summary["drill_count"]),
+                         (35, 3))
+        self.assertEqual([(row["category"], row["minutes"])
+                          for row in summary["by_category"]],
+                         [("Feeding", 15), ("Semi-Live", 0), ("Live", 20)])
+        self.assertEqual([(row["name"], row["minutes"])
+                          for row in summary["by_situation_type"]],
+                         [("ST 0", 15), ("ST 1", 20)])
+        self.assertEqual([(row["name"], row["minutes"], row["drills"])
+                          for row in summary["by_level"]],
+                         [("Level 1", 25, 2), ("Level 0", 10, 1)])
+        self.assertEqual(
+            self.client.get(reverse("trainingplan-summary",
+                                    args=["x"])).status_code, 404)
+
+    def test_summaries_for_a_date_range(self):
+        TrainingPlan.objects.filter(pk=self.plans[1].pk).update(
+            date=datetime.date(2020, 1, 1))
+        url = reverse("trainingplan-summaries")
+        with self.assertNumQueries(2):
+            rows = self.client.get(url, {
+                "since": "2019-12-01",
+                "until": "2020-02-28"
+            }).json()
+        self.assertEqual([row["id"] for row in rows], [self.plans[1].id])
+        self.assertEqual(
+            self.client.get(url, {
+                "since": "2019-01-01",
+                "until": "2021-01-01"
+            }).status_code, 400)
+
+
+
+class TrainingPlanGeneratorTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.level = Level.objects.create(name="Level", description="")
+        self.other_level = Level.objects.create(name="Other", description="")
+        self.rally, self.serve = SituationType.objects.bulk_create([
+            SituationType(name="Rally", category="Taktisk"),
+            SituationType(name="Serve", category="Taktisk")
+        ])
+        self.drills = {
+            name: Drill.objects.create(name=name,
+                                       description="",
+                                       situation_type=situation_type,
+                                       suggested_time=minutes,
+                                       category=category)
+            for name, category, situation_type, minutes in (
+                ("A", "Feeding", self.rally, 10),
+                ("B", "Feeding", self.serve, 10),
+                ("C", "Feeding", self.rally, 20),
+                ("D", "Live", self.rally, 15),
+                ("E", "Live", self.serve, 5),
+            )
+        }
+        key_point = KeyPoint.objects.get(drill=self.drills["A"],
+                                         level=self.level)
+        key_point.description = "Racket up"
+        key_point.save()
+        self.url = reverse("trainingplan-generate")
+
+    def generate(self, **data):
+        return self.client.post(self.url, data, content_type="application/json")
+
+    def names(self, plan):
+        return [row["drill_name"] for row in plan["drills"]]
+
+    def test_packs_the_mix_and_prefers_key_points(self):
+        data = {
+            "level": self.level.id,
+            "duration": 30,
+            "category_mix": {
+                "Feeding": 2,
+                "Live": 1
+            }
+        }
+        self.generate(**data)
+        # The warm index leaves only the key point texts to query
+        with self.assertNumQueries(1):
+            plan = self.generate(**data).json()
+        self.assertEqual(self.names(plan), ["A", "B", "E"])
+        self.assertEqual(plan["total_minutes"], 25)
+        self.assertEqual(plan["by_category"], {"Feeding": 20, "Live": 5})
+        self.assertEqual(plan["drills"][0]["key_points"], ["Racket up"])
+        self.assertEqual(plan["drills"][1]["key_points"], [])
+
+        # Catalogue edits rebuild the index
+        with self.captureOnCommitCallbacks(execute=True):
+            Drill.objects.create(name="F",
+                                 description="",
+                                 situation_type=self.rally,
+                                 suggested_time=10,
+                                 category="Live")
+        plan = self.generate(**data).json()
+        self.assertEqual(self.names(plan), ["A", "B", "F"])
+
+    def test_required_drills_and_situation_type_mix(self):
+        plan = self.generate(level=self.other_level.id,
+                             duration=10,
+                             situation_type_mix={
+                                 str(self.serve.id): 1
+                             }).json()
+        self.assertEqual(self.names(plan), ["B"])
+
+        plan = self.generate(level=self.other_level.id,
+                             duration=25,
+                             required_drills=[self.drills["D"].id]).json()
+        self.assertEqual(self.names(plan), ["A", "D"])
+        self.assertEqual(plan["total_minutes"], 25)
+
+    def test_situation_type_mix_splits_the_minutes(self):
+        plan = self.generate(level=self.other_level.id,
+                             duration=30,
+                             situation_type_mix={
+                                 str(self.rally.id): 2,
+                                 str(self.serve.id): 1
+                             }).json()
+        self.assertEqual(plan["by_situation_type"], {
+            str(self.rally.id): 20,
+            str(self.serve.id): 10
+        })
+
+        # More drills of the favoured type than there are candidates
+        Drill.objects.bulk_create([
+            Drill(name=f"Rally {i}",
+                  description="",
+                  situation_type=self.rally,
+                  suggested_time=10) for i in range(70)
+        ] + [
+            Drill(name=f"Serve {i}",
+                  description="",
+                  situation_type=self.serve,
+                  suggested_time=10) for i in range(10)
+        ])
+        cache.clear()
+        plan = self.generate(level=self.other_level.id,
+                             duration=120,
+                             category_mix={
+                                 "Feeding": 1
+                             },
+                             situation_type_mix={
+                                 str(self.rally.id): 2,
+                                 str(self.serve.id): 1
+                             }).json()
+        self.assertEqual(plan["by_situation_type"], {
+            str(self.rally.id): 80,
+            str(self.serve.id): 40
+        })
+
+    def test_saves_the_plan(self):
+        response = self.generate(level=self.level.id,
+                                 duration=20,
+                                 name="Generated",
+                                 date="2025-03-01")
+        self.assertEqual(response.status_code, 201)
+        plan = TrainingPlan.objects.get(pk=response.json()["training_plan"])
+        self.assertEqual(plan.name, "Generated")
+        self.assertEqual(
+            sorted(
+                plan.plan_drills.values_list("drill__name", "selected_level",
+                                             "time_allocated")),
+            [("A", self.level.id, 10), ("B", self.level.id, 10)])
+
+    def test_validation(self):
+        response = self.generate(level=0,
+                                 duration=30,
+                                 category_mix={"Warmup": 1},
+                                 situation_type_mix={"x": 1},
+                                 required_drills=[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.json()), {"category_mix"})
+
+        response = self.generate(level=0,
+                                 duration=30,
+                                 situation_type_mix={"x": 1},
+                                 required_drills=[0],
+                                 name="No date")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            set(response.json()),
+            {"level", "situation_type_mix", "required_drills", "date"})
+
+        response = self.generate(level=self.level.id,
+                                 duration=10,
+                                 required_drills=[self.drills["C"].id])
+        self.assertEqual(response.json(), {
+            "required_drills":
+            ["The required drills take longer than the duration."]
+        })
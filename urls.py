@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import LevelViewSet, TaskViewSet, get_technical_level_tasks, TechnicalLevelViewSet, SituationTypeViewSet, TournamentTypeViewSet, chart_data, CoachReportViewSet, TechnicalPartViewSet, DiagnosisViewSet, DrillViewSet, TrainingPlanViewSet, TrainingPlanDrillViewSet, MentalTaskViewSet, PhysicalTaskViewSet, KeyPointViewSet
+from . import async_views
+from .views import LevelViewSet, TaskViewSet, get_technical_level_tasks, TechnicalLevelViewSet, SituationTypeViewSet, TournamentTypeViewSet, chart_data, CoachReportViewSet, TechnicalPartViewSet, DiagnosisViewSet, DrillViewSet, TrainingPlanViewSet, TrainingPlanDrillViewSet, MentalTaskViewSet, PhysicalTaskViewSet, KeyPointViewSet, catalogue_snapshot, chart_data_batch, search_catalogue, request_stats_view, export_data, coach_report_analytics, PlayerViewSet, PlayerProgressViewSet, squad_progress, PendingPromotionViewSet
 
 # Router for ModelViewSets
 router = DefaultRouter()
@@ -18,6 +19,9 @@ router.register(r"training_plan_drills", TrainingPlanDrillViewSet)
 router.register(r"mental_tasks", MentalTaskViewSet)
 router.register(r"physical_tasks", PhysicalTaskViewSet)
 router.register(r"keypoints", KeyPointViewSet)
+router.register(r"players", PlayerViewSet)
+router.register(r"player_progress", PlayerProgressViewSet)
+router.register(r"promotions", PendingPromotionViewSet)
 
 urlpatterns = [
     path('api/',
@@ -25,7 +29,32 @@ urlpatterns = [
     path('api/technical-level-tasks/<str:technical_level_name>/',
          get_technical_level_tasks,
          name='get-technical-level-tasks'),
+    path("api/chart-data/", chart_data_batch, name="chart-data-batch"),
     path("api/chart-data/<int:level_id>/", chart_data, name="chart-data"),
     path("api/drill-counts/",
          DrillViewSet.as_view({"get": "count_by_situation_type"})),
+    path("api/catalogue/", catalogue_snapshot, name="catalogue"),
+    path("api/search/", search_catalogue, name="search"),
+    path("api/squads/progress/", squad_progress, name="squad-progress"),
+    path("api/analytics/coach-reports/",
+         coach_report_analytics,
+         name="coach-report-analytics"),
+    # ✅ Async read-only twins of the hot routes, served well under ASGI
+    path("api/async/diagnoses/",
+         async_views.get_diagnoses,
+         name="async-diagnoses"),
+    path("api/async/chart-data/<int:level_id>/",
+         async_views.chart_data,
+         name="async-chart-data"),
+    path("api/async/technical-level-tasks/<str:technical_level_name>/",
+         async_views.get_technical_level_tasks,
+         name="async-technical-level-tasks"),
+    path("api/async/drills/", async_views.drill_list, name="async-drills"),
+    path("api/async/keypoints/",
+         async_views.key_point_list,
+         name="async-keypoints"),
+    path("api/_stats/", request_stats_view, name="request-stats"),
+    path("api/export/<slug:source>.<slug:file_format>",
+         export_data,
+         name="export"),
 ]
@@ -1,12 +1,33 @@
-from django.http import JsonResponse
-from django.db.models import Count, Q
-from django.shortcuts import get_object_or_404
+import datetime
+import hashlib
+
+from django.http import Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
 from rest_framework import viewsets
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
-from .models import Level, Task, TechnicalLevelTasks, TechnicalLevel, SituationType, Diagnosis, CoachReport, TechnicalPart, TrainingPlan, TrainingPlanDrill, Drill, PhysicalTask, MentalTask, KeyPoint
-from .serializers import LevelSerializer, TaskSerializer, TechnicalLevelTasksSerializer, TechnicalLevelSerializer, SituationTypeSerializer, TournamentType, TournamentTypeSerializer, CoachReportSerializer, TechnicalPartSerializer, DiagnosisSerializer, TrainingPlanSerializer, TrainingPlanDrillSerializer, DrillSerializer, PhysicalTaskSerializer, MentalTaskSerializer, KeyPointSerializer
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from .models import Level, Task, TechnicalLevelTasks, TechnicalLevel, SituationType, Diagnosis, CoachReport, TechnicalPart, TrainingPlan, TrainingPlanDrill, Drill, PhysicalTask, MentalTask, KeyPoint, PendingPromotion, Player, PlayerProgress
+from .serializers import LevelSerializer, TaskSerializer, TechnicalLevelTasksSerializer, TechnicalLevelSerializer, SituationTypeSerializer, TournamentType, TournamentTypeSerializer, CoachReportSerializer, TechnicalPartSerializer, DiagnosisSerializer, TrainingPlanSerializer, TrainingPlanDrillSerializer, DrillSerializer, PhysicalTaskSerializer, MentalTaskSerializer, KeyPointSerializer, KeyPointBatchSerializer, TrainingPlanBulkSerializer, TrainingPlanGeneratorSerializer, TrainingPlanWithDrillsSerializer, PlayerSerializer, PlayerProgressSerializer, PlayerProgressBatchSerializer, PendingPromotionSerializer
 from rest_framework.decorators import action
+from .pagination import OptInCursorPagination
+from .charts import get_chart_data
+from .exporter import EXPORT_FORMATS, EXPORT_SOURCES, ExportError, export_stream
+from .middleware import request_stats
+from .analytics import ROLLUPS, top_items
+from .pathway import get_pathway_document
+from .plan_generator import describe_plan, generate_plan, get_drill_index
+from .plans import summarize_plan, summarize_plans
+from .progress import get_squad_progress, level_completion, player_progress, set_progress
+from .promotions import decide_promotions, schedule_promotion_evaluation
+from .search import SEARCH_SOURCES, search
+from .catalogue import get_catalogue_snapshot, get_catalogue_version
 
 
 def get_diagnoses(request):
@@ -28,176 +49,441 @@ def get_diagnoses(request):
 
 @api_view(["GET"])
 def chart_data(request, level_id):
+    charts = get_chart_data([level_id])
+    if level_id not in charts:
+        raise Http404
+    return JsonResponse(charts[level_id], safe=False)
 
-    level = get_object_or_404(Level, id=level_id)
-    coaching_hours = level.coaching_hours * 46
-    own_hours = level.own_practice_hours * 46
-    physical_hours = level.physical_hours * 46
-    other_sports = level.other_sports_hours * 46
-    matches = ((level.singles_matches * 1.5) + (level.doubles_matches * 1.5))
-    total = coaching_hours + own_hours + physical_hours + other_sports + matches
-    coaching_hours = round(coaching_hours / total * 100, 0)
-    own_hours = round(own_hours / total * 100, 0)
-    physical_hours = round(physical_hours / total * 100, 0)
-    other_sports = round(other_sports / total * 100, 0)
-    matches = round(matches / total * 100, 0)
-
-    data = [
-        {
-            "name": "Med trener",
-            "value": coaching_hours
-        },
-        {
-            "name": "Egen trening",
-            "value": own_hours
-        },
-        {
-            "name": "Fysisk trening",
-            "value": physical_hours
-        },
-        {
-            "name": "Andre idretter",
-            "value": other_sports
-        },
-        {
-            "name": "Kamp",
-            "value": matches
-        },
+
+@api_view(["GET"])
+def chart_data_batch(request):
+    """ ✅ Hour distribution for many levels at once: `?levels=1,2,3`, or all levels without the parameter """
+    levels = request.query_params.get("levels", "all")
+    if levels == "all":
+        level_ids = None
+    else:
+        try:
+            level_ids = [int(level_id) for level_id in levels.split(",")]
+        except ValueError:
+            return Response({"error": "Invalid levels parameter"},
+                            status=400)
+
+    charts = get_chart_data(level_ids)
+    return Response({str(level_id): chart for level_id, chart in charts.items()})
+
+
+@api_view(["GET"])
+def search_catalogue(request):
+    """ ✅ Ranked keyword search over drills, tasks, diagnoses and technical tasks.
+
+    `?q=` is required; `?kinds=drill,diagnosis` narrows the sources and
+    `?limit=` caps the results (max 100).
+    """
+    query = request.query_params.get("q", "").strip()
+    if not query:
+        return Response({"error": "Missing q parameter"}, status=400)
+
+    kinds = [
+        kind for kind in request.query_params.get("kinds", "").split(",")
+        if kind
     ]
-    return JsonResponse(data, safe=False)
+    unknown = set(kinds) - set(SEARCH_SOURCES)
+    if unknown:
+        return Response({"error": f"Unknown kinds: {', '.join(sorted(unknown))}"},
+                        status=400)
+
+    try:
+        limit = min(int(request.query_params.get("limit", 20)), 100)
+    except ValueError:
+        return Response({"error": "Invalid limit parameter"}, status=400)
+    if limit < 1:
+        return Response({"error": "limit must be at least 1"}, status=400)
+
+    return Response(search(query, kinds=kinds, limit=limit))
+
+
+ANALYTICS_DEFAULT_DAYS = 30
+PLAN_SUMMARY_DEFAULT_DAYS = 90
+PLAN_SUMMARY_MAX_DAYS = 366
+
+
+def date_range_params(request, default_days):
+    """ `?since=`/`?until=` dates, by default the last `default_days` days.
+
+    Raises ValueError when either is not a YYYY-MM-DD date.
+    """
+    until = request.query_params.get("until")
+    until = parse_date(until) if until else timezone.localdate()
+    since = request.query_params.get("since")
+    since = parse_date(since) if since else until and (
+        until - datetime.timedelta(days=default_days - 1))
+    if since is None or until is None:
+        raise ValueError("Invalid date")
+    return since, until
+
 
+@api_view(["GET"])
+def coach_report_analytics(request):
+    """ ✅ Most reported diagnoses or tasks per technical level, read from the daily rollups.
+
+    `?dimension=diagnoses|tasks` (default diagnoses), `?since=`/`?until=`
+    dates (default the last 30 days), `?technical_level=` and `?limit=` per
+    technical level (max 100).
+    """
+    dimension = request.query_params.get("dimension", "diagnoses")
+    if dimension not in ROLLUPS:
+        return Response({"error": "dimension must be diagnoses or tasks"},
+                        status=400)
+
+    try:
+        since, until = date_range_params(request, ANALYTICS_DEFAULT_DAYS)
+    except ValueError:
+        return Response({"error": "since and until must be dates (YYYY-MM-DD)"},
+                        status=400)
+
+    try:
+        technical_level_id = int(
+            request.query_params.get("technical_level") or 0) or None
+        limit = min(int(request.query_params.get("limit", 10)), 100)
+    except ValueError:
+        return Response(
+            {"error": "Invalid technical_level or limit parameter"},
+            status=400)
+    if limit < 1:
+        return Response({"error": "limit must be at least 1"}, status=400)
+
+    return Response({
+        "dimension":
+        dimension,
+        "since":
+        since,
+        "until":
+        until,
+        "results":
+        top_items(dimension, since, until, technical_level_id, limit),
+    })
+
+
+SQUAD_MAX_PLAYERS = 1000
+SQUAD_MAX_NEXT_TASKS = 20
+
+
+@api_view(["GET"])
+def squad_progress(request):
+    """ ✅ Levels, completion per situation type and next tasks for a whole squad.
+
+    `?players=1,2,3` or `?level=` (players whose current level it is), plus
+    `?next=` for the number of next incomplete tasks (default 3). The query
+    count does not grow with the number of players.
+    """
+    try:
+        players = request.query_params.get("players")
+        player_ids = [int(player_id) for player_id in players.split(",")
+                      ] if players else None
+        level_id = request.query_params.get("level")
+        level_id = int(level_id) if level_id else None
+        next_count = int(request.query_params.get("next", 3))
+    except ValueError:
+        return Response({"error": "Invalid players, level or next parameter"},
+                        status=400)
+    if player_ids is None and level_id is None:
+        return Response({"error": "Missing players or level parameter"},
+                        status=400)
+    if player_ids is not None and len(player_ids) > SQUAD_MAX_PLAYERS:
+        return Response(
+            {"error": f"At most {SQUAD_MAX_PLAYERS} players per request"},
+            status=400)
+    if not 0 <= next_count <= SQUAD_MAX_NEXT_TASKS:
+        return Response(
+            {"error": f"next must be between 0 and {SQUAD_MAX_NEXT_TASKS}"},
+            status=400)
+
+    players = Player.objects.all()
+    if player_ids is not None:
+        players = players.filter(pk__in=player_ids)
+    if level_id is not None:
+        players = players.filter(current_level_id=level_id)
+    return Response(get_squad_progress(players, next_count))
+
+
+@api_view(["GET", "DELETE"])
+@permission_classes([IsAdminUser])
+def request_stats_view(request):
+    """ ✅ Staff only: p50/p95/p99 per view from RequestStatsMiddleware, DELETE resets """
+    if request.method == "DELETE":
+        request_stats.reset()
+        return Response(status=204)
+    return Response(request_stats.snapshot())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def export_data(request, source, file_format):
+    """ ✅ Staff only: streams coach reports or the key point catalogue as CSV, NDJSON or XLSX """
+    if source not in EXPORT_SOURCES or file_format not in EXPORT_FORMATS:
+        raise Http404
+    try:
+        content_type, stream = export_stream(source, file_format,
+                                             request.query_params)
+    except ExportError as error:
+        return Response({"error": str(error)}, status=400)
+
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    filename = f"{source}-{timezone.now():%Y%m%d}.{file_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_GET
+def catalogue_snapshot(request):
+    """ ✅ The whole curriculum in one cached response, revalidated with a strong ETag """
+    snapshot = get_catalogue_snapshot()
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and set(parse_etags(if_none_match)) & {
+            snapshot["etag"], "*"
+    }:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(snapshot["body"],
+                                content_type="application/json")
+    response["ETag"] = snapshot["etag"]
+    response["Cache-Control"] = "no-cache"
+    return response
 
-class TournamentTypeViewSet(viewsets.ModelViewSet):
+
+class EagerLoadingViewSetMixin:
+    """ Loads what the serializer reads: its declared select/prefetch_related,
+    minus any HTML bodies the client left out with `?fields=` / `?omit=` """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        setup_eager_loading = getattr(serializer_class, "setup_eager_loading",
+                                      None)
+        if setup_eager_loading:
+            queryset = setup_eager_loading(queryset)
+        get_deferred_fields = getattr(serializer_class, "get_deferred_fields",
+                                      None)
+        if get_deferred_fields and self.request.method == "GET":
+            deferred_fields = get_deferred_fields(self.request.query_params)
+            if deferred_fields:
+                queryset = queryset.defer(*deferred_fields)
+        return queryset
+
+
+class ConditionalGetMixin:
+    """ ✅ ETag validators for list and detail routes.
+
+    The fingerprint is computed from `updated_at` and the row count, without
+    serializing anything, and folds in the catalogue version so edits to
+    related rows (names shown by the serializers) also change the ETag.
+    No Last-Modified is sent: `updated_at` does not move when a row is
+    deleted or a related row is edited, so If-Modified-Since would go stale.
+    """
+
+    def get_etag(self, request, *parts):
+        raw = "|".join([
+            request.get_full_path(), request.accepted_media_type,
+            get_catalogue_version(), *map(str, parts)
+        ])
+        return f'"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+    def conditional_response(self, request, etag):
+        """ Returns a 304 when the client's ETag still matches, else None """
+        return get_conditional_response(request._request, etag=etag)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        fingerprint = queryset.order_by().aggregate(
+            last_modified=Max("updated_at"), count=Count("pk"))
+        etag = self.get_etag(request, fingerprint["count"],
+                             fingerprint["last_modified"])
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        response["ETag"] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(request, instance.pk, instance.updated_at)
+        not_modified = self.conditional_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        response = Response(self.get_serializer(instance).data)
+        response["ETag"] = etag
+        return response
+
+
+class TournamentTypeViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                            viewsets.ModelViewSet):
     queryset = TournamentType.objects.all()
     serializer_class = TournamentTypeSerializer
 
 
-class SituationTypeViewSet(viewsets.ModelViewSet):
+class SituationTypeViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                           viewsets.ModelViewSet):
     queryset = SituationType.objects.all()
     serializer_class = SituationTypeSerializer
 
 
 # View for Levels
-class LevelViewSet(viewsets.ModelViewSet):
+class LevelViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                   viewsets.ModelViewSet):
     queryset = Level.objects.all()
     serializer_class = LevelSerializer
 
-
-class TaskViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=["get"])
+    def pathway(self, request, pk=None):
+        """ ✅ The whole player pathway page for a level from one stored document """
+        try:
+            document = get_pathway_document(int(pk))
+        except ValueError:
+            document = None
+        if document is None:
+            raise Http404
+        return Response(document)
+
+
+class TaskViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                  viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
-
-    def retrieve(self, request, pk=None):
-        """ ✅ Retrieve a single task by ID """
-        task = get_object_or_404(Task, pk=pk)
-        serializer = self.get_serializer(task)
-        return Response(serializer.data)
+    pagination_class = OptInCursorPagination
 
 
 # View for Tasks
-class TechnicalLevelViewSet(viewsets.ModelViewSet):
+class TechnicalLevelViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                            viewsets.ModelViewSet):
     queryset = TechnicalLevel.objects.all()
     serializer_class = TechnicalLevelSerializer
 
     @action(detail=True, methods=["get"])
     def tasks(self, request, pk=None):
-        tasks = TechnicalLevelTasks.objects.filter(technical_level_id=pk)
+        tasks = TechnicalLevelTasksSerializer.setup_eager_loading(
+            TechnicalLevelTasks.objects.filter(technical_level_id=pk))
         serializer = TechnicalLevelTasksSerializer(tasks, many=True)
         return Response(serializer.data)
 
 
-class TechnicalPartViewSet(viewsets.ModelViewSet):
+class TechnicalPartViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                           viewsets.ModelViewSet):
     queryset = TechnicalPart.objects.all()
     serializer_class = TechnicalPartSerializer
 
 
-class TechnicalLevelTasksViewSet(viewsets.ModelViewSet):
+class TechnicalLevelTasksViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                                 viewsets.ModelViewSet):
+    queryset = TechnicalLevelTasks.objects.all()
     serializer_class = TechnicalLevelTasksSerializer
 
     def get_queryset(self):
         """ ✅ Allow filtering by `technical_level` in URL """
+        queryset = super().get_queryset()
         technical_level_id = self.request.query_params.get("technical_level")
         if technical_level_id:
-            return TechnicalLevelTasks.objects.filter(
-                technical_level_id=technical_level_id)
-        return TechnicalLevelTasks.objects.all()
+            return queryset.filter(technical_level_id=technical_level_id)
+        return queryset
 
 
 @api_view(['GET'])
 def get_technical_level_tasks(request, technical_level_name):
-    tasks = TechnicalLevelTasks.objects.filter(
-        technical_level__name=technical_level_name)
+    tasks = TechnicalLevelTasksSerializer.setup_eager_loading(
+        TechnicalLevelTasks.objects.filter(
+            technical_level__name=technical_level_name))
     serializer = TechnicalLevelTasksSerializer(tasks, many=True)
     return Response(serializer.data)
 
 
-class CoachReportViewSet(viewsets.ModelViewSet):
+class CoachReportViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                         viewsets.ModelViewSet):
     queryset = CoachReport.objects.all()
     serializer_class = CoachReportSerializer
 
 
-class DiagnosisViewSet(viewsets.ModelViewSet):
+class DiagnosisViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                       viewsets.ModelViewSet):
     queryset = Diagnosis.objects.all()
     serializer_class = DiagnosisSerializer
+    pagination_class = OptInCursorPagination
 
     def get_queryset(self):
         """ ✅ Allow filtering by `technical_level_task` in URL """
+        queryset = super().get_queryset()
         technical_level_task_id = self.request.query_params.get(
             "technical_level_task")
         if technical_level_task_id:
-            return Diagnosis.objects.filter(
+            return queryset.filter(
                 technical_level_task_id=technical_level_task_id)
-        return Diagnosis.objects.all()
+        return queryset
 
 
-class DrillViewSet(viewsets.ModelViewSet):
+class DrillViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                   viewsets.ModelViewSet):
     queryset = Drill.objects.all()
     serializer_class = DrillSerializer
+    pagination_class = OptInCursorPagination
 
     @action(detail=True, methods=["get"])
     def key_points(self, request, pk=None):
         """ Fetch key points for a specific drill """
-        key_points = KeyPoint.objects.filter(drill_id=pk)
+        key_points = KeyPointSerializer.setup_eager_loading(
+            KeyPoint.objects.filter(drill_id=pk))
         serializer = KeyPointSerializer(key_points, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["get"])
     def count_by_situation_type(self, request):
-        """ Counts drills per SituationType, only if they have key points with content for the requested level """
+        """ Counts drills per SituationType, only if they have key points with content for the requested level.
+
+        `?level=<id>` returns `{situation_type: count}`, `?level=all` returns
+        `{level_id: {situation_type: count}}` for every level at once.
+        """
         level_id = request.query_params.get("level")
 
         if not level_id:
             return Response({"error": "Missing level parameter"}, status=400)
 
-        drill_counts = {}
-
-        # ✅ Loop through all drills and count only those with valid key points
-        for drill in Drill.objects.all():
-            # ✅ Check if the drill has key points for this level AND the key points are not empty
-            valid_key_points = drill.key_points.filter(
-                level_id=level_id).exclude(description="").exclude(
-                    description__isnull=True)
-
-            if valid_key_points.exists(
-            ):  # ✅ Only count drills with non-empty key points
-                situation_type = drill.situation_type.name if drill.situation_type else "Unknown"
-                drill_counts[situation_type] = drill_counts.get(
-                    situation_type, 0) + 1
-
-        print("Drill counts (Manual Method):",
-              drill_counts)  # ✅ Debugging print
+        # ✅ One grouped query instead of two queries per drill
+        key_points = KeyPoint.objects.exclude(
+            description__isnull=True).exclude(description="")
+
+        if level_id == "all":
+            rows = key_points.values(
+                "level_id", "drill__situation_type__name").annotate(
+                    drill_count=Count("drill_id", distinct=True)).order_by()
+            matrix = {}
+            for row in rows:
+                matrix.setdefault(
+                    str(row["level_id"]),
+                    {})[row["drill__situation_type__name"]] = row["drill_count"]
+            return Response(matrix)
+
+        if not level_id.isdigit():
+            return Response({"error": "Invalid level parameter"}, status=400)
+
+        rows = key_points.filter(level_id=level_id).values(
+            "drill__situation_type__name").annotate(
+                drill_count=Count("drill_id", distinct=True)).order_by()
+        drill_counts = {
+            row["drill__situation_type__name"]: row["drill_count"]
+            for row in rows
+        }
         return Response(drill_counts)
 
 
-class KeyPointViewSet(viewsets.ModelViewSet):
+class KeyPointViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                      viewsets.ModelViewSet):
     queryset = KeyPoint.objects.all()
     serializer_class = KeyPointSerializer
+    pagination_class = OptInCursorPagination
 
     def get_queryset(self):
         """ Allow filtering key points by drill or level """
         drill_id = self.request.query_params.get("drill")
         level_id = self.request.query_params.get("level")
-        queryset = self.queryset
+        queryset = super().get_queryset()
 
         if drill_id:
             queryset = queryset.filter(drill_id=drill_id)
@@ -219,32 +505,272 @@ class KeyPointViewSet(viewsets.ModelViewSet):
                             status=400)
 
         # ✅ Convert drill IDs from CSV format ("1,2,3") to a list
-        drill_ids = drill_ids.split(",")
+        try:
+            level_id = int(level_id)
+            drill_ids = [int(drill_id) for drill_id in drill_ids.split(",")]
+        except ValueError:
+            return Response({"error": "Invalid level or drills parameter"},
+                            status=400)
 
         # ✅ Fetch key points for the given level and drills
-        key_points = KeyPoint.objects.filter(
-            level_id=level_id, drill_id__in=drill_ids).exclude(
-                description__isnull=True).exclude(description="")
+        key_points = KeyPointSerializer.setup_eager_loading(
+            KeyPoint.objects.filter(
+                level_id=level_id, drill_id__in=drill_ids).exclude(
+                    description__isnull=True).exclude(description=""))
 
         serializer = KeyPointSerializer(key_points, many=True)
         return Response(serializer.data)
 
-
-class TrainingPlanViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """ ✅ Key points with content for many (drill, level) pairs in one query.
+
+        Body: `{"pairs": [{"drill_id": 1, "level_id": 2}, ...]}` or
+        `{"training_plan": 3}` for every drill of a plan at its selected level.
+        Returns one entry per pair, in request order.
+        """
+        serializer = KeyPointBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        pairs = serializer.validated_data["pairs"]
+
+        # drill__in x level__in is a superset, the exact pairs are picked below
+        key_points = KeyPointSerializer.setup_eager_loading(
+            KeyPoint.objects.filter(
+                drill_id__in={drill_id
+                              for drill_id, _ in pairs},
+                level_id__in={level_id
+                              for _, level_id in pairs}).exclude(
+                                  description__isnull=True).exclude(
+                                      description="").order_by("pk"))
+        grouped = {}
+        for key_point in KeyPointSerializer(key_points, many=True).data:
+            grouped.setdefault((key_point["drill"], key_point["level"]),
+                               []).append(key_point)
+
+        return Response([{
+            "drill_id": drill_id,
+            "level_id": level_id,
+            "key_points": grouped.get((drill_id, level_id), []),
+        } for drill_id, level_id in pairs])
+
+
+class TrainingPlanViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                          viewsets.ModelViewSet):
     queryset = TrainingPlan.objects.all()
     serializer_class = TrainingPlanSerializer
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """ ✅ Create a plan with all its drills in one request and one transaction """
+        serializer = TrainingPlanBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        plan = serializer.save()
+        plan = TrainingPlanWithDrillsSerializer.setup_eager_loading(
+            TrainingPlan.objects.filter(pk=plan.pk)).get()
+        return Response(TrainingPlanWithDrillsSerializer(plan).data,
+                        status=201)
+
+    @action(detail=False, methods=["post"])
+    def generate(self, request):
+        """ ✅ Proposes a plan for a level that fills `duration` minutes.
+
+        Follows the `category_mix` and `situation_type_mix` shares, keeps the
+        `required_drills` and prefers drills with key points for the level.
+        Saved as a new plan (201) when `name` and `date` are given.
+        """
+        index = get_drill_index()
+        serializer = TrainingPlanGeneratorSerializer(data=request.data,
+                                                     context={"index": index})
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        drills = generate_plan(data["level"],
+                               data["duration"],
+                               category_mix=data.get("category_mix"),
+                               situation_type_mix=data["situation_type_mix"],
+                               required_drill_ids=data["required_drills"],
+                               index=index)
+        plan = describe_plan(data["level"], data["duration"], drills)
+        if "name" not in data:
+            return Response(plan)
+
+        bulk = TrainingPlanBulkSerializer(
+            data={
+                "name":
+                data["name"],
+                "date":
+                data["date"],
+                "drills": [{
+                    "drill": drill["drill"],
+                    "selected_level": data["level"],
+                    "time_allocated": drill["time_allocated"]
+                } for drill in plan["drills"]]
+            })
+        bulk.is_valid(raise_exception=True)
+        plan["training_plan"] = bulk.save().pk
+        return Response(plan, status=201)
+
+    @action(detail=True, methods=["get"])
+    def summary(self, request, pk=None):
+        """ ✅ Total minutes and minutes per category, situation type and level """
+        try:
+            summary = summarize_plan(int(pk))
+        except ValueError:
+            summary = None
+        if summary is None:
+            raise Http404
+        return Response(summary)
 
-class TrainingPlanDrillViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=["get"])
+    def summaries(self, request):
+        """ ✅ Summaries of every plan dated in `?since=`/`?until=`, for the calendar.
+
+        Defaults to the last 90 days; at most a year per request.
+        """
+        try:
+            since, until = date_range_params(request,
+                                             PLAN_SUMMARY_DEFAULT_DAYS)
+        except ValueError:
+            return Response(
+                {"error": "since and until must be dates (YYYY-MM-DD)"},
+                status=400)
+        if not 0 <= (until - since).days < PLAN_SUMMARY_MAX_DAYS:
+            return Response(
+                {
+                    "error":
+                    f"until must follow since by less than {PLAN_SUMMARY_MAX_DAYS} days"
+                },
+                status=400)
+        return Response(
+            summarize_plans(
+                TrainingPlan.objects.filter(date__gte=since,
+                                            date__lte=until)))
+
+
+class TrainingPlanDrillViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                               viewsets.ModelViewSet):
     queryset = TrainingPlanDrill.objects.all()
     serializer_class = TrainingPlanDrillSerializer
 
 
-class MentalTaskViewSet(viewsets.ModelViewSet):
+class MentalTaskViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                        viewsets.ModelViewSet):
     queryset = MentalTask.objects.all()
     serializer_class = MentalTaskSerializer
 
 
-class PhysicalTaskViewSet(viewsets.ModelViewSet):
+class PhysicalTaskViewSet(ConditionalGetMixin, EagerLoadingViewSetMixin,
+                          viewsets.ModelViewSet):
     queryset = PhysicalTask.objects.all()
     serializer_class = PhysicalTaskSerializer
+
+
+class PlayerViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
+    queryset = Player.objects.order_by("name", "pk")
+    serializer_class = PlayerSerializer
+
+    @action(detail=True, methods=["get"])
+    def progress(self, request, pk=None):
+        """ ✅ Completion per level and situation type, from the progress counters """
+        return Response(player_progress(self.get_object()))
+
+
+class PlayerProgressViewSet(EagerLoadingViewSetMixin, viewsets.ModelViewSet):
+    queryset = PlayerProgress.objects.order_by("pk")
+    serializer_class = PlayerProgressSerializer
+    pagination_class = OptInCursorPagination
+
+    def get_queryset(self):
+        """ Allow filtering progress by player """
+        queryset = super().get_queryset()
+        player_id = self.request.query_params.get("player")
+        if player_id:
+            queryset = queryset.filter(player_id=player_id)
+        return queryset
+
+    # The counters move in post_save, keep them in the same transaction
+    @transaction.atomic
+    def perform_create(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+    @action(detail=False, methods=["post"], url_path="batch")
+    def batch(self, request):
+        """ ✅ Mark many tasks complete (or not) for many players in one call.
+
+        Body: `{"entries": [{"player": 1, "task": 2, "is_completed": true}, ...]}`,
+        `is_completed` defaults to true.
+        """
+        serializer = PlayerProgressBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.validated_data["entries"]
+        result = set_progress(entries, serializer.validated_data["task_keys"])
+        # set_progress skips the post_save handlers
+        schedule_promotion_evaluation(
+            {player_id
+             for player_id, _, _ in entries})
+        return Response(result)
+
+    @action(detail=False, methods=["get"])
+    def completion(self, request):
+        """ ✅ Completion of one level for many players: `?level=1&players=1,2,3`.
+
+        Without `players`, every player with progress on the level is listed.
+        """
+        try:
+            level_id = int(request.query_params.get("level", ""))
+            players = request.query_params.get("players")
+            player_ids = [int(player_id) for player_id in players.split(",")
+                          ] if players else None
+        except ValueError:
+            return Response({"error": "Invalid level or players parameter"},
+                            status=400)
+        return Response(level_completion(level_id, player_ids))
+
+
+class PendingPromotionViewSet(EagerLoadingViewSetMixin,
+                              viewsets.ReadOnlyModelViewSet):
+    queryset = PendingPromotion.objects.order_by("-created_at", "-pk")
+    serializer_class = PendingPromotionSerializer
+
+    def get_queryset(self):
+        """ Pending promotions by default, `?status=` for the decided ones """
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = queryset.filter(
+                status=self.request.query_params.get("status", "pending"))
+        player_id = self.request.query_params.get("player")
+        if player_id:
+            queryset = queryset.filter(player_id=player_id)
+        return queryset
+
+    def decide(self, approve):
+        promotion = self.get_object()
+        if promotion.status != "pending":
+            return Response({"error": "Promotion was already decided"},
+                            status=400)
+        if not decide_promotions(
+                PendingPromotion.objects.filter(pk=promotion.pk), approve):
+            return Response(
+                {
+                    "error":
+                    "The player is no longer on the level the promotion is from"
+                },
+                status=400)
+        promotion.refresh_from_db(fields=["status", "decided_at"])
+        return Response(self.get_serializer(promotion).data)
+
+    @action(detail=True, methods=["post"])
+    def approve(self, request, pk=None):
+        """ ✅ Moves the player up to the proposed level """
+        return self.decide(approve=True)
+
+    @action(detail=True, methods=["post"])
+    def reject(self, request, pk=None):
+        return self.decide(approve=False)